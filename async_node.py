@@ -0,0 +1,481 @@
+"""An asyncio based node server with the same routes as node.py, built on aiohttp (pip install aiohttp).
+
+Connections are served by the event loop, so idle or slow clients don't hold a thread. Every call into the Blockchain
+(which takes locks, reads the block log, verifies signatures or mines) runs on a thread pool executor, and the
+requests to peers are sent over one aiohttp session on the loop (see AsyncPeerClient). Start it like node.py:
+
+    python async_node.py -p 5000 --threads 32
+"""
+
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+
+import handlers
+from async_peer_client import AsyncPeerClient
+from blockchain import MAX_BLOCK_TRANSACTIONS, SNAPSHOT_INTERVAL, Blockchain
+from events import KEEPALIVE_INTERVAL, EventBus, encode_event, parse_event_id
+from gossip import GossipOutbox
+from mempool import EVICTION_POLICIES, MEMPOOL_SIZE, Mempool
+from mining import INLINE_PROOFS, Miner, MiningService
+from utility.codec import CONTENT_TYPE, decode_block
+from utility.verification import SignatureVerifier
+from wallet import Wallet
+
+# The directory of the node UI pages
+UI_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ui")
+
+routes = web.RouteTableDef()
+# The wakeup events of the open event streams, set on shutdown to end them
+event_streams = set()
+
+
+async def call(function, *args, **kwargs):
+    """Runs a blocking function on the executor and returns its result, so the event loop keeps serving."""
+    return await asyncio.get_running_loop().run_in_executor(
+        executor, functools.partial(function, *args, **kwargs)
+    )
+
+
+async def get_json(request):
+    """Returns the JSON body of a request or None if it doesn't have one."""
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+def json_response(response, status):
+    """Returns a JSON response (the counterpart of jsonify in node.py)."""
+    return web.json_response(response, status=status)
+
+
+def prefers_binary(accept):
+    """Returns whether an Accept header prefers the binary block format over JSON.
+
+    Arguments:
+        :accept: The value of the Accept header.
+    """
+    qualities = {}
+    for item in accept.split(","):
+        mimetype, _, params = item.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[mimetype.strip()] = quality
+
+    def quality(mimetype):
+        wildcard = mimetype.split("/")[0] + "/*"
+        return qualities.get(
+            mimetype, qualities.get(wildcard, qualities.get("*/*", 0.0))
+        )
+
+    return quality(CONTENT_TYPE) > quality("application/json")
+
+
+@web.middleware
+async def cors(request, handler):
+    """Allows requests from every origin, like flask_cors does for node.py."""
+    if request.method == "OPTIONS":
+        response = web.Response()
+        response.headers["Access-Control-Allow-Methods"] = "GET, POST, DELETE"
+        response.headers["Access-Control-Allow-Headers"] = request.headers.get(
+            "Access-Control-Request-Headers", "Content-Type"
+        )
+    else:
+        response = await handler(request)
+    response.headers["Access-Control-Allow-Origin"] = "*"
+    return response
+
+
+async def respond(function, *args):
+    """Runs a handler (see handlers.py) on the executor and returns its (response, status code) as a JSON response."""
+    response, status = await call(function, *args)
+    return json_response(response, status)
+
+
+@routes.get("/")
+async def get_node_ui(request):
+    """Returns the homepage."""
+    return web.FileResponse(os.path.join(UI_DIRECTORY, "node.html"))
+
+
+@routes.get("/network")
+async def get_network_ui(request):
+    """Returns the homepage."""
+    return web.FileResponse(os.path.join(UI_DIRECTORY, "network.html"))
+
+
+@routes.post("/wallet")
+async def create_keys(request):
+    """Creates a new pair of private and public keys."""
+    return await respond(handlers.create_keys, wallet, blockchain)
+
+
+@routes.get("/wallet")
+async def load_keys(request):
+    """Loads the keys from the wallet.txt file into the wallet."""
+    return await respond(handlers.load_keys, wallet, blockchain)
+
+
+@routes.get("/balance")
+async def get_balance(request):
+    """Gets and returns the balance of the sender's address."""
+    return await respond(handlers.get_balance, wallet, blockchain)
+
+
+@routes.post("/broadcast-transaction")
+async def broadcast_transaction(request):
+    """Broadcasts a transaction to all nodes."""
+    values = await get_json(request)
+    return await respond(handlers.broadcast_transaction, blockchain, values)
+
+
+@routes.post("/transactions/batch")
+async def add_transactions(request):
+    """Adds a batch of transactions which were signed by their senders."""
+    values = await get_json(request)
+    return await respond(handlers.add_transactions, blockchain, values)
+
+
+@routes.post("/broadcast-transactions")
+async def broadcast_transactions(request):
+    """Adds a batch of transactions which another node broadcast."""
+    values = await get_json(request)
+    return await respond(handlers.broadcast_transactions, blockchain, values)
+
+
+@routes.post("/broadcast-block")
+async def broadcast_block(request):
+    """Broadcasts a block to all nodes. The block is sent as JSON ({"block": ...}) or in the binary block format (with
+    the matching Content-Type).
+    """
+    if request.content_type == CONTENT_TYPE:
+        try:
+            block, _ = decode_block(await request.read())
+        except ValueError:
+            response = {"message": "Block can't be decoded."}
+            return json_response(response, 400)
+    else:
+        values = await get_json(request)
+        if not values:
+            response = {"message": "No data found."}
+            return json_response(response, 400)
+        if "block" not in values:
+            response = {"message": "Some data is missing."}
+            return json_response(response, 400)
+        block = values["block"]
+    return await respond(handlers.broadcast_block, blockchain, block)
+
+
+@routes.post("/transaction")
+async def add_transaction(request):
+    """Adds a transaction to the open transactions list."""
+    values = await get_json(request)
+    return await respond(handlers.add_transaction, wallet, blockchain, values)
+
+
+@routes.post("/mine")
+async def mine(request):
+    """Mines a block on the executor."""
+    return await respond(handlers.mine, wallet, blockchain, mining_service)
+
+
+@routes.post("/miner/start")
+async def start_miner(request):
+    """Starts mining blocks in the background."""
+    return await respond(handlers.start_miner, wallet, mining_service)
+
+
+@routes.post("/miner/stop")
+async def stop_miner(request):
+    """Stops mining blocks in the background."""
+    return await respond(handlers.stop_miner, mining_service)
+
+
+@routes.get("/miner/status")
+async def get_miner_status(request):
+    """Returns the state of the background miner and the time it spent on blocks which were outdated."""
+    return json_response(mining_service.status(), 200)
+
+
+@routes.post("/resolve-conflicts")
+async def resolve_conflicts(request):
+    """Resolves conflicts between blockchain nodes."""
+    return await respond(handlers.resolve_conflicts, blockchain)
+
+
+@routes.get("/transactions")
+async def get_open_transactions(request):
+    """Gets and returns the open transactions."""
+    return await respond(handlers.get_open_transactions, blockchain)
+
+
+@routes.get("/tx/{signature}")
+async def get_transaction(request):
+    """Returns a transaction by its signature, with the block it's part of (or whether it's still open)."""
+    signature = request.match_info["signature"]
+    return await respond(handlers.get_transaction, blockchain, signature)
+
+
+@routes.get("/address/{address}/transactions")
+async def get_address_transactions(request):
+    """Returns the confirmed transactions sent or received by an address, in chain order."""
+    address = request.match_info["address"]
+    return await respond(handlers.get_address_transactions, blockchain, address)
+
+
+@routes.get("/chain")
+async def get_chain(request):
+    """Returns the blocks of the chain. The optional query parameters `from` (inclusive) and `to` (exclusive) select a
+    range of block indexes, the full chain is returned without them. The chain length is sent in the X-Chain-Length
+    header.
+
+    Clients which accept the binary block format get the encoded blocks back to back, everybody else gets JSON.
+    """
+    binary = prefers_binary(request.headers.get("Accept", ""))
+    chain = await call(handlers.get_chain, blockchain, request.query, binary)
+    if chain is None:
+        response = {"message": "Invalid block range."}
+        return json_response(response, 400)
+    body, content_type, length = chain
+    response = web.Response(body=body, status=200, content_type=content_type)
+    response.headers["X-Chain-Length"] = str(length)
+    return response
+
+
+@routes.get("/chain/hashes")
+async def get_chain_hashes(request):
+    """Returns the hashes of the blocks selected by the `from` and `to` query parameters (see /chain)."""
+    return await respond(handlers.get_chain_hashes, blockchain, request.query)
+
+
+@routes.get("/chain/length")
+async def get_chain_length(request):
+    """Returns the length of the chain and the index + hash of its last block."""
+    return await respond(handlers.get_chain_length, blockchain)
+
+
+@routes.post("/node")
+async def add_node(request):
+    """Adds a new node to the set of nodes."""
+    values = await get_json(request)
+    return await respond(handlers.add_node, blockchain, values)
+
+
+@routes.delete("/node/{node_url}")
+async def remove_node(request):
+    """Removes a node from the set of nodes."""
+    node_url = request.match_info["node_url"]
+    return await respond(handlers.remove_node, blockchain, node_url)
+
+
+@routes.get("/nodes")
+async def get_nodes(request):
+    """Returns a list of all nodes."""
+    return await respond(handlers.get_nodes, blockchain)
+
+
+@routes.get("/events")
+async def stream_events(request):
+    """Streams the changes of the node as server-sent events (see node.py). The stream waits on the loop, so an open
+    stream doesn't hold a thread.
+    """
+    loop = asyncio.get_running_loop()
+    wakeup = asyncio.Event()
+    subscription = events.subscribe(
+        parse_event_id(request.headers.get("Last-Event-ID")),
+        lambda: loop.call_soon_threadsafe(wakeup.set),
+    )
+    response = web.StreamResponse(
+        headers={
+            "Content-Type": "text/event-stream",
+            "Cache-Control": "no-cache",
+            # Proxies must pass the events on right away
+            "X-Accel-Buffering": "no",
+        }
+    )
+    event_streams.add(wakeup)
+    try:
+        await response.prepare(request)
+        while not closing:
+            # Cleared before the queue is drained, so an event queued afterwards sets it again
+            wakeup.clear()
+            event = subscription.get(0)
+            while event is not None:
+                await response.write(encode_event(event).encode())
+                event = subscription.get(0)
+            try:
+                await asyncio.wait_for(wakeup.wait(), KEEPALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                await response.write(b": keep-alive\n\n")
+    except ConnectionResetError:
+        pass
+    finally:
+        event_streams.discard(wakeup)
+        events.unsubscribe(subscription)
+    return response
+
+
+@routes.get("/metrics")
+async def get_metrics(request):
+    """Returns the statistics of the node's caches, the mempool, the background miner, the gossip outbox and the event
+    streams.
+    """
+    return await respond(
+        handlers.get_metrics, blockchain, mining_service, gossip, events
+    )
+
+
+async def start_node(app):
+    """Creates the blockchain of the node once the event loop is running (the peer client needs it)."""
+    global peer_client, gossip, blockchain, mining_service
+    peer_client = AsyncPeerClient(
+        asyncio.get_running_loop(),
+        args.peer_timeout,
+        args.peer_workers,
+        args.peer_connections,
+    )
+    await peer_client.start()
+    gossip = GossipOutbox(peer_client)
+    mempool = Mempool(
+        max_size=args.mempool_size or None, eviction=args.mempool_eviction
+    )
+    blockchain = await call(
+        Blockchain,
+        wallet.public_key,
+        args.port,
+        Miner(args.mining_workers),
+        SignatureVerifier(args.verify_workers),
+        peer_client,
+        gossip,
+        mempool,
+        args.block_size or None,
+        events,
+    )
+    blockchain.snapshot_interval = args.snapshot_interval
+    mining_service = MiningService(blockchain, args.mining_interval)
+    if args.mine:
+        if wallet.public_key is None:
+            print("Not starting the background miner, no wallet could be loaded.")
+        else:
+            mining_service.start()
+
+
+async def close_event_streams(app):
+    """Ends the open event streams, so the server doesn't wait for them when it shuts down."""
+    global closing
+    closing = True
+    for wakeup in event_streams:
+        wakeup.set()
+
+
+async def stop_node(app):
+    """Stops the background miner, closes the connections to the peers and syncs the block log."""
+    await call(mining_service.stop, timeout=5)
+    await peer_client.close()
+    await call(blockchain.close)
+    executor.shutdown(wait=False)
+
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser()
+    parser.add_argument("-p", "--port", type=int, default=5000)
+    parser.add_argument(
+        "-w",
+        "--mining-workers",
+        type=int,
+        default=1,
+        help="Number of processes searching for proofs of work (0 = one per CPU). Only searches which take longer "
+        f"than the first {INLINE_PROOFS} proofs use them, at the fixed difficulty nearly all searches end before.",
+    )
+    parser.add_argument(
+        "-v",
+        "--verify-workers",
+        type=int,
+        default=1,
+        help="Number of processes verifying transaction signatures (0 = one per CPU).",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=32,
+        help="Number of threads running the calls into the blockchain.",
+    )
+    parser.add_argument(
+        "--peer-timeout",
+        type=float,
+        default=5.0,
+        help="Seconds to wait for a peer to answer.",
+    )
+    parser.add_argument(
+        "--peer-workers",
+        type=int,
+        default=8,
+        help="Maximum number of peers which are synced with at the same time.",
+    )
+    parser.add_argument(
+        "--peer-connections",
+        type=int,
+        default=100,
+        help="Maximum number of open connections to peers.",
+    )
+    parser.add_argument(
+        "--mempool-size",
+        type=int,
+        default=MEMPOOL_SIZE,
+        help="Maximum number of open transactions (0 = unlimited).",
+    )
+    parser.add_argument(
+        "--mempool-eviction",
+        choices=EVICTION_POLICIES,
+        default="oldest",
+        help="Which open transaction is dropped when the mempool is full.",
+    )
+    parser.add_argument(
+        "--block-size",
+        type=int,
+        default=MAX_BLOCK_TRANSACTIONS,
+        help="Maximum number of open transactions in a mined block (0 = unlimited).",
+    )
+    parser.add_argument(
+        "--snapshot-interval",
+        type=int,
+        default=SNAPSHOT_INTERVAL,
+        help="Number of blocks after which a new ledger snapshot is saved.",
+    )
+    parser.add_argument(
+        "--mining-interval",
+        type=float,
+        default=1.0,
+        help="Seconds the background miner waits after each mined block.",
+    )
+    parser.add_argument(
+        "--mine",
+        action="store_true",
+        help="Load the saved wallet and start the background miner right away.",
+    )
+    args = parser.parse_args()
+    executor = ThreadPoolExecutor(args.threads)
+    events = EventBus()
+    closing = False
+    wallet = Wallet(args.port)
+    # The background miner mines for the saved wallet
+    if args.mine:
+        wallet.load_keys()
+    app = web.Application(middlewares=[cors])
+    app.add_routes(routes)
+    app.on_startup.append(start_node)
+    app.on_shutdown.append(close_event_streams)
+    app.on_cleanup.append(stop_node)
+    web.run_app(app, host="0.0.0.0", port=args.port)
@@ -0,0 +1,135 @@
+"""Provides the AsyncPeerClient class, which sends the requests to peer nodes on an asyncio event loop."""
+
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+
+# The errors which are expected when a peer is unreachable, too slow or answers with something unexpected (see
+# peer_client.PEER_ERRORS)
+PEER_ERRORS = (
+    aiohttp.ClientError,
+    asyncio.TimeoutError,
+    ValueError,
+    KeyError,
+    TypeError,
+    IndexError,
+)
+
+
+class PeerResponse:
+    """The status, headers and body of a peer's answer, read completely (like a requests.Response)."""
+
+    __slots__ = ("status_code", "headers", "content")
+
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    def json(self):
+        """Returns the decoded JSON body (raises a ValueError if it isn't JSON)."""
+        return json.loads(self.content)
+
+
+class AsyncPeerClient:
+    """Sends requests to peer nodes over one aiohttp.ClientSession which runs on an event loop (the loop of the
+    asyncio node server). It has the same methods as the PeerClient, so the Blockchain and the GossipOutbox can use
+    either. The methods block the calling thread until the answer is there, so they must not be called on the loop
+    itself, but the requests don't need a thread each: any number of them wait on the loop at the same time.
+
+    Attributes:
+        :timeout: The seconds to wait for a peer to connect and answer.
+        :max_workers: The maximum number of peers which map calls a function for at the same time.
+    """
+
+    def __init__(self, loop, timeout=5.0, max_workers=8, max_connections=100):
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.__loop = loop
+        self.__max_connections = max_connections
+        self.__session = None
+        self.__executor = ThreadPoolExecutor(max_workers)
+
+    async def start(self):
+        """Opens the session, must be awaited on the loop before the first request."""
+        self.__session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            connector=aiohttp.TCPConnector(limit=self.__max_connections),
+        )
+
+    async def request(
+        self, method, node, path, params=None, headers=None, json=None, data=None
+    ):
+        """Sends a request to a peer on the loop and returns the response.
+
+        Arguments:
+            :method: The HTTP method.
+            :node: The peer node (host:port).
+            :path: The path of the request.
+            :params: The query parameters.
+            :headers: Additional request headers.
+            :json: The data which is sent as JSON.
+            :data: The raw bytes which are sent instead of JSON.
+        """
+        if params is not None:
+            params = {key: str(value) for key, value in params.items()}
+        async with self.__session.request(
+            method,
+            f"http://{node}{path}",
+            params=params,
+            headers=headers,
+            json=json,
+            data=data,
+        ) as response:
+            content = await response.read()
+            return PeerResponse(response.status, response.headers, content)
+
+    def get(self, node, path, params=None, headers=None):
+        """Sends a GET request to a peer and returns the response (see PeerClient.get)."""
+        return self.__run(self.request("GET", node, path, params, headers))
+
+    def post(self, node, path, json=None, data=None, content_type=None):
+        """Sends a POST request with a JSON (or raw) body to a peer and returns the response (see PeerClient.post)."""
+        headers = {"Content-Type": content_type} if content_type else None
+        return self.__run(self.request("POST", node, path, None, headers, json, data))
+
+    def map(self, function, nodes):
+        """Calls a function for every peer concurrently and returns a dict with the result for every peer (see
+        PeerClient.map). The functions run on worker threads, their requests on the loop.
+
+        Arguments:
+            :function: The function which gets called with the peer node.
+            :nodes: The peer nodes.
+        """
+        futures = {node: self.__executor.submit(function, node) for node in nodes}
+        results = {}
+        for node, future in futures.items():
+            try:
+                results[node] = future.result()
+            except PEER_ERRORS as e:
+                print(f"Request to peer {node} failed: {e}")
+                results[node] = None
+        return results
+
+    def post_all(self, nodes, path, json=None):
+        """Sends the same POST request to all given peers concurrently (see PeerClient.post_all)."""
+        return self.map(lambda node: self.post(node, path, json), nodes)
+
+    async def close(self):
+        """Closes the session and stops the threads."""
+        self.__executor.shutdown(wait=False)
+        if self.__session is not None:
+            await self.__session.close()
+
+    def __run(self, coroutine):
+        """Runs a request on the loop and waits for its result."""
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is self.__loop:
+            coroutine.close()
+            raise RuntimeError("Waiting for a peer would block the event loop")
+        return asyncio.run_coroutine_threadsafe(coroutine, self.__loop).result()
@@ -0,0 +1,74 @@
+"""Compares encoding and decoding blocks as JSON (the format used on disk and on the wire before) against the binary
+block format of utility.codec, and the size of both. Decoded blocks must have the same hash in both formats.
+
+Run it from the repository root:
+
+    python -m benchmarks.codec --blocks 200 --transactions 100
+"""
+
+import json
+import time
+from argparse import ArgumentParser
+
+from block import Block
+from transaction import Transaction
+
+
+def make_blocks(count, transactions, senders):
+    """Returns `count` blocks whose transactions are sent between `senders` addresses, with realistically sized (but
+    fake) keys and signatures.
+    """
+    addresses = [f"{i:0324x}" for i in range(senders)]
+    blocks = []
+    for index in range(count):
+        block_transactions = [
+            Transaction(
+                addresses[i % senders],
+                addresses[(i + 1) % senders],
+                f"{index * transactions + i:0256x}",
+                round(0.5 + i * 0.25, 2),
+            )
+            for i in range(transactions)
+        ]
+        block_transactions.append(Transaction("MINING", addresses[0], "", 10))
+        blocks.append(Block(index, f"{index:0128x}", block_transactions, index))
+    return blocks
+
+
+def measure(function, items):
+    """Returns the seconds needed to call the function for every item and the results."""
+    start = time.perf_counter()
+    results = [function(item) for item in items]
+    return time.perf_counter() - start, results
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--blocks", type=int, default=200)
+    parser.add_argument("--transactions", type=int, default=100)
+    parser.add_argument("--senders", type=int, default=10)
+    args = parser.parse_args()
+    blocks = make_blocks(args.blocks, args.transactions, args.senders)
+    # Encode fresh copies, so the cached forms of the blocks aren't measured
+    formats = {
+        "JSON": (
+            lambda block: json.dumps(block.to_dict()).encode(),
+            lambda data: Block.from_dict(json.loads(data)),
+        ),
+        "binary": (
+            lambda block: Block.from_dict(block.to_dict()).to_bytes(),
+            Block.from_bytes,
+        ),
+    }
+    for name, (encode, decode) in formats.items():
+        encode_time, encoded = measure(encode, blocks)
+        decode_time, decoded = measure(decode, encoded)
+        assert [block.hash for block in decoded] == [
+            block.hash for block in blocks
+        ], "hashes differ"
+        size = sum(len(data) for data in encoded)
+        print(
+            f"{name:>6}: {size / args.blocks:9.0f} bytes per block, "
+            f"encode {args.blocks / encode_time:8.0f} blocks/s, "
+            f"decode {args.blocks / decode_time:8.0f} blocks/s"
+        )
@@ -0,0 +1,144 @@
+"""Stress tests a node with concurrent clients: several threads create transactions, mine blocks and read balances
+and blocks at the same time, like a threaded server does. Afterwards every accepted transaction must have been
+confirmed exactly once and the balances must add up, so no update was lost.
+
+The node runs in a temporary directory with a fresh chain. Run it from the repository root:
+
+    python -m benchmarks.concurrency --writers 8 --transactions 25 --miners 2 --readers 4
+"""
+
+import os
+import tempfile
+import threading
+import time
+from argparse import ArgumentParser
+
+import node
+from blockchain import MINING_REWARD, Blockchain
+from gossip import GossipOutbox
+from mining import Miner, MiningService
+from peer_client import PeerClient
+from utility.verification import SignatureVerifier
+from wallet import Wallet
+
+
+def setup_node(port, funded_blocks):
+    """Sets up the globals of the node module (as its main does) and mines some blocks to fund the transactions."""
+    node.wallet = Wallet(port)
+    node.wallet.private_key, node.wallet.public_key = Wallet.generate_keys()
+    peer_client = PeerClient()
+    node.gossip = GossipOutbox(peer_client)
+    node.blockchain = Blockchain(
+        node.wallet.public_key,
+        port,
+        Miner(),
+        SignatureVerifier(),
+        peer_client,
+        node.gossip,
+    )
+    node.mining_service = MiningService(node.blockchain)
+    for _ in range(funded_blocks):
+        node.blockchain.mine_block()
+
+
+def run_threads(targets):
+    """Runs every target on its own thread, all of them started at once, and waits for them."""
+    barrier = threading.Barrier(len(targets))
+
+    def run(target):
+        barrier.wait()
+        target()
+
+    threads = [threading.Thread(target=run, args=(target,)) for target in targets]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--transactions", type=int, default=25)
+    parser.add_argument("--miners", type=int, default=2)
+    parser.add_argument("--readers", type=int, default=4)
+    args = parser.parse_args()
+    os.chdir(tempfile.mkdtemp())
+    total = args.writers * args.transactions
+    setup_node(6000, total // MINING_REWARD + 1)
+    blockchain = node.blockchain
+    accepted = {}
+    mined = []
+    reads = []
+    done = threading.Event()
+
+    def writer(name):
+        client = node.app.test_client()
+        # Signatures are deterministic, so every transaction gets its own recipient to make it unique
+        for i in range(args.transactions):
+            recipient = f"{name}-{i}"
+            response = client.post(
+                "/transaction", json={"recipient": recipient, "amount": 1.0}
+            )
+            if response.status_code == 201:
+                accepted[recipient] = response.get_json()["transaction"]["signature"]
+
+    def miner():
+        client = node.app.test_client()
+        while not done.is_set():
+            # Only mine blocks with transactions, so the chain doesn't fill up with empty ones
+            if not client.get("/transactions").get_json():
+                time.sleep(0.001)
+            elif client.post("/mine").status_code == 201:
+                mined.append(1)
+
+    def reader():
+        client = node.app.test_client()
+        count = 0
+        while not done.is_set():
+            client.get("/balance")
+            client.get("/chain", query_string={"from": 0, "to": 20})
+            client.get("/transactions")
+            count += 3
+        reads.append(count)
+
+    start = time.perf_counter()
+    writers = threading.Thread(
+        target=run_threads,
+        args=([lambda i=i: writer(f"writer-{i}") for i in range(args.writers)],),
+    )
+    others = threading.Thread(
+        target=run_threads,
+        args=([miner] * args.miners + [reader] * args.readers,),
+    )
+    writers.start()
+    others.start()
+    writers.join()
+    done.set()
+    others.join()
+    elapsed = time.perf_counter() - start
+    # Confirm whatever is still open
+    while blockchain.open_transactions:
+        blockchain.mine_block()
+
+    confirmed = len(accepted)
+    lost = [
+        signature
+        for signature in accepted.values()
+        if blockchain.get_transaction_location(signature) is None
+    ]
+    print(
+        f"{confirmed}/{total} transactions accepted, {len(mined)} blocks mined by "
+        f"the miners, {sum(reads)} reads in {elapsed:.2f}s"
+    )
+    print(
+        f"chain length {blockchain.get_chain_length()}, lost transactions {len(lost)}"
+    )
+    assert not lost, "accepted transactions weren't confirmed"
+    for recipient in accepted:
+        assert blockchain.get_balance(recipient) == 1.0, f"{recipient} lost an update"
+        assert len(blockchain.get_address_transactions(recipient)) == 1
+    rewards = (blockchain.get_chain_length() - 1) * MINING_REWARD
+    assert blockchain.get_balance() == rewards - confirmed, "the sender lost an update"
+    assert blockchain.verify_chain() and blockchain.verify_ledger()
+    print("no lost updates")
@@ -0,0 +1,54 @@
+"""Compares the memory used by transactions stored with a per-instance __dict__ (as Transaction did before) against
+the slotted Transaction.
+
+Run it from the repository root:
+
+    python -m benchmarks.memory --transactions 1000000
+"""
+
+import gc
+import tracemalloc
+from argparse import ArgumentParser
+
+from transaction import Transaction
+
+
+class DictTransaction:
+    """A transaction which keeps its attributes in a __dict__."""
+
+    def __init__(self, sender, recipient, signature, amount):
+        self.sender = sender
+        self.recipient = recipient
+        self.amount = amount
+        self.signature = signature
+
+
+def measure(transaction_class, count, senders, signature):
+    """Returns the bytes allocated for `count` transactions (not counting their shared strings)."""
+    gc.collect()
+    tracemalloc.start()
+    transactions = [
+        transaction_class(senders[i % len(senders)], senders[0], signature, float(i))
+        for i in range(count)
+    ]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del transactions
+    return size
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--transactions", type=int, default=1000000)
+    args = parser.parse_args()
+    # Keys and signatures are shared, so only the per-transaction overhead is measured
+    senders = [f"{i:0324x}" for i in range(300)]
+    signature = "0" * 256
+    dict_size = measure(DictTransaction, args.transactions, senders, signature)
+    slots_size = measure(Transaction, args.transactions, senders, signature)
+    for name, size in (("__dict__", dict_size), ("__slots__", slots_size)):
+        print(
+            f"{name:>10}: {size / 2**20:8.1f} MiB "
+            f"({size / args.transactions:5.1f} bytes per transaction)"
+        )
+    print(f"Saved {1 - slots_size / dict_size:.0%}")
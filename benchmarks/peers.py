@@ -0,0 +1,79 @@
+"""Compares broadcasting to peers one at a time with plain requests.post calls (as Blockchain did before) against the
+concurrent, pooled PeerClient. The peers are local stub servers, some of which answer slowly.
+
+Run it from the repository root:
+
+    python -m benchmarks.peers --peers 8 --slow 2 --delay 0.5
+"""
+
+import json
+import threading
+import time
+from argparse import ArgumentParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from peer_client import PeerClient
+
+
+def start_stub_peer(delay):
+    """Starts a stub peer which answers every POST with 201 after `delay` seconds and returns its host:port."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(delay)
+            body = json.dumps({"message": "ok"}).encode()
+            self.send_response(201)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"127.0.0.1:{server.server_port}"
+
+
+def sequential(nodes, payload):
+    """Posts to one peer after the other, without a timeout or connection reuse."""
+    for node in nodes:
+        try:
+            requests.post(f"http://{node}/broadcast-transaction", json=payload)
+        except requests.exceptions.ConnectionError:
+            continue
+
+
+def concurrent(client, nodes, payload):
+    """Posts to all peers at once over the client's pooled session."""
+    client.post_all(nodes, "/broadcast-transaction", payload)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--peers", type=int, default=8)
+    parser.add_argument("--slow", type=int, default=2)
+    parser.add_argument("--delay", type=float, default=0.5)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    nodes = [
+        start_stub_peer(args.delay if i < args.slow else 0.0) for i in range(args.peers)
+    ]
+    payload = {"sender": "a", "recipient": "b", "amount": 1.0, "signature": "c"}
+    client = PeerClient(timeout=10.0, max_workers=args.peers)
+    for name, broadcast in (
+        ("sequential requests.post", lambda: sequential(nodes, payload)),
+        ("PeerClient.post_all", lambda: concurrent(client, nodes, payload)),
+    ):
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            broadcast()
+        elapsed = (time.perf_counter() - start) / args.rounds
+        print(f"{name:>25}: {elapsed * 1000:8.1f} ms per broadcast")
+    client.close()
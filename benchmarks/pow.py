@@ -0,0 +1,56 @@
+"""Reports how many proof-of-work hashes per second the Miner computes as the number of worker processes grows.
+
+Run it from the repository root:
+
+    python -m benchmarks.pow --rounds 200 --transactions 100
+"""
+
+import os
+import time
+from argparse import ArgumentParser
+
+from mining import Miner
+from transaction import Transaction
+
+
+def make_transactions(count):
+    """Returns `count` transactions with realistically sized (but fake) keys and signatures."""
+    return [
+        Transaction(f"{i:0256x}", f"{i + 1:0256x}", f"{i:0256x}", 1.0)
+        for i in range(count)
+    ]
+
+
+def run(workers, transactions, rounds):
+    """Mines `rounds` proofs and returns the number of hashes computed per second."""
+    miner = Miner(workers)
+    try:
+        # The first search starts the worker pool, which shouldn't be part of the measurement
+        miner.find_proof(transactions, "warmup")
+        miner.attempts = 0
+        start = time.perf_counter()
+        for round_number in range(rounds):
+            miner.find_proof(transactions, f"{round_number:0128x}")
+        elapsed = time.perf_counter() - start
+    finally:
+        miner.close()
+    return miner.attempts / elapsed
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--transactions", type=int, default=100)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+    transactions = make_transactions(args.transactions)
+    workers = 1
+    baseline = None
+    while workers <= args.max_workers:
+        hashes_per_second = run(workers, transactions, args.rounds)
+        baseline = baseline or hashes_per_second
+        print(
+            f"{workers:3d} workers: {hashes_per_second:12.0f} hashes/s "
+            f"({hashes_per_second / baseline:.2f}x)"
+        )
+        workers *= 2
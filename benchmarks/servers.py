@@ -0,0 +1,137 @@
+"""Compares the throughput and latency of the Flask node server (node.py) with the asyncio one (async_node.py). Both
+are started on a fresh chain in a temporary directory, get a wallet and some blocks, and are then loaded by concurrent
+clients sending a mix of reads (balance, chain length, block ranges, open transactions) and new transactions. Idle
+keep-alive connections can be held open on the side, as wallets waiting for their next request would.
+
+Run it from the repository root (async_node.py needs aiohttp):
+
+    python -m benchmarks.servers --clients 64 --seconds 10 --idle 200
+"""
+
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from argparse import ArgumentParser
+
+import requests
+from requests.adapters import HTTPAdapter
+
+SERVERS = {"flask": "node.py", "asyncio": "async_node.py"}
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def start_server(script, port):
+    """Starts a node server in a temporary directory and waits until it answers. Returns the process."""
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, script), "-p", str(port)],
+        cwd=tempfile.mkdtemp(),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    for _ in range(200):
+        try:
+            requests.get(f"http://127.0.0.1:{port}/chain/length", timeout=1)
+            return process
+        except requests.exceptions.ConnectionError:
+            time.sleep(0.05)
+    process.terminate()
+    raise RuntimeError(f"{script} didn't start")
+
+
+def open_idle_connections(port, count):
+    """Opens connections which send one request and then stay idle (keep-alive)."""
+    connections = []
+    for _ in range(count):
+        connection = socket.create_connection(("127.0.0.1", port))
+        connection.sendall(
+            b"GET /chain/length HTTP/1.1\r\nHost: localhost\r\nConnection: keep-alive\r\n\r\n"
+        )
+        connections.append(connection)
+    return connections
+
+
+def run_load(port, clients, seconds):
+    """Sends requests from `clients` threads for `seconds` and returns the latencies and the number of errors."""
+    url = f"http://127.0.0.1:{port}"
+    requests_mix = [
+        ("GET", "/balance", None),
+        ("GET", "/chain/length", None),
+        ("GET", "/chain?from=0&to=10", None),
+        ("GET", "/transactions", None),
+        ("POST", "/transaction", True),
+    ]
+    latencies = []
+    errors = []
+    deadline = time.perf_counter() + seconds
+
+    def client(number):
+        session = requests.Session()
+        session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        own_latencies = []
+        own_errors = 0
+        i = 0
+        while time.perf_counter() < deadline:
+            method, path, is_transaction = requests_mix[i % len(requests_mix)]
+            # Signatures are deterministic, so every transaction needs its own recipient
+            json = (
+                {"recipient": f"{number}-{i}", "amount": 0.01}
+                if is_transaction
+                else None
+            )
+            start = time.perf_counter()
+            try:
+                response = session.request(method, url + path, json=json, timeout=30)
+                if response.status_code >= 500:
+                    own_errors += 1
+            except requests.exceptions.RequestException:
+                own_errors += 1
+            own_latencies.append(time.perf_counter() - start)
+            i += 1
+        latencies.extend(own_latencies)
+        errors.append(own_errors)
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, sum(errors)
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--idle", type=int, default=0)
+    parser.add_argument("--blocks", type=int, default=20)
+    parser.add_argument("--port", type=int, default=5600)
+    parser.add_argument("--servers", nargs="+", choices=SERVERS, default=list(SERVERS))
+    args = parser.parse_args()
+    for offset, name in enumerate(args.servers):
+        port = args.port + offset
+        process = start_server(SERVERS[name], port)
+        try:
+            requests.post(f"http://127.0.0.1:{port}/wallet")
+            for _ in range(args.blocks):
+                requests.post(f"http://127.0.0.1:{port}/mine")
+            idle = open_idle_connections(port, args.idle)
+            latencies, errors = run_load(port, args.clients, args.seconds)
+            for connection in idle:
+                connection.close()
+        finally:
+            process.terminate()
+            process.wait()
+        latencies.sort()
+        print(
+            f"{name:>7}: {len(latencies) / args.seconds:7.0f} requests/s, "
+            f"p50 {percentile(latencies, 0.5) * 1000:7.1f} ms, "
+            f"p99 {percentile(latencies, 0.99) * 1000:7.1f} ms, {errors} errors"
+        )
@@ -0,0 +1,51 @@
+"""Compares testing proofs by serializing all hash inputs for every proof (as Verification.valid_proof used to do)
+against a ProofContext (which serializes them once) for different mempool sizes. Both must give the same results.
+
+Run it from the repository root:
+
+    python -m benchmarks.valid_proof --proofs 2000
+"""
+
+import time
+from argparse import ArgumentParser
+
+from benchmarks.pow import make_transactions
+from utility.hash_util import hash_string_256
+from utility.verification import ProofContext
+
+
+def full_valid_proof(transactions, last_hash, proof):
+    """The proof validation which rebuilds the whole hash input for every proof."""
+    guess = (
+        str([tx.to_ordered_dict() for tx in transactions]) + str(last_hash) + str(proof)
+    ).encode()
+    return hash_string_256(guess)[0:2] == "00"
+
+
+def measure(test, proofs):
+    """Returns the seconds needed to test the proofs 0 ... proofs - 1 and the results of the tests."""
+    start = time.perf_counter()
+    results = [test(proof) for proof in range(proofs)]
+    return time.perf_counter() - start, results
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--proofs", type=int, default=2000)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[0, 10, 100, 1000])
+    args = parser.parse_args()
+    last_hash = "f" * 128
+    for size in args.sizes:
+        transactions = make_transactions(size)
+        context = ProofContext(transactions, last_hash)
+        full_time, full_results = measure(
+            lambda proof: full_valid_proof(transactions, last_hash, proof),
+            args.proofs,
+        )
+        context_time, context_results = measure(context.is_valid, args.proofs)
+        assert full_results == context_results, "results differ"
+        print(
+            f"{size:5d} transactions: full {args.proofs / full_time:10.0f}/s, "
+            f"ProofContext {args.proofs / context_time:10.0f}/s "
+            f"({full_time / context_time:.1f}x)"
+        )
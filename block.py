@@ -1,7 +1,11 @@
 """Defines the Block class, which represents a single block in the blockchain."""
 
+import json
 from time import time
 
+from transaction import Transaction
+from utility.codec import decode_block, encode_block
+from utility.hash_util import hash_block
 from utility.printable import Printable
 
 
@@ -10,14 +14,109 @@ class Block(Printable):
     Attributes:
         :index: The index of this block.
         :previous_hash: The hash of the previous block in the chain which this block is part of.
-        :transactions: A list of transactions.
+        :transactions: A tuple of transactions.
         :proof: The proof of work number that yielded this block.
         :timestamp: The timestamp of when this block was added to the blockchain.
+
+    A block is immutable once it's created, so its hash, its JSON form and its binary form are only computed once (on
+    first access) and kept.
     """
 
+    __slots__ = (
+        "index",
+        "previous_hash",
+        "transactions",
+        "proof",
+        "timestamp",
+        "_hash",
+        "_json",
+        "_bytes",
+    )
+
     def __init__(self, index, previous_hash, transactions, proof, timestamp=None):
-        self.index = index
-        self.previous_hash = previous_hash
-        self.transactions = transactions
-        self.proof = proof
-        self.timestamp = timestamp or time()
+        object.__setattr__(self, "index", index)
+        object.__setattr__(self, "previous_hash", previous_hash)
+        object.__setattr__(self, "transactions", tuple(transactions))
+        object.__setattr__(self, "proof", proof)
+        object.__setattr__(self, "timestamp", timestamp or time())
+        object.__setattr__(self, "_hash", None)
+        object.__setattr__(self, "_json", None)
+        object.__setattr__(self, "_bytes", None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"Block is immutable, can't set {name}")
+
+    def __reduce__(self):
+        return Block, (
+            self.index,
+            self.previous_hash,
+            self.transactions,
+            self.proof,
+            self.timestamp,
+        )
+
+    @property
+    def hash(self):
+        """The hash of this block, which the next block stores as its previous_hash."""
+        if self._hash is None:
+            object.__setattr__(self, "_hash", hash_block(self))
+        return self._hash
+
+    def to_json(self):
+        """Returns the block as compact JSON bytes with sorted keys (the format jsonify uses)."""
+        if self._json is None:
+            object.__setattr__(
+                self,
+                "_json",
+                json.dumps(
+                    self.to_dict(), sort_keys=True, separators=(",", ":")
+                ).encode(),
+            )
+        return self._json
+
+    def to_bytes(self):
+        """Returns the block in the compact binary format of utility.codec. Raises a ValueError if the block holds
+        values the format can't represent exactly (JSON has to be used then).
+        """
+        if self._bytes is None:
+            object.__setattr__(self, "_bytes", encode_block(self.to_dict()))
+        return self._bytes
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Creates a block from the binary format returned by to_bytes.
+
+        Arguments:
+            :data: The encoded block.
+        """
+        block, end = decode_block(data)
+        result = cls.from_dict(block)
+        if end == len(data):
+            # Decoding is exact, so the given bytes are the block's binary form
+            object.__setattr__(result, "_bytes", bytes(data))
+        return result
+
+    @classmethod
+    def from_dict(cls, block):
+        """Creates a block (including its transactions) from a dict as returned by to_dict.
+
+        Arguments:
+            :block: The dict with the block's data.
+        """
+        return cls(
+            block["index"],
+            block["previous_hash"],
+            [Transaction.from_dict(tx) for tx in block["transactions"]],
+            block["proof"],
+            block["timestamp"],
+        )
+
+    def to_dict(self):
+        """Returns the block (including its transactions) as a dict which can be converted to JSON."""
+        return {
+            "index": self.index,
+            "previous_hash": self.previous_hash,
+            "transactions": [tx.to_dict() for tx in self.transactions],
+            "proof": self.proof,
+            "timestamp": self.timestamp,
+        }
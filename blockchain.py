@@ -1,45 +1,133 @@
 """Provides the Blockchain class."""
 
-import functools
+import itertools
 import json
+import os
 import pickle
-
-import requests
+import threading
 
 from block import Block
+from events import EventBus
+from gossip import GossipOutbox
+from ledger import Ledger
+from mempool import Mempool
+from mining import Miner
+from peer_client import PeerClient
+from storage import Storage
 from transaction import Transaction
-from utility.hash_util import hash_block
-from utility.verification import Verification
-from wallet import Wallet
+from transaction_index import TransactionIndex
+from utility.codec import CONTENT_TYPE, decode_blocks, is_binary
+from utility.rwlock import RWLock
+from utility.sequence_view import SequenceView
+from utility.verification import SignatureVerifier, Verification
 
 # The reward we give to miners (for creating a new block)
 MINING_REWARD = 10
+# The maximum number of open transactions put into a mined block by default (the mining reward comes on top)
+MAX_BLOCK_TRANSACTIONS = 1000
+# A snapshot of the ledger is saved whenever this many blocks were added to the ledger since the last one
+SNAPSHOT_INTERVAL = 1000
+# The number of block hashes requested from a peer in the first step of the search for the last common block (the
+# window doubles with every further step)
+SYNC_HASH_WINDOW = 32
 
 
 class Blockchain:
     """The Blockchain class manages the chain of blocks as well as open transactions and the node on which it's
     running.
+
+    The methods can be called from several threads at once. Reads (balances, blocks, open transactions) share a
+    reader-writer lock, changes (appending blocks, adding transactions, replacing the chain, changing the peers) hold
+    it exclusively. Searching for proofs, verifying signatures and talking to peers happen outside of the lock, so
+    they don't block the readers.
     """
 
-    def __init__(self, public_key, node_id):
-        """The constructor for the Blockchain class."""
+    def __init__(
+        self,
+        public_key,
+        node_id,
+        miner=None,
+        verifier=None,
+        peer_client=None,
+        gossip=None,
+        mempool=None,
+        max_block_transactions=MAX_BLOCK_TRANSACTIONS,
+        events=None,
+    ):
+        """The constructor for the Blockchain class.
+
+        Arguments:
+            :public_key: The public key of the wallet of this node.
+            :node_id: The id (port) of this node.
+            :miner: The Miner which searches for proofs of work (searches in the calling process by default).
+            :verifier: The SignatureVerifier which checks the signatures of transactions in blocks (verifies in the
+                calling process by default).
+            :peer_client: The PeerClient used to talk to the peer nodes.
+            :gossip: The GossipOutbox which broadcasts new transactions and blocks to the peer nodes.
+            :mempool: The Mempool which holds the open transactions (uses the default size limit by default).
+            :max_block_transactions: The maximum number of open transactions in a mined block (None = unlimited).
+            :events: The EventBus which gets the new blocks, the changes of the open transactions and the peers.
+        """
         # Our starting block for the blockchain
         genesis_block = Block(0, "", [], 100, 0)
-        # Initializing our (empty) blockchain list
+        # Initializing our (empty) blockchain, load_data replaces it with the blocks stored in the block log
         self.__chain = [genesis_block]
-        # Unhandled transactions
-        self.__open_transactions = []
+        # Unhandled transactions, indexed by signature and sender
+        self.__mempool = mempool if mempool is not None else Mempool()
+        self.max_block_transactions = max_block_transactions
+        # Confirmed balances per address
+        self.__ledger = Ledger()
+        # The number of leading blocks of the chain which were added to the ledger (it's built lazily, starting from
+        # the last snapshot)
+        self.__ledger_length = 0
+        # The chain length covered by the last saved ledger snapshot
+        self.__snapshot_length = 0
+        self.snapshot_interval = SNAPSHOT_INTERVAL
+        # The hashes of trusted blocks by block index, blocks up to the last checkpoint aren't verified again
+        self.__checkpoints = {}
+        # The locations of the confirmed transactions by address and signature
+        self.__transactions = TransactionIndex()
+        # The position in the chain of every block, by block hash
+        self.__heights = {}
+        # The number of leading blocks of the chain which were added to the hash and transaction indexes (they're built
+        # lazily)
+        self.__indexed_length = 0
         self.public_key = public_key
         self.__peer_nodes = set()
         self.blockchain_file_text = f"blockchain-{node_id}.txt"
         self.blockchain_file_pickle = f"blockchain-{node_id}.pickle"
         self.resolve_conflicts = False
-        self.load_data_json()
+        # Called whenever the last block of the chain changes
+        self.__tip_listeners = []
+        # Guards the chain, the mempool, the indexes and the peer nodes
+        self.__lock = RWLock()
+        # Guards the lazily built indexes and ledger, which readers catch up with the chain
+        self.__index_lock = threading.Lock()
+        # Only one conflict resolution at a time, so the chain isn't replaced while it's compared with the peers'
+        self.__resolve_lock = threading.Lock()
+        # Only one state file write at a time. Saves which were requested while another one was written are covered by
+        # the next write, so a burst of changes doesn't rewrite the file for every single one.
+        self.__save_lock = threading.Lock()
+        self.__save_requests = itertools.count(1)
+        self.__saved_request = 0
+        self.__miner = miner or Miner()
+        self.__verifier = verifier or SignatureVerifier()
+        self.__peers = peer_client or PeerClient()
+        self.__gossip = gossip or GossipOutbox(self.__peers)
+        self.__storage = Storage(node_id)
+        self.__events = events if events is not None else EventBus()
+        self.load_data()
+        self.__mempool.add_listener(self.__publish_mempool_change)
 
     @property
     def chain(self):
-        """Returns a copy of the blockchain list."""
-        return self.__chain[:]
+        """Returns a read-only view of the blockchain (without copying or decoding it). The view is a snapshot as long
+        as blocks are only appended, but resolve rewrites the blocks after the ones it shares with the winning chain.
+        Reads which must see one consistent chain while it may be replaced use the get_block_* methods, which read
+        under the lock.
+        """
+        with self.__lock.read():
+            return SequenceView(self.__chain)
 
     @chain.setter
     def chain(self, val):
@@ -48,169 +136,316 @@ class Blockchain:
 
     @property
     def open_transactions(self):
-        """Returns a copy of the open transactions list."""
-        return self.__open_transactions[:]
+        """Returns a read-only snapshot of the open transactions (copied at most once per change of the mempool)."""
+        with self.__lock.read():
+            return self.__mempool.snapshot()
 
     @open_transactions.setter
     def open_transactions(self, val):
         """The open_transactions is immutable from outside the class."""
         pass
 
-    def load_data_json(self):
-        """Initializes blockchain + open transactions data from a file."""
+    def load_data(self):
+        """Initializes blockchain + open transactions data by opening the block log. Blocks are only decoded when
+        they're accessed, so this doesn't depend on the chain length. A node which still has a snapshot file from older
+        versions gets it migrated to the block log first.
+        """
+        migrate = not self.__storage.has_log() and os.path.exists(
+            self.blockchain_file_text
+        )
+        chain, open_transactions, peer_nodes = self.__storage.load()
+        self.__checkpoints = self.__storage.load_checkpoints()
+        migrated = self.__read_data_json() if migrate else None
+        if migrated is not None:
+            blocks, open_transactions, peer_nodes = migrated
+            chain.replace(blocks)
+        if len(chain) == 0:
+            # Persist the genesis block so positions in the log match the block indexes
+            chain.append(self.__chain[0])
+        self.__chain = chain
+        self.__mempool.replace(open_transactions)
+        self.__peer_nodes = set(peer_nodes)
+        self.__reindex()
+        if migrated is not None:
+            self.save_data()
+            # The old file is only put aside once the open transactions + peer nodes are on disk
+            try:
+                self.__storage.write_state()
+            except IOError as e:
+                print(f"Saving file {self.__storage.state_file} failed: {e}")
+            else:
+                os.replace(
+                    self.blockchain_file_text, f"{self.blockchain_file_text}.migrated"
+                )
+
+    def save_data(self):
+        """Saves the open transactions + peer nodes. Blocks are appended to the block log when they're added.
+
+        The state is copied under the lock and written (and fsync'ed) by the storage together with the next sync of
+        the blocks, so a burst of transactions only rewrites the state file once. It must not be called while holding
+        the lock.
+        """
+        request = next(self.__save_requests)
+        with self.__save_lock:
+            if self.__saved_request >= request:
+                # Another thread saved the state after this change
+                return
+            # Every save requested up to here is covered by the state copied below
+            self.__saved_request = next(self.__save_requests)
+            with self.__lock.read():
+                open_transactions = self.__mempool.snapshot()
+                peer_nodes = list(self.__peer_nodes)
+            self.__storage.save_state(open_transactions, peer_nodes)
+
+    def close(self):
+        """Syncs the blocks which were appended since the last sync, writes the saved state and closes the block log."""
+        with self.__lock.write():
+            self.__storage.close()
+
+    def __read_data_json(self):
+        """Reads the snapshot file of older versions (the format used before the block log). Returns a tuple of the
+        blocks, the open transactions and the peer nodes or None if the file can't be read.
+        """
         try:
             with open(self.blockchain_file_text, mode="r") as f:
                 file_content = f.readlines()
                 orig_blockchain = json.loads(file_content[0][:-1])
                 orig_open_transactions = json.loads(file_content[1][:-1])
-                updated_blockchain = []
-                for block in orig_blockchain:
-                    converted_trasactions = [
-                        Transaction(
-                            tx["sender"],
-                            tx["recipient"],
-                            tx["signature"],
-                            tx["amount"],
-                        )
-                        for tx in block["transactions"]
-                    ]
-                    updated_block = Block(
-                        block["index"],
-                        block["previous_hash"],
-                        converted_trasactions,
-                        block["proof"],
-                        block["timestamp"],
-                    )
-                    updated_blockchain.append(updated_block)
-                self.__chain = updated_blockchain
-                updated_transactions = []
-                for tx in orig_open_transactions:
-                    updated_transaction = Transaction(
-                        tx["sender"],
-                        tx["recipient"],
-                        tx["signature"],
-                        tx["amount"],
-                    )
-                    updated_transactions.append(updated_transaction)
-                self.__open_transactions = updated_transactions
                 peer_nodes = json.loads(file_content[2])
-                self.__peer_nodes = set(peer_nodes)
-        except (IOError, IndexError) as e:
+                blocks = [Block.from_dict(block) for block in orig_blockchain]
+                open_transactions = [
+                    Transaction.from_dict(tx) for tx in orig_open_transactions
+                ]
+        except (IOError, IndexError, ValueError, KeyError) as e:
             print(
                 f"Exception accessing file {self.blockchain_file_text} encountered: {e}"
             )
+            return None
+        return blocks, open_transactions, peer_nodes
 
     def load_data_pickle(self):
-        """Initializes blockchain + open transactions data from a file."""
-        try:
-            with open(self.blockchain_file_pickle, mode="rb") as f:
-                file_content = pickle.loads(f.read())
-                self.__chain = file_content["blockchain"]
-                self.__open_transactions = file_content["open_transactions"]
-        except (IOError, IndexError) as e:
-            print(
-                f"Exception accessing file {self.blockchain_file_pickle} encountered: {e}"
-            )
-
-    def save_data_json(self):
-        """Saves blockchain + open transactions snapshot to a file."""
-        try:
-            with open(self.blockchain_file_text, mode="w") as f:
-                saveable_blockchain = [
-                    block.__dict__
-                    for block in [
-                        Block(
-                            block_el.index,
-                            block_el.previous_hash,
-                            [tx.__dict__ for tx in block_el.transactions],
-                            block_el.proof,
-                            block_el.timestamp,
-                        )
-                        for block_el in self.__chain
-                    ]
-                ]
-                f.write(json.dumps(saveable_blockchain))
-                f.write("\n")
-                saveable_transactions = [tx.__dict__ for tx in self.__open_transactions]
-                f.write(json.dumps(saveable_transactions))
-                f.write("\n")
-                f.write(json.dumps(list(self.__peer_nodes)))
-        except IOError as e:
-            print(f"Saving file {self.blockchain_file_text} failed: {e}")
+        """Initializes blockchain + open transactions data from a file. The blocks replace the ones in the block log."""
+        with self.__lock.write():
+            try:
+                with open(self.blockchain_file_pickle, mode="rb") as f:
+                    file_content = pickle.loads(f.read())
+                    self.__chain.replace(file_content["blockchain"])
+                    self.__mempool.replace(file_content["open_transactions"])
+            except (IOError, IndexError) as e:
+                print(
+                    f"Exception accessing file {self.blockchain_file_pickle} encountered: {e}"
+                )
+            self.__reindex()
 
     def save_data_pickle(self):
         """Saves blockchain + open transactions snapshot to a file."""
-        try:
-            with open(self.blockchain_file_pickle, mode="wb") as f:
-                save_data = {
-                    "blockchain": self.__chain,
-                    "open_transactions": self.__open_transactions,
-                }
-                f.write(pickle.dumps(save_data))
-        except IOError as e:
-            print(f"Saving file {self.blockchain_file_pickle} failed: {e}")
+        with self.__lock.read():
+            try:
+                with open(self.blockchain_file_pickle, mode="wb") as f:
+                    save_data = {
+                        "blockchain": list(self.__chain),
+                        "open_transactions": list(self.__mempool),
+                    }
+                    f.write(pickle.dumps(save_data))
+            except IOError as e:
+                print(f"Saving file {self.blockchain_file_pickle} failed: {e}")
 
-    def proof_of_work(self):
+    def proof_of_work(self, transactions=None, last_hash=None, cancelled=None):
         """Generate a proof of work for the open transactions, the hash of the previous block and a random number
-        (which is guessed until it fits).
+        (which is guessed until it fits). Returns None if the search was cancelled.
+
+        Arguments:
+            :transactions: The transactions of the block (the ones mine_block would select by default).
+            :last_hash: The hash of the previous block (the last block of the chain by default).
+            :cancelled: A threading.Event which stops the search when it's set.
         """
-        last_block = self.__chain[-1]
-        last_hash = hash_block(last_block)
-        proof = 0
-        # Try different PoW numbers and return the first valid one
-        while not Verification.valid_proof(self.__open_transactions, last_hash, proof):
-            proof += 1
-        return proof
+        with self.__lock.read():
+            if transactions is None:
+                transactions = self.__mempool.select(self.max_block_transactions)
+            if last_hash is None:
+                last_hash = self.get_tip_hash()
+        # The search doesn't hold the lock, the chain may change meanwhile
+        return self.__miner.find_proof(transactions, last_hash, cancelled)
 
     def get_balance(self, sender=None):
         """Calculate and return the balance for a participant."""
-        if sender is None:
-            if self.public_key is None:
+        with self.__lock.read():
+            if sender is None:
+                if self.public_key is None:
+                    return None
+                participant = self.public_key
+            else:
+                participant = sender
+            self.__update_ledger()
+            return self.__ledger.get_balance(
+                participant, self.__mempool.pending_amount(participant)
+            )
+
+    def get_chain_length(self):
+        """Returns the number of blocks in the chain."""
+        with self.__lock.read():
+            return len(self.__chain)
+
+    def get_tip_hash(self):
+        """Returns the hash of the last block of the chain."""
+        with self.__lock.read():
+            return self.__chain[-1].hash
+
+    def get_block_hashes(self, start, end):
+        """Returns the hashes of the blocks from index start (inclusive) to index end (exclusive).
+
+        Arguments:
+            :start: The index of the first block.
+            :end: The index after the last block.
+        """
+        with self.__lock.read():
+            return [block.hash for block in self.__chain[start:end]]
+
+    def get_block_bytes(self, start, end):
+        """Returns the blocks from index start (inclusive) to index end (exclusive) in the binary block format. Blocks
+        which are stored in that format are read from the block log without decoding them.
+
+        Arguments:
+            :start: The index of the first block.
+            :end: The index after the last block.
+        """
+        with self.__lock.read():
+            block_bytes = []
+            for height in range(start, min(end, len(self.__chain))):
+                record = self.__chain.read_record(height)
+                block_bytes.append(
+                    record if is_binary(record) else self.__chain[height].to_bytes()
+                )
+            return block_bytes
+
+    def get_block_json(self, start, end):
+        """Returns the JSON form of the blocks from index start (inclusive) to index end (exclusive).
+
+        Arguments:
+            :start: The index of the first block.
+            :end: The index after the last block.
+        """
+        with self.__lock.read():
+            return [
+                self.__chain.get_json(height)
+                for height in range(start, min(end, len(self.__chain)))
+            ]
+
+    def get_block(self, block_hash):
+        """Returns the block of the chain which has the given hash or None if there is no such block.
+
+        Arguments:
+            :block_hash: The hash of the block.
+        """
+        with self.__lock.read():
+            self.__update_indexes()
+            height = self.__heights.get(block_hash)
+            if height is None:
                 return None
-            participant = self.public_key
-        else:
-            participant = sender
-        # Fetch a list of all sent coin amounts for the given person (empty lists are returned if the person was NOT the
-        # sender) This fetches sent amounts of transactions that were already included in blocks of the blockchain
-        tx_sender = [
-            [tx.amount for tx in block.transactions if tx.sender == participant]
-            for block in self.__chain
-        ]
-        # Fetch a list of all sent coin amounts for the given person (empty lists are returned if the person was NOT the
-        # sender) This fetches sent amounts of open transactions (to avoid double spending)
-        open_tx_sender = [
-            tx.amount for tx in self.__open_transactions if tx.sender == participant
-        ]
-        tx_sender.append(open_tx_sender)
-        amount_sent = functools.reduce(
-            lambda tx_sum, tx_amount: tx_sum + sum(tx_amount)
-            if len(tx_amount) > 0
-            else tx_sum,
-            tx_sender,
-            0,
-        )
-        # This fetches received coin amounts of transactions that were already included in blocks of the blockchain We
-        # ignore open transactions here because you shouldn't be able to spend coins before the transaction was confirmed
-        # + included in a block
-        tx_recipient = [
-            [tx.amount for tx in block.transactions if tx.recipient == participant]
-            for block in self.__chain
-        ]
-        amount_received = functools.reduce(
-            lambda tx_sum, tx_amount: tx_sum + sum(tx_amount)
-            if len(tx_amount) > 0
-            else tx_sum,
-            tx_recipient,
-            0,
-        )
-        # Return the total balance
-        return amount_received - amount_sent
+            return self.__chain[height]
+
+    def get_transaction_location(self, signature):
+        """Returns the block containing the transaction with the given signature and the transaction's position in
+        the block or None if the transaction isn't part of the chain.
+
+        Arguments:
+            :signature: The signature of the transaction.
+        """
+        with self.__lock.read():
+            self.__update_indexes()
+            location = self.__transactions.find(signature)
+            if location is None:
+                return None
+            return self.__chain[location[0]], location[1]
+
+    def get_address_transactions(self, address):
+        """Returns the block and position of every confirmed transaction sent or received by an address, in chain
+        order.
+
+        Arguments:
+            :address: The address of the participant.
+        """
+        with self.__lock.read():
+            self.__update_indexes()
+            return [
+                (self.__chain[height], position)
+                for height, position in self.__transactions.locations(address)
+            ]
+
+    def get_open_transaction(self, signature):
+        """Returns the open transaction with the given signature or None if there is no such transaction.
+
+        Arguments:
+            :signature: The signature of the transaction.
+        """
+        with self.__lock.read():
+            return self.__mempool.get(signature)
+
+    def get_mempool_stats(self):
+        """Returns the depth of the mempool and the number of evicted transactions."""
+        with self.__lock.read():
+            return self.__mempool.stats()
+
+    def verify_ledger(self):
+        """Checks the incremental balance ledger against a full rescan of the chain."""
+        with self.__lock.read():
+            self.__update_ledger()
+            return Verification.verify_ledger(
+                self.__ledger, self.__mempool, self.__chain
+            )
+
+    def verify_chain(self):
+        """Verifies the blocks of the local chain after the last checkpoint."""
+        with self.__lock.read():
+            return Verification.verify_chain(
+                self.__chain, self.__verifier, self.__checkpoints
+            )
+
+    def get_checkpoints(self):
+        """Returns the hashes of the trusted blocks by block index."""
+        with self.__lock.read():
+            return dict(self.__checkpoints)
+
+    def create_checkpoint(self, height=None):
+        """Verifies the chain up to a block, trusts that block from now on and saves a ledger snapshot at it. Returns
+        False if the chain isn't valid.
+
+        Arguments:
+            :height: The index of the block (the last block by default).
+        """
+        with self.__lock.write():
+            if height is None:
+                height = len(self.__chain) - 1
+            blocks = self.__chain[: height + 1]
+            if not Verification.verify_chain(
+                blocks, self.__verifier, self.__checkpoints
+            ):
+                return False
+            self.__checkpoints[height] = blocks[height].hash
+            self.__storage.save_checkpoints(self.__checkpoints)
+            ledger = Ledger()
+            ledger.rebuild(blocks)
+            self.__save_snapshot(ledger, height + 1)
+            return True
+
+    def verify_snapshot(self):
+        """Checks the saved ledger snapshot against a full rescan of the blocks it covers. Returns False if there is
+        no snapshot which fits the chain or if the snapshot differs.
+        """
+        with self.__lock.read():
+            snapshot = self.__load_snapshot()
+            if snapshot is None:
+                return False
+            ledger = Ledger()
+            ledger.rebuild(self.__chain[: snapshot["length"]])
+            return ledger.to_dict() == snapshot["ledger"]
 
     def get_last_blockchain_value(self):
         """Returns the last value of the current blockchain."""
-        if len(self.__chain) < 1:
-            return None
-        return self.__chain[-1]
+        with self.__lock.read():
+            if len(self.__chain) < 1:
+                return None
+            return self.__chain[-1]
 
     def add_transaction(
         self, recipient, sender, signature, amount=1.0, is_receiving=False
@@ -228,94 +463,139 @@ class Blockchain:
         #     "recipient": recipient,
         #     "amount": amount
         # }
-        if self.public_key is None:
-            return False
         transaction = Transaction(sender, recipient, signature, amount)
-        if Verification.verify_transaction(transaction, self.get_balance):
-            self.__open_transactions.append(transaction)
-            self.save_data_json()
-            if not is_receiving:
-                for node in self.__peer_nodes:
-                    url = f"http://{node}/broadcast-transaction"
-                    try:
-                        response = requests.post(
-                            url,
-                            json={
-                                "sender": sender,
-                                "recipient": recipient,
-                                "amount": amount,
-                                "signature": signature,
-                            },
-                        )
-                        if response.status_code == 400 or response.status_code == 500:
-                            print("Transaction declined, needs resolving")
-                            return False
-                    except requests.exceptions.ConnectionError:
-                        continue
-            return True
-        return False
+        return self.add_transactions([transaction], is_receiving)[0]
+
+    def add_transactions(self, transactions, is_receiving=False):
+        """Adds a batch of transactions to the open transactions and returns a list which says for every transaction
+        whether it was added. The signatures are verified by the SignatureVerifier (in parallel if it has several
+        workers), the funds are checked in order, so coins spent by earlier transactions of the batch can't be spent
+        again. Transactions which are already pending are rejected without verifying them again. The open
+        transactions are saved once for the whole batch.
+
+        Arguments:
+            :transactions: The transactions which should be added.
+            :is_receiving: Whether the transactions were broadcast by another node (they aren't broadcast again then).
+        """
+        if self.public_key is None:
+            return [False] * len(transactions)
+        with self.__lock.read():
+            # Identical copies within the batch are verified once. Transactions which merely share a signature (e.g. a
+            # forged one reusing the signature of another) are verified on their own.
+            positions = {}
+            for position, tx in enumerate(transactions):
+                if tx.signature not in self.__mempool:
+                    key = (tx.sender, tx.recipient, str(tx.amount), tx.signature)
+                    positions.setdefault(key, position)
+        new_positions = list(positions.values())
+        # The signatures are verified without holding the lock
+        signatures_valid = [False] * len(transactions)
+        for position, valid in zip(
+            new_positions,
+            self.__verifier.check([transactions[p] for p in new_positions]),
+        ):
+            signatures_valid[position] = valid
+        results = []
+        added_transactions = []
+        with self.__lock.write():
+            for transaction, signature_valid in zip(transactions, signatures_valid):
+                # The mempool reserves the amounts of added transactions, so the balance already covers the batch.
+                # Adding fails for duplicates (also within the batch).
+                added = (
+                    signature_valid
+                    and self.get_balance(transaction.sender) >= transaction.amount
+                    and self.__mempool.add(transaction)
+                )
+                if added:
+                    added_transactions.append(transaction)
+                results.append(added)
+            peer_nodes = list(self.__peer_nodes)
+        if len(added_transactions) > 0:
+            self.save_data()
+        if len(added_transactions) > 0 and not is_receiving:
+            # The transactions are sent to the peers in the background, their answers don't change the result
+            for transaction in added_transactions:
+                self.__gossip.send_transaction(peer_nodes, transaction)
+        return results
 
-    def mine_block(self):
-        """Create a new block and add open transactions to it."""
+    def mine_block(self, cancelled=None):
+        """Create a new block and add the oldest open transactions to it (at most max_block_transactions of them). The
+        remaining transactions stay open for the next block. Returns None if mining failed or was cancelled, or if
+        another block was added to the chain (or the selected transactions were dropped from the mempool) in the
+        meantime.
+
+        Arguments:
+            :cancelled: A threading.Event which stops the search for the proof when it's set.
+        """
         # Fetch the currently last block of the blockchain
         if self.public_key is None:
             return None
-        last_block = self.get_last_blockchain_value()
-        # Hash the last block (=> to be able to compare it to the stored hash value)
-        hashed_block = hash_block(last_block)
-        proof = self.proof_of_work()
+        with self.__lock.read():
+            # Hash the last block (=> to be able to compare it to the stored hash value)
+            hashed_block = self.get_tip_hash()
+            selected_transactions = self.__mempool.select(self.max_block_transactions)
+        proof = self.proof_of_work(selected_transactions, hashed_block, cancelled)
+        if proof is None:
+            return None
         # Miners should be rewarded, so let's create a reward transaction
         reward_transaction = Transaction("MINING", self.public_key, "", MINING_REWARD)
         # Copy transaction instead of manipulating the original open_transactions list
         # This ensures that if for some reason the mining should fail, we don't have the reward transaction stored in the
         # open transactions
-        copied_open_transactions = self.__open_transactions[:]
-        for tx in copied_open_transactions:
-            if not Wallet.verify_transaction(tx):
-                return None
+        copied_open_transactions = list(selected_transactions)
+        if len(self.__verifier.find_invalid(copied_open_transactions)) > 0:
+            return None
         copied_open_transactions.append(reward_transaction)
-        block = Block(
-            len(self.__chain),
-            hashed_block,
-            copied_open_transactions,
-            proof,
-        )
-        self.__chain.append(block)
-        self.__open_transactions = []
-        self.save_data_json()
-        for node in self.__peer_nodes:
-            url = f"http://{node}/broadcast-block"
-            converted_block = block.__dict__.copy()
-            converted_block["transactions"] = [
-                tx.__dict__ for tx in converted_block["transactions"]
-            ]
-            try:
-                response = requests.post(url, json={"block": converted_block})
-                if response.status_code == 400 or response.status_code == 500:
-                    print("Block declined, needs resolving")
-                if response.status_code == 409:
-                    self.resolve_conflicts = True
-            except requests.exceptions.ConnectionError:
-                continue
+        with self.__lock.write():
+            if self.get_tip_hash() != hashed_block or not all(
+                tx.signature in self.__mempool for tx in selected_transactions
+            ):
+                # The block would no longer follow the last block of the chain or its transactions were evicted (and
+                # their funds may be spent again)
+                return None
+            block = Block(
+                len(self.__chain),
+                hashed_block,
+                copied_open_transactions,
+                proof,
+            )
+            if not self.__append_block(block):
+                return None
+            self.__mempool.remove(selected_transactions)
+            peer_nodes = list(self.__peer_nodes)
+        self.save_data()
+        self.__gossip.send_block(peer_nodes, block, self.__mark_conflict)
         return block
 
+    def add_tip_listener(self, listener):
+        """Registers a function which is called (without arguments) whenever the last block of the chain changes.
+
+        Arguments:
+            :listener: The function to call.
+        """
+        with self.__lock.write():
+            self.__tip_listeners.append(listener)
+
+    def __notify_tip_listeners(self):
+        for listener in self.__tip_listeners:
+            listener()
+
+    def __mark_conflict(self):
+        """Called when a peer rejected one of our blocks because its chain differs."""
+        self.resolve_conflicts = True
+
     def add_block(self, block):
         """Adds a block mined by someone else to the local blockchain."""
-        transactions = [
-            Transaction(
-                tx["sender"],
-                tx["recipient"],
-                tx["signature"],
-                tx["amount"],
-            )
-            for tx in block["transactions"]
-        ]
+        transactions = [Transaction.from_dict(tx) for tx in block["transactions"]]
         proof_is_valid = Verification.valid_proof(
             transactions[:-1], block["previous_hash"], block["proof"]
         )
-        hashes_match = hash_block(self.chain[-1]) == block["previous_hash"]
+        hashes_match = self.get_tip_hash() == block["previous_hash"]
         if not proof_is_valid or not hashes_match:
             return False
+        # The last transaction is the mining reward, which isn't signed
+        if len(self.__verifier.find_invalid(transactions[:-1])) > 0:
+            return False
         converted_block = Block(
             block["index"],
             block["previous_hash"],
@@ -323,75 +603,163 @@ class Blockchain:
             block["proof"],
             block["timestamp"],
         )
-        self.__chain.append(converted_block)
-        stored_transactions = self.__open_transactions[:]
-        for incoming_tx in block["transactions"]:
-            for open_tx in stored_transactions:
-                if (
-                    open_tx.sender == incoming_tx["sender"]
-                    and open_tx.recipient == incoming_tx["recipient"]
-                    and open_tx.amount == incoming_tx["amount"]
-                    and open_tx.signature == incoming_tx["signature"]
-                ):
-                    try:
-                        self.__open_transactions.remove(open_tx)
-                    except ValueError:
-                        print("Item was already removed")
-        self.save_data_json()
+        with self.__lock.write():
+            # Another block may have been added while the signatures were verified. The indexes look blocks up by their
+            # index, so it must match the position in the chain.
+            if self.get_tip_hash() != block["previous_hash"]:
+                return False
+            if block["index"] != len(self.__chain):
+                return False
+            if not self.__append_block(converted_block):
+                return False
+            # Open transactions which are part of the block are dropped (looked up by signature, so this only depends
+            # on the size of the block)
+            removed = self.__mempool.remove(transactions)
+        if removed > 0:
+            self.save_data()
         return True
 
     def resolve(self):
-        """Resolves conflicts between blockchain nodes by replacing our chain with the longest one in the network."""
-        winner_chain = self.chain
-        replace = False
-        for node in self.__peer_nodes:
-            url = f"http://{node}/chain"
-            try:
-                response = requests.get(url)
-                node_chain = response.json()
-                node_chain = [
-                    Block(
-                        block["index"],
-                        block["previous_hash"],
-                        [
-                            Transaction(
-                                tx["sender"],
-                                tx["recipient"],
-                                tx["signature"],
-                                tx["amount"],
-                            )
-                            for tx in block["transactions"]
-                        ],
-                        block["proof"],
-                        block["timestamp"],
-                    )
-                    for block in node_chain
-                ]
-                node_chain_length = len(node_chain)
-                local_chain_length = len(winner_chain)
-                if (
-                    node_chain_length > local_chain_length
-                    and Verification.verify_chain(node_chain)
-                ):
-                    winner_chain = node_chain
-                    replace = True
-            except requests.exceptions.ConnectionError:
-                continue
-        self.resolve_conflicts = False
-        self.__chain = winner_chain
-        if replace:
-            self.__open_transactions = []
-        self.save_data_json()
+        """Resolves conflicts between blockchain nodes by replacing our chain with the longest one in the network.
+
+        All peers are asked concurrently. Peers are asked for their chain length first. For a longer chain, the last
+        block it shares with ours is searched by comparing block hashes and only the blocks after it are downloaded and
+        verified. Chains which contradict a checkpoint are rejected, full chains are only verified after the last
+        checkpoint.
+        """
+        with self.__resolve_lock:
+            # The peers are asked without holding the lock. Blocks may be appended meanwhile, but only resolve
+            # replaces blocks (and it holds the resolve lock), so the view stays a snapshot.
+            local_chain = self.chain
+            results = self.__peers.map(
+                lambda node: self.__fetch_longer_chain(node, local_chain),
+                self.get_peer_nodes(),
+            )
+            with self.__lock.write():
+                winner_length = len(self.__chain)
+                replace = False
+                for result in results.values():
+                    if (
+                        result is not None
+                        and result[1] + len(result[0]) > winner_length
+                    ):
+                        # The blocks of the winner chain after the ones it shares with our chain
+                        new_blocks, shared_length = result
+                        winner_length = shared_length + len(new_blocks)
+                        replace = True
+                self.resolve_conflicts = False
+                if replace:
+                    self.__mempool.clear()
+                    if shared_length == len(self.__chain):
+                        # The winner chain only extends our chain
+                        for block in new_blocks:
+                            if not self.__append_block(block):
+                                break
+                    else:
+                        try:
+                            self.__chain.replace(new_blocks, shared_length)
+                        except IOError as e:
+                            print(f"Rewriting the block log failed: {e}")
+                        self.__reindex()
+                        self.__notify_tip_listeners()
+                        self.__events.publish("chain", {"length": len(self.__chain)})
+            if replace:
+                self.save_data()
         return replace
 
+    def __fetch_longer_chain(self, node, chain):
+        """Downloads the blocks of a peer's chain if it's longer than the given chain.
+
+        Returns None if the peer's chain isn't longer or invalid. Otherwise it returns the blocks of the peer's chain
+        after the leading blocks which both chains have in common and the number of those common blocks.
+
+        Arguments:
+            :node: The peer node.
+            :chain: The chain the peer's chain is compared with.
+        """
+        response = self.__peers.get(node, "/chain/length")
+        if response.status_code == 404:
+            # The peer doesn't support incremental syncing, so download its full chain
+            node_chain = self.__get_blocks(node)
+            if len(node_chain) > len(chain) and Verification.verify_chain(
+                node_chain, self.__verifier, self.__checkpoints
+            ):
+                return node_chain, 0
+            return None
+        node_chain_length = response.json()["length"]
+        if node_chain_length <= len(chain):
+            return None
+        ancestor_length = self.__find_shared_length(node, chain)
+        blocks = self.__get_blocks(
+            node, {"from": ancestor_length, "to": node_chain_length}
+        )
+        if ancestor_length == 0:
+            valid = Verification.verify_chain(
+                blocks, self.__verifier, self.__checkpoints
+            )
+        else:
+            valid = Verification.matches_checkpoints(
+                blocks, ancestor_length, self.__checkpoints
+            ) and Verification.verify_blocks(
+                chain[ancestor_length - 1], blocks, self.__verifier
+            )
+        if ancestor_length + len(blocks) > len(chain) and valid:
+            return blocks, ancestor_length
+        return None
+
+    def __get_blocks(self, node, params=None):
+        """Downloads blocks from a peer's /chain, in the binary block format if the peer supports it.
+
+        Arguments:
+            :node: The peer node.
+            :params: The query parameters selecting the block range.
+        """
+        response = self.__peers.get(
+            node,
+            "/chain",
+            params,
+            {"Accept": f"{CONTENT_TYPE}, application/json;q=0.5"},
+        )
+        if response.headers.get("Content-Type", "").startswith(CONTENT_TYPE):
+            blocks = decode_blocks(response.content)
+        else:
+            blocks = response.json()
+        return [Block.from_dict(block) for block in blocks]
+
+    def __find_shared_length(self, node, chain):
+        """Returns the number of leading blocks a peer's chain has in common with the given chain. The peer's block
+        hashes are requested in windows going backwards from the end of the given chain.
+
+        Arguments:
+            :node: The peer node.
+            :chain: The chain the peer's chain is compared with.
+        """
+        end = len(chain)
+        window = SYNC_HASH_WINDOW
+        while end > 0:
+            start = max(0, end - window)
+            response = self.__peers.get(
+                node, "/chain/hashes", {"from": start, "to": end}
+            )
+            node_hashes = response.json()["hashes"]
+            for height in range(min(end, start + len(node_hashes)) - 1, start - 1, -1):
+                if node_hashes[height - start] == chain[height].hash:
+                    return height + 1
+            end = start
+            window *= 2
+        return 0
+
     def add_peer_node(self, node):
         """Adds a new node to the peer node set.
 
         Arguments:
             :node: The node URL which should be added.
         """
-        self.__peer_nodes.add(node)
-        self.save_data_json()
+        with self.__lock.write():
+            if node not in self.__peer_nodes:
+                self.__peer_nodes.add(node)
+                self.__events.publish("peers", {"added": node})
+        self.save_data()
 
     def remove_peer_node(self, node):
         """Removes a node from the peer node set.
@@ -399,9 +767,118 @@ class Blockchain:
         Arguments:
             :node: The node URL which should be removed.
         """
-        self.__peer_nodes.discard(node)
-        self.save_data_json()
+        with self.__lock.write():
+            if node in self.__peer_nodes:
+                self.__peer_nodes.discard(node)
+                self.__events.publish("peers", {"removed": node})
+            self.__gossip.forget(node)
+        self.save_data()
+
+    def __publish_mempool_change(self, added, removed):
+        """Publishes the transactions which were added to and removed from the mempool."""
+        self.__events.publish(
+            "mempool",
+            {
+                "added": [tx.to_dict() for tx in added],
+                "removed": [tx.signature for tx in removed],
+            },
+        )
+
+    def __append_block(self, block):
+        """Appends a block to the chain (which writes it to the block log) and adds it to the indexes if they're
+        built. Returns False if the block couldn't be stored.
+        """
+        try:
+            self.__chain.append(block)
+        except IOError as e:
+            print(f"Appending block {block.index} to the block log failed: {e}")
+            return False
+        if self.__indexed_length == len(self.__chain) - 1:
+            self.__index_block(block)
+        if self.__ledger_length == len(self.__chain) - 1:
+            self.__ledger.add_block(block)
+            self.__ledger_length += 1
+            self.__maybe_save_snapshot()
+        self.__notify_tip_listeners()
+        self.__events.publish("block", block.to_dict())
+        return True
+
+    def __index_block(self, block):
+        """Adds the block after the indexed ones to the hash and transaction indexes."""
+        self.__heights[block.hash] = self.__indexed_length
+        self.__transactions.add_block(block)
+        self.__indexed_length += 1
+
+    def __update_indexes(self):
+        """Adds the blocks which aren't indexed yet to the hash and transaction indexes. The indexes are built on first
+        use (rather than when the chain is loaded), so a node can start serving without decoding its whole chain.
+        Readers catch the indexes up, so this holds its own lock.
+        """
+        with self.__index_lock:
+            for height in range(self.__indexed_length, len(self.__chain)):
+                self.__index_block(self.__chain[height])
+
+    def __update_ledger(self):
+        """Adds the blocks which aren't in the ledger yet to the ledger (see __update_indexes)."""
+        if self.__ledger_length == len(self.__chain):
+            return
+        with self.__index_lock:
+            for height in range(self.__ledger_length, len(self.__chain)):
+                self.__ledger.add_block(self.__chain[height])
+            self.__ledger_length = len(self.__chain)
+            self.__maybe_save_snapshot()
+
+    def __reindex(self):
+        """Drops the indexes after the chain was replaced, they're rebuilt on next use. The ledger starts from the
+        saved snapshot if it still fits the chain.
+        """
+        self.__heights = {}
+        self.__transactions.rebuild([])
+        self.__indexed_length = 0
+        snapshot = self.__load_snapshot()
+        if snapshot is None:
+            self.__ledger = Ledger()
+            self.__ledger_length = 0
+        else:
+            self.__ledger = Ledger.from_dict(snapshot["ledger"])
+            self.__ledger_length = snapshot["length"]
+        self.__snapshot_length = self.__ledger_length
+
+    def __load_snapshot(self):
+        """Returns the saved ledger snapshot or None if there is none or if it doesn't fit the chain (because the
+        chain was replaced since).
+        """
+        snapshot = self.__storage.load_snapshot()
+        if snapshot is None:
+            return None
+        length = snapshot.get("length", 0)
+        if not 0 < length <= len(self.__chain) or (
+            self.__chain[length - 1].hash != snapshot.get("block_hash")
+        ):
+            return None
+        return snapshot
+
+    def __maybe_save_snapshot(self):
+        """Saves a ledger snapshot if enough blocks were added to the ledger since the last one."""
+        if self.__ledger_length - self.__snapshot_length >= self.snapshot_interval:
+            self.__save_snapshot(self.__ledger, self.__ledger_length)
+
+    def __save_snapshot(self, ledger, length):
+        """Saves the ledger covering the first `length` blocks as the snapshot."""
+        try:
+            self.__storage.save_snapshot(
+                {
+                    "length": length,
+                    "block_hash": self.__chain[length - 1].hash,
+                    "ledger": ledger.to_dict(),
+                }
+            )
+        except IOError as e:
+            print(f"Saving file {self.__storage.snapshot_file} failed: {e}")
+            return
+        self.__snapshot_length = length
 
     def get_peer_nodes(self):
         """Return a list of all connected peer nodes."""
-        return list(self.__peer_nodes)
+        with self.__lock.read():
+            return list(self.__peer_nodes)
@@ -0,0 +1,52 @@
+"""Creates and verifies the checkpoints and ledger snapshots of a node. Stop the node before running it.
+
+python checkpoint.py --port 5000 create [--height 1200]
+python checkpoint.py --port 5000 verify
+python checkpoint.py --port 5000 list
+"""
+
+import sys
+from argparse import ArgumentParser
+
+from blockchain import Blockchain
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("-p", "--port", type=int, default=5000)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    create_parser = subparsers.add_parser(
+        "create",
+        help="Verify the chain up to a block, trust the block and save a ledger snapshot at it.",
+    )
+    create_parser.add_argument(
+        "--height", type=int, help="Index of the block (the last block by default)."
+    )
+    subparsers.add_parser(
+        "verify",
+        help="Verify the chain after the last checkpoint and the ledger snapshot.",
+    )
+    subparsers.add_parser("list", help="Show the checkpoints.")
+    args = parser.parse_args()
+    blockchain = Blockchain(None, args.port)
+    if args.command == "create":
+        length = blockchain.get_chain_length()
+        height = length - 1 if args.height is None else args.height
+        if not 0 <= height < length:
+            print(f"The chain only has the blocks 0 to {length - 1}")
+            sys.exit(1)
+        if not blockchain.create_checkpoint(height):
+            print("The chain is invalid, no checkpoint created")
+            sys.exit(1)
+        print(f"Created checkpoint {height}: {blockchain.get_chain_length()} blocks")
+    elif args.command == "verify":
+        chain_valid = blockchain.verify_chain()
+        snapshot_valid = blockchain.verify_snapshot()
+        print(
+            f"Chain after the last checkpoint: {'valid' if chain_valid else 'INVALID'}"
+        )
+        print(f"Ledger snapshot: {'valid' if snapshot_valid else 'INVALID or missing'}")
+        if not chain_valid or not snapshot_valid:
+            sys.exit(1)
+    else:
+        for height, block_hash in sorted(blockchain.get_checkpoints().items()):
+            print(f"{height}: {block_hash}")
@@ -0,0 +1,144 @@
+"""Provides the EventBus class, which streams the changes of a node (new blocks, open transactions and peers) to
+subscribers such as the /events endpoint.
+"""
+
+import json
+import threading
+from collections import deque
+
+# The number of recent events which are kept for subscribers who reconnect
+EVENT_HISTORY = 1000
+# The number of events which may wait for a subscriber before it has to start over
+SUBSCRIBER_QUEUE_SIZE = 1000
+# The seconds after which an idle event stream gets a comment, so the connection isn't closed as inactive
+KEEPALIVE_INTERVAL = 15
+
+
+def encode_event(event):
+    """Returns an event in the server-sent events format.
+
+    Arguments:
+        :event: The event as a tuple of id, kind and data.
+    """
+    event_id, kind, data = event
+    return f"id: {event_id}\nevent: {kind}\ndata: {json.dumps(data)}\n\n"
+
+
+def parse_event_id(value):
+    """Returns the event id sent by a reconnecting client (in the Last-Event-ID header) or None if there is none.
+
+    Arguments:
+        :value: The value of the header.
+    """
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class EventBus:
+    """Publishes events to all subscribers. An event is a tuple of its id (counting up from 1), its kind and its data,
+    which can be serialized as JSON.
+
+    Publishing never blocks: every subscriber has its own bounded queue. A subscriber whose queue overflows (because
+    it doesn't keep up) loses the queued events and gets a "reset" event instead, which tells it to reload the full
+    state. The recent events are kept, so a subscriber who reconnects with the id of the last event it received gets
+    the ones it missed (or a "reset" event if they're no longer kept).
+
+    Attributes:
+        :history: The number of recent events which are kept.
+        :queue_size: The maximum number of events waiting for a subscriber.
+    """
+
+    def __init__(self, history=EVENT_HISTORY, queue_size=SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.__events = deque(maxlen=history)
+        self.__next_id = 1
+        self.__subscriptions = set()
+        self.__lock = threading.Lock()
+
+    def publish(self, kind, data):
+        """Sends an event to all subscribers.
+
+        Arguments:
+            :kind: The kind of the event (e.g. "block").
+            :data: The data of the event.
+        """
+        with self.__lock:
+            event = (self.__next_id, kind, data)
+            self.__next_id += 1
+            self.__events.append(event)
+            for subscription in self.__subscriptions:
+                subscription.put(event)
+
+    def subscribe(self, last_id=None, notify=None):
+        """Returns a new Subscription which receives all events published from now on. Call unsubscribe once it's no
+        longer read.
+
+        Arguments:
+            :last_id: The id of the last event the subscriber received before, the events after it are queued first.
+            :notify: Called (without arguments, on the publishing thread) whenever an event was queued, e.g. to wake up
+                an event loop.
+        """
+        with self.__lock:
+            subscription = Subscription(self.queue_size, notify)
+            last_published = self.__next_id - 1
+            if last_id is not None and last_id != last_published:
+                # The missed events aren't kept any more, or the ids started over (because the node restarted)
+                if last_id > last_published or self.__events[0][0] > last_id + 1:
+                    subscription.put((last_published, "reset", {}))
+                else:
+                    for event in self.__events:
+                        if event[0] > last_id:
+                            subscription.put(event)
+            self.__subscriptions.add(subscription)
+            return subscription
+
+    def unsubscribe(self, subscription):
+        """Stops sending events to a subscription.
+
+        Arguments:
+            :subscription: The subscription returned by subscribe.
+        """
+        with self.__lock:
+            self.__subscriptions.discard(subscription)
+
+    def stats(self):
+        """Returns the number of subscribers and the id of the last event."""
+        with self.__lock:
+            return {
+                "subscribers": len(self.__subscriptions),
+                "last_id": self.__next_id - 1,
+            }
+
+
+class Subscription:
+    """The queue of events waiting for one subscriber of an EventBus."""
+
+    def __init__(self, queue_size, notify=None):
+        self.__queue_size = queue_size
+        self.__notify = notify
+        self.__events = deque()
+        self.__condition = threading.Condition()
+
+    def put(self, event):
+        """Queues an event, or replaces all queued events with a "reset" event if the queue is full."""
+        with self.__condition:
+            if len(self.__events) >= self.__queue_size:
+                self.__events.clear()
+                event = (event[0], "reset", {})
+            self.__events.append(event)
+            self.__condition.notify_all()
+        if self.__notify is not None:
+            self.__notify()
+
+    def get(self, timeout=None):
+        """Returns the next event or None if there was none within the timeout.
+
+        Arguments:
+            :timeout: The maximum number of seconds to wait (0 doesn't wait, None waits forever).
+        """
+        with self.__condition:
+            if not self.__condition.wait_for(lambda: self.__events, timeout):
+                return None
+            return self.__events.popleft()
@@ -0,0 +1,236 @@
+"""Provides the GossipOutbox class, which broadcasts transactions and blocks to the peer nodes in the background."""
+
+import threading
+import time
+from collections import deque
+
+from utility.cache import LRUCache
+from utility.codec import CONTENT_TYPE
+
+
+class GossipOutbox:
+    """Queues transactions and blocks for the peer nodes and sends them from a background thread, so broadcasting
+    doesn't block the caller.
+
+    Every peer has its own queue. Consecutive transactions are sent as one batch (to /broadcast-transactions, or one at
+    a time to older peers without it), blocks are sent one at a time, in the binary block format unless the peer only
+    understands JSON. If a peer can't be reached (or fails with a server error), its queue is retried with an
+    exponential backoff and the batch is dropped after `max_attempts` attempts. Transactions and blocks which were
+    queued recently are not queued again.
+
+    Attributes:
+        :batch_size: The maximum number of transactions sent to a peer in one request.
+        :max_attempts: The number of attempts after which a batch is dropped.
+        :backoff: The seconds to wait before the first retry (doubled for every further retry).
+    """
+
+    def __init__(
+        self, peer_client, batch_size=100, max_attempts=5, backoff=0.5, seen_size=10000
+    ):
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.__peers = peer_client
+        # Pending items per peer, each item is a tuple of (kind, payload, on_conflict)
+        self.__queues = {}
+        # Number of failed attempts and the earliest time for the next attempt per peer
+        self.__failures = {}
+        self.__seen = LRUCache(seen_size)
+        self.__in_flight = 0
+        self.__condition = threading.Condition()
+        self.__thread = None
+        self.__stats = {"sent": 0, "retries": 0, "dropped": 0, "duplicates": 0}
+        # Peers which rejected a binary block, blocks are sent to them as JSON
+        self.__json_peers = set()
+        # Peers without /broadcast-transactions, transactions are sent to them one at a time
+        self.__single_peers = set()
+
+    def send_transaction(self, nodes, transaction):
+        """Queues a transaction for the given peers.
+
+        Arguments:
+            :nodes: The peer nodes.
+            :transaction: The transaction which should be broadcast.
+        """
+        self.__enqueue(
+            nodes,
+            ("transaction", transaction.signature),
+            ("transaction", transaction.to_dict(), None),
+        )
+
+    def send_block(self, nodes, block, on_conflict=None):
+        """Queues a block for the given peers.
+
+        Arguments:
+            :nodes: The peer nodes.
+            :block: The block which should be broadcast.
+            :on_conflict: Called when a peer answers that the block conflicts with its chain.
+        """
+        self.__enqueue(nodes, ("block", block.hash), ("block", block, on_conflict))
+
+    def forget(self, node):
+        """Drops everything which is queued for a peer (e.g. because it was removed).
+
+        Arguments:
+            :node: The peer node.
+        """
+        with self.__condition:
+            self.__queues.pop(node, None)
+            self.__failures.pop(node, None)
+            self.__json_peers.discard(node)
+            self.__single_peers.discard(node)
+            self.__condition.notify_all()
+
+    def flush(self, timeout=None):
+        """Waits until all queued items were sent (or dropped). Returns False if the timeout expired before.
+
+        Arguments:
+            :timeout: The maximum number of seconds to wait.
+        """
+        with self.__condition:
+            return self.__condition.wait_for(
+                lambda: self.__in_flight == 0 and not any(self.__queues.values()),
+                timeout,
+            )
+
+    def stats(self):
+        """Returns the number of queued items and the counters of sent, retried, dropped and duplicate items."""
+        with self.__condition:
+            return dict(
+                self.__stats,
+                queued=sum(len(queue) for queue in self.__queues.values()),
+            )
+
+    def __enqueue(self, nodes, key, item):
+        with self.__condition:
+            if key in self.__seen:
+                self.__stats["duplicates"] += 1
+                return
+            self.__seen.put(key, True)
+            for node in nodes:
+                self.__queues.setdefault(node, deque()).append(item)
+            if self.__thread is None:
+                self.__thread = threading.Thread(target=self.__run, daemon=True)
+                self.__thread.start()
+            self.__condition.notify_all()
+
+    def __next_batches(self):
+        """Takes the next batch off the queue of every peer which isn't waiting for a retry."""
+        now = time.monotonic()
+        batches = {}
+        for node, queue in self.__queues.items():
+            if not queue or self.__failures.get(node, (0, 0))[1] > now:
+                continue
+            batch = [queue.popleft()]
+            while (
+                batch[0][0] == "transaction"
+                and queue
+                and queue[0][0] == "transaction"
+                and len(batch) < self.batch_size
+            ):
+                batch.append(queue.popleft())
+            batches[node] = batch
+        return batches
+
+    def __wait_time(self):
+        """Returns the seconds until the next peer can be retried or None if no peer waits for a retry."""
+        retry_times = [
+            retry_at
+            for node, (_, retry_at) in self.__failures.items()
+            if self.__queues.get(node)
+        ]
+        if not retry_times:
+            return None
+        return max(0.0, min(retry_times) - time.monotonic())
+
+    def __run(self):
+        while True:
+            with self.__condition:
+                batches = self.__next_batches()
+                while not batches:
+                    self.__condition.wait(self.__wait_time())
+                    batches = self.__next_batches()
+                self.__in_flight = len(batches)
+            try:
+                results = self.__peers.map(
+                    lambda node: self.__deliver(node, batches[node]), list(batches)
+                )
+            except Exception as e:
+                # Nothing restarts this thread, so the batches are retried instead
+                print(f"Sending to peers failed: {e!r}")
+                results = dict.fromkeys(batches, False)
+            with self.__condition:
+                for node, delivered in results.items():
+                    self.__finish(node, batches[node], delivered)
+                self.__in_flight = 0
+                self.__condition.notify_all()
+
+    def __finish(self, node, batch, delivered):
+        """Records the result of sending a batch to a peer and requeues the batch if it should be retried."""
+        if delivered:
+            self.__stats["sent"] += len(batch)
+            self.__failures.pop(node, None)
+            return
+        attempts = self.__failures.get(node, (0, 0))[0] + 1
+        if attempts >= self.max_attempts or node not in self.__queues:
+            print(f"Dropping {len(batch)} item(s) for peer {node}")
+            self.__stats["dropped"] += len(batch)
+            self.__failures.pop(node, None)
+            return
+        self.__stats["retries"] += 1
+        self.__failures[node] = (
+            attempts,
+            time.monotonic() + self.backoff * 2 ** (attempts - 1),
+        )
+        self.__queues[node].extendleft(reversed(batch))
+
+    def __post_block(self, node, block):
+        """Sends a block to a peer, in the binary format if possible. Older peers answer a binary block with 400 (or
+        415), the block is sent as JSON to them then and from now on.
+        """
+        if node not in self.__json_peers:
+            try:
+                data = block.to_bytes()
+            except ValueError:
+                data = None
+            if data is not None:
+                response = self.__peers.post(
+                    node, "/broadcast-block", data=data, content_type=CONTENT_TYPE
+                )
+                if response.status_code not in (400, 415):
+                    return response
+                self.__json_peers.add(node)
+        return self.__peers.post(node, "/broadcast-block", {"block": block.to_dict()})
+
+    def __post_transactions(self, node, transactions):
+        """Sends transactions to a peer as one batch. Older peers answer 404, the transactions are sent to them one at a
+        time (to /broadcast-transaction) then and from now on. Returns None in that case, since those peers answer 500
+        for every transaction they don't add (e.g. one they already have), which mustn't be retried.
+        """
+        if node not in self.__single_peers:
+            response = self.__peers.post(
+                node, "/broadcast-transactions", {"transactions": transactions}
+            )
+            if response.status_code != 404:
+                return response
+            self.__single_peers.add(node)
+        for transaction in transactions:
+            self.__peers.post(node, "/broadcast-transaction", transaction)
+        return None
+
+    def __deliver(self, node, batch):
+        """Sends a batch to a peer. Returns False if it should be retried."""
+        kind, payload, on_conflict = batch[0]
+        if kind == "block":
+            response = self.__post_block(node, payload)
+            if response.status_code == 409 and on_conflict is not None:
+                on_conflict()
+        else:
+            response = self.__post_transactions(node, [item[1] for item in batch])
+            if response is None:
+                return True
+        if response.status_code >= 500:
+            return False
+        if response.status_code == 400:
+            print(f"Peer {node} declined the {kind}, needs resolving")
+        return True
@@ -0,0 +1,466 @@
+"""Provides the request handling shared by the node servers (node.py and async_node.py).
+
+The functions get the parsed request (the JSON body, the query parameters) and the objects of the node, and return the
+response and its status code. The servers only read the requests and send the responses, so both answer the same way.
+All of the functions block (they call into the Blockchain), async_node.py runs them on its executor.
+"""
+
+from transaction import Transaction
+from utility.codec import CONTENT_TYPE
+from wallet import Wallet
+
+# The fields a signed transaction needs
+TRANSACTION_FIELDS = ["sender", "recipient", "amount", "signature"]
+
+
+def check_transaction(tx):
+    """Returns why a signed transaction (as a dict) is malformed or None if it isn't.
+
+    Arguments:
+        :tx: The transaction as sent by the client.
+    """
+    if not isinstance(tx, dict) or not all(key in tx for key in TRANSACTION_FIELDS):
+        return "Some data is missing."
+    if not all(
+        isinstance(tx[key], str) for key in ["sender", "recipient", "signature"]
+    ):
+        return "Some data is invalid."
+    # bool is an int as well, but no amount
+    if isinstance(tx["amount"], bool) or not isinstance(tx["amount"], (int, float)):
+        return "Some data is invalid."
+    return None
+
+
+def create_keys(wallet, blockchain):
+    """Creates a new pair of private and public keys."""
+    wallet.create_keys()
+    if wallet.save_keys():
+        # The chain stays loaded, only the wallet it mines for changes
+        blockchain.public_key = wallet.public_key
+        response = {
+            "message": "Keys created and saved.",
+            "public_key": wallet.public_key,
+            "private_key": wallet.private_key,
+            "funds": blockchain.get_balance(),
+        }
+        return response, 201
+    else:
+        response = {"message": "Saving the keys failed."}
+        return response, 500
+
+
+def load_keys(wallet, blockchain):
+    """Loads the keys from the wallet.txt file into the wallet."""
+    if wallet.load_keys():
+        # The chain stays loaded, only the wallet it mines for changes
+        blockchain.public_key = wallet.public_key
+        response = {
+            "message": "Keys loaded.",
+            "public_key": wallet.public_key,
+            "private_key": wallet.private_key,
+            "funds": blockchain.get_balance(),
+        }
+        return response, 201
+    else:
+        response = {"message": "Loading the keys failed."}
+        return response, 500
+
+
+def get_balance(wallet, blockchain):
+    """Gets and returns the balance of the sender's address."""
+    balance = blockchain.get_balance()
+    if balance is not None:
+        response = {
+            "message": "Fetched balance successfully.",
+            "funds": balance,
+        }
+        return response, 200
+    else:
+        response = {
+            "message": "Loading balance failed.",
+            "wallet_set_up": wallet.public_key is not None,
+        }
+        return response, 500
+
+
+def broadcast_transaction(blockchain, values):
+    """Adds a transaction which another node broadcast.
+
+    Arguments:
+        :blockchain: The blockchain of the node.
+        :values: The JSON body of the request (None if it doesn't have one).
+    """
+    if not values:
+        response = {"message": "No data found."}
+        return response, 400
+    error = check_transaction(values)
+    if error is not None:
+        response = {"message": error}
+        return response, 400
+    success = blockchain.add_transaction(
+        values["recipient"],
+        values["sender"],
+        values["signature"],
+        values["amount"],
+        is_receiving=True,
+    )
+    if success:
+        response = {
+            "message": "Successfully added transaction.",
+            "transaction": {key: values[key] for key in TRANSACTION_FIELDS},
+        }
+        return response, 201
+    else:
+        response = {"message": "Creating a transaction failed."}
+        return response, 500
+
+
+def add_transaction_batch(blockchain, transactions, is_receiving):
+    """Adds a batch of signed transactions (as dicts) and returns the result for each of them.
+
+    Arguments:
+        :blockchain: The blockchain of the node.
+        :transactions: The transactions which should be added.
+        :is_receiving: Whether the transactions were broadcast by another node.
+    """
+    errors = [check_transaction(tx) for tx in transactions]
+    valid_transactions = [
+        Transaction.from_dict(tx)
+        for tx, error in zip(transactions, errors)
+        if error is None
+    ]
+    added = iter(blockchain.add_transactions(valid_transactions, is_receiving))
+    results = []
+    for tx, error in zip(transactions, errors):
+        if error is not None:
+            results.append({"success": False, "message": error})
+        else:
+            results.append({"signature": tx["signature"], "success": next(added)})
+    return results
+
+
+def add_transactions(blockchain, values):
+    """Adds a batch of transactions which were signed by their senders.
+
+    Arguments:
+        :blockchain: The blockchain of the node.
+        :values: The JSON body of the request (None if it doesn't have one).
+    """
+    if not values:
+        response = {"message": "No data found."}
+        return response, 400
+    if "transactions" not in values or not isinstance(values["transactions"], list):
+        response = {"message": "Some data is missing."}
+        return response, 400
+    results = add_transaction_batch(
+        blockchain, values["transactions"], is_receiving=False
+    )
+    response = {
+        "message": "Processed transactions.",
+        "results": results,
+        "added": sum(1 for result in results if result["success"]),
+    }
+    return response, 200
+
+
+def broadcast_transactions(blockchain, values):
+    """Adds a batch of transactions which another node broadcast.
+
+    Arguments:
+        :blockchain: The blockchain of the node.
+        :values: The JSON body of the request (None if it doesn't have one).
+    """
+    if not values:
+        response = {"message": "No data found."}
+        return response, 400
+    if "transactions" not in values or not isinstance(values["transactions"], list):
+        response = {"message": "Some data is missing."}
+        return response, 400
+    results = add_transaction_batch(
+        blockchain, values["transactions"], is_receiving=True
+    )
+    response = {"message": "Processed transactions.", "results": results}
+    return response, 200
+
+
+def broadcast_block(blockchain, block):
+    """Adds a block which another node broadcast or flags the chain for resolving if it's ahead of the local one.
+
+    Arguments:
+        :blockchain: The blockchain of the node.
+        :block: The block as a dict.
+    """
+    last_block = blockchain.get_last_blockchain_value()
+    if block["index"] == last_block.index + 1:
+        if blockchain.add_block(block):
+            response = {"message": "Block added successfully."}
+            return response, 201
+        else:
+            response = {"message": "Block seems invalid."}
+            return response, 409
+    elif block["index"] > last_block.index:
+        response = {"message": "Blockchain seems to differ from local blockchain."}
+        blockchain.resolve_conflicts = True
+        return response, 200
+    else:
+        response = {"message": "Blockchain seems to be shorter, block not added."}
+        return response, 409
+
+
+def add_transaction(wallet, blockchain, values):
+    """Signs a transaction with the wallet and adds it to the open transactions.
+
+    Arguments:
+        :wallet: The wallet of the node.
+        :blockchain: The blockchain of the node.
+        :values: The JSON body of the request (None if it doesn't have one).
+    """
+    if wallet.public_key is None:
+        response = {"message": "No wallet set up."}
+        return response, 400
+    if not values:
+        response = {"message": "No data found."}
+        return response, 400
+    required_fields = ["recipient", "amount"]
+    if not all(field in values for field in required_fields):
+        response = {"message": "Required data is missing."}
+        return response, 400
+    recipient, amount = values["recipient"], values["amount"]
+    signature = wallet.sign_transaction(wallet.public_key, recipient, amount)
+    if blockchain.add_transaction(recipient, wallet.public_key, signature, amount):
+        response = {
+            "message": "Successfully added transaction.",
+            "transaction": {
+                "sender": wallet.public_key,
+                "recipient": recipient,
+                "amount": amount,
+                "signature": signature,
+            },
+            "funds": blockchain.get_balance(),
+        }
+        return response, 201
+    else:
+        response = {"message": "Creating a transaction failed."}
+        return response, 500
+
+
+def mine(wallet, blockchain, mining_service):
+    """Mines a block, unless the chain has to be resolved first or the background miner is running."""
+    if blockchain.resolve_conflicts:
+        response = {"message": "Resolve conflicts first, block not added!"}
+        return response, 409
+    if mining_service.status()["running"]:
+        # Both would search for a proof for the same block
+        response = {"message": "The background miner is running, block not added!"}
+        return response, 409
+    block = blockchain.mine_block()
+    if block is not None:
+        response = {
+            "message": "Block added successfully.",
+            "block": block.to_dict(),
+            "funds": blockchain.get_balance(),
+        }
+        return response, 201
+    else:
+        response = {
+            "message": "Adding a block failed.",
+            "wallet_set_up": wallet.public_key is not None,
+        }
+        return response, 500
+
+
+def start_miner(wallet, mining_service):
+    """Starts mining blocks in the background."""
+    if wallet.public_key is None:
+        response = {"message": "No wallet set up."}
+        return response, 400
+    if not mining_service.start():
+        response = {"message": "The miner is already running."}
+        return response, 409
+    response = {"message": "Miner started.", "miner": mining_service.status()}
+    return response, 200
+
+
+def stop_miner(mining_service):
+    """Stops mining blocks in the background."""
+    if not mining_service.stop(timeout=5):
+        response = {"message": "The miner isn't running."}
+        return response, 409
+    response = {"message": "Miner stopped.", "miner": mining_service.status()}
+    return response, 200
+
+
+def resolve_conflicts(blockchain):
+    """Resolves conflicts between blockchain nodes."""
+    if blockchain.resolve():
+        response = {"message": "Chain was replaced!"}
+    else:
+        response = {"message": "Local chain kept!"}
+    return response, 200
+
+
+def get_open_transactions(blockchain):
+    """Returns the open transactions as dicts."""
+    return [tx.to_dict() for tx in blockchain.open_transactions], 200
+
+
+def get_transaction(blockchain, signature):
+    """Returns a transaction by its signature, with the block it's part of (or whether it's still open)."""
+    location = blockchain.get_transaction_location(signature)
+    if location is not None:
+        block, position = location
+        response = {
+            "transaction": block.transactions[position].to_dict(),
+            "pending": False,
+            "block_index": block.index,
+            "block_hash": block.hash,
+            "position": position,
+        }
+        return response, 200
+    transaction = blockchain.get_open_transaction(signature)
+    if transaction is not None:
+        response = {"transaction": transaction.to_dict(), "pending": True}
+        return response, 200
+    response = {"message": "Transaction not found."}
+    return response, 404
+
+
+def get_address_transactions(blockchain, address):
+    """Returns the confirmed transactions sent or received by an address, in chain order."""
+    transactions = [
+        {
+            "transaction": block.transactions[position].to_dict(),
+            "block_index": block.index,
+            "position": position,
+        }
+        for block, position in blockchain.get_address_transactions(address)
+    ]
+    response = {"address": address, "transactions": transactions}
+    return response, 200
+
+
+def get_block_range(query, length):
+    """Returns the block indexes selected by the `from` (inclusive) and `to` (exclusive) query parameters or None if
+    they're invalid.
+
+    Arguments:
+        :query: The query parameters of the request.
+        :length: The length of the chain (the default for `to`).
+    """
+    try:
+        start = int(query.get("from", 0))
+        end = int(query.get("to", length))
+    except ValueError:
+        return None
+    if start < 0 or end < start:
+        return None
+    return start, end
+
+
+def get_chain(blockchain, query, binary):
+    """Returns the body, the content type and the chain length of a /chain response or None if the block range is
+    invalid.
+
+    Arguments:
+        :blockchain: The blockchain of the node.
+        :query: The query parameters of the request.
+        :binary: Whether the client prefers the binary block format over JSON.
+    """
+    # Blocks are read under the Blockchain's lock, since resolve may replace them meanwhile. The chain only grows, so
+    # the range stays within it.
+    length = blockchain.get_chain_length()
+    block_range = get_block_range(query, length)
+    if block_range is None:
+        return None
+    start, end = block_range
+    end = min(end, length)
+    if binary:
+        try:
+            # Blocks stored in the binary format are copied from the block log as they are
+            return (
+                b"".join(blockchain.get_block_bytes(start, end)),
+                CONTENT_TYPE,
+                length,
+            )
+        except ValueError:
+            pass
+    # Blocks never change, so their cached JSON can simply be concatenated
+    body = b"[" + b",".join(blockchain.get_block_json(start, end)) + b"]"
+    return body, "application/json", length
+
+
+def get_chain_hashes(blockchain, query):
+    """Returns the hashes of the blocks selected by the `from` and `to` query parameters (see get_chain)."""
+    block_range = get_block_range(query, blockchain.get_chain_length())
+    if block_range is None:
+        response = {"message": "Invalid block range."}
+        return response, 400
+    start, end = block_range
+    response = {"from": start, "hashes": blockchain.get_block_hashes(start, end)}
+    return response, 200
+
+
+def get_chain_length(blockchain):
+    """Returns the length of the chain and the index + hash of its last block."""
+    last_block = blockchain.get_last_blockchain_value()
+    response = {
+        "length": blockchain.get_chain_length(),
+        "tip_index": last_block.index,
+        "tip_hash": last_block.hash,
+    }
+    return response, 200
+
+
+def add_node(blockchain, values):
+    """Adds a new node to the set of nodes.
+
+    Arguments:
+        :blockchain: The blockchain of the node.
+        :values: The JSON body of the request (None if it doesn't have one).
+    """
+    if not values:
+        response = {"message": "No data attached."}
+        return response, 400
+    if "node" not in values:
+        response = {"message": "No node data found."}
+        return response, 400
+    blockchain.add_peer_node(values["node"])
+    response = {
+        "message": "Node added successfully.",
+        "all_nodes": blockchain.get_peer_nodes(),
+    }
+    return response, 201
+
+
+def remove_node(blockchain, node_url):
+    """Removes a node from the set of nodes."""
+    if not node_url:
+        response = {"message": "No node found."}
+        return response, 400
+    blockchain.remove_peer_node(node_url)
+    response = {
+        "message": "Node removed successfully.",
+        "all_nodes": blockchain.get_peer_nodes(),
+    }
+    return response, 200
+
+
+def get_nodes(blockchain):
+    """Returns a list of all nodes."""
+    response = {"all_nodes": blockchain.get_peer_nodes()}
+    return response, 200
+
+
+def get_metrics(blockchain, mining_service, gossip, events):
+    """Returns the statistics of the node's caches, the mempool, the background miner, the gossip outbox and the event
+    streams.
+    """
+    response = {
+        "mempool": blockchain.get_mempool_stats(),
+        "miner": mining_service.status(),
+        "key_cache": Wallet.key_cache_stats(),
+        "signature_cache": Wallet.signature_cache_stats(),
+        "gossip": gossip.stats(),
+        "events": events.stats(),
+    }
+    return response, 200
@@ -0,0 +1,104 @@
+"""Provides the Ledger class, an incremental index of account balances."""
+
+
+class Ledger:
+    """Keeps per-address totals of confirmed coins received and sent. It is updated as blocks come in, so balance
+    lookups don't need to scan the chain. The coins reserved by open transactions are tracked by the Mempool.
+
+    Totals are accumulated block by block in the same order a full rescan of the chain adds them up, so the balances
+    are identical to (not just close to) the ones a rescan produces.
+    """
+
+    def __init__(self):
+        self.__received = {}
+        self.__sent = {}
+
+    def rebuild(self, chain):
+        """Discards all totals and recomputes them from a chain.
+
+        Arguments:
+            :chain: The blocks whose transactions are confirmed.
+        """
+        self.__received = {}
+        self.__sent = {}
+        for block in chain:
+            self.add_block(block)
+
+    @classmethod
+    def from_dict(cls, totals):
+        """Creates a ledger from the totals returned by to_dict (e.g. read from a snapshot).
+
+        Arguments:
+            :totals: The dict with the received and sent totals per address.
+        """
+        ledger = cls()
+        ledger.__received = dict(totals["received"])
+        ledger.__sent = dict(totals["sent"])
+        return ledger
+
+    def to_dict(self):
+        """Returns the received and sent totals per address as a dict which can be converted to JSON."""
+        return {"received": dict(self.__received), "sent": dict(self.__sent)}
+
+    def add_block(self, block):
+        """Adds the transactions of a newly appended block to the confirmed totals.
+
+        Arguments:
+            :block: The block which was appended to the chain.
+        """
+        block_sent = {}
+        block_received = {}
+        for tx in block.transactions:
+            block_sent[tx.sender] = block_sent.get(tx.sender, 0) + tx.amount
+            block_received[tx.recipient] = (
+                block_received.get(tx.recipient, 0) + tx.amount
+            )
+        for address, amount in block_sent.items():
+            self.__sent[address] = self.__sent.get(address, 0) + amount
+        for address, amount in block_received.items():
+            self.__received[address] = self.__received.get(address, 0) + amount
+
+    def get_balance(self, participant, pending=None):
+        """Returns the confirmed coins received minus the coins sent (confirmed or pending) for a participant.
+
+        Arguments:
+            :participant: The address whose balance should be returned.
+            :pending: The coins reserved by the participant's open transactions (None if there are none).
+        """
+        amount_sent = self.__sent.get(participant, 0)
+        if pending is not None:
+            amount_sent = amount_sent + pending
+        return self.__received.get(participant, 0) - amount_sent
+
+    def addresses(self):
+        """Returns all addresses the ledger knows about."""
+        return set(self.__received) | set(self.__sent)
+
+    @staticmethod
+    def rescan_balance(chain, open_transactions, participant):
+        """Calculates the balance of a participant by scanning the whole chain. This is the reference the incremental
+        totals are checked against.
+
+        Arguments:
+            :chain: The blocks whose transactions are confirmed.
+            :open_transactions: The transactions which are not yet part of a block.
+            :participant: The address whose balance should be returned.
+        """
+        amount_sent = 0
+        for block in chain:
+            block_sent = [
+                tx.amount for tx in block.transactions if tx.sender == participant
+            ]
+            if len(block_sent) > 0:
+                amount_sent = amount_sent + sum(block_sent)
+        open_sent = [tx.amount for tx in open_transactions if tx.sender == participant]
+        if len(open_sent) > 0:
+            amount_sent = amount_sent + sum(open_sent)
+        amount_received = 0
+        for block in chain:
+            block_received = [
+                tx.amount for tx in block.transactions if tx.recipient == participant
+            ]
+            if len(block_received) > 0:
+                amount_received = amount_received + sum(block_received)
+        return amount_received - amount_sent
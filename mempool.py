@@ -0,0 +1,254 @@
+"""Provides the Mempool class, an indexed store of the open transactions."""
+
+import heapq
+
+# The maximum number of open transactions a node keeps by default
+MEMPOOL_SIZE = 10000
+# The eviction policies: drop the oldest transaction or the oldest one of the sender with the most open transactions
+EVICTION_POLICIES = ("oldest", "sender")
+
+
+class Mempool:
+    """Holds the transactions which are not yet part of a block, keyed by their signature.
+
+    Transactions are kept in the order they were added. Every sender has its own index of pending transactions and
+    the total amount they reserve, so duplicates are detected and transactions confirmed by a block are removed
+    without scanning all open transactions.
+
+    Pending totals are added up in insertion order (and recomputed from the sender's remaining transactions when one is
+    removed), so they're identical to the sums a full scan of the open transactions produces.
+
+    Once the mempool holds `max_size` transactions, every new transaction evicts an old one. The "oldest" policy evicts
+    the transaction which was added first, the "sender" policy evicts the oldest transaction of the sender with the
+    most open transactions (so a single busy sender can't push out the transactions of everybody else, ties go to the
+    sender whose address sorts first). The senders are kept in a heap by their number of open transactions, so an
+    eviction doesn't look at every sender.
+
+    Attributes:
+        :max_size: The maximum number of open transactions (None = unlimited).
+        :eviction: The eviction policy ("oldest" or "sender").
+    """
+
+    def __init__(self, transactions=(), max_size=MEMPOOL_SIZE, eviction="oldest"):
+        if eviction not in EVICTION_POLICIES:
+            raise ValueError(f"Unknown eviction policy {eviction!r}")
+        if max_size is not None and max_size < 1:
+            raise ValueError("The mempool must hold at least one transaction")
+        self.max_size = max_size
+        self.eviction = eviction
+        self.__evicted = 0
+        # All open transactions by signature, in insertion order
+        self.__transactions = {}
+        # The open transactions of every sender by signature, in insertion order
+        self.__by_sender = {}
+        self.__pending = {}
+        # Entries of (-number of open transactions, sender) for the "sender" policy. Entries whose number is outdated
+        # are skipped when they come up and the heap is rebuilt once they make up most of it.
+        self.__sender_heap = []
+        self.__snapshot = ()
+        # Called with the added and removed transactions after every change
+        self.__listeners = []
+        for tx in transactions:
+            self.add(tx)
+
+    def __len__(self):
+        return len(self.__transactions)
+
+    def __iter__(self):
+        return iter(self.snapshot())
+
+    def __contains__(self, signature):
+        return signature in self.__transactions
+
+    def add(self, transaction):
+        """Adds a transaction. Returns False if a transaction with the same signature is already pending.
+
+        Arguments:
+            :transaction: The transaction which should be added.
+        """
+        if transaction.signature in self.__transactions:
+            return False
+        evicted = []
+        if self.max_size is not None:
+            while len(self.__transactions) >= self.max_size:
+                evicted.append(self.__evict())
+        self.__transactions[transaction.signature] = transaction
+        self.__by_sender.setdefault(transaction.sender, {})[
+            transaction.signature
+        ] = transaction
+        self.__pending[transaction.sender] = (
+            self.__pending.get(transaction.sender, 0) + transaction.amount
+        )
+        self.__count_changed(transaction.sender)
+        self.__snapshot = None
+        self.__notify_listeners([transaction], evicted)
+        return True
+
+    def remove(self, transactions):
+        """Removes the given transactions (e.g. because they were included in a block). Transactions which aren't
+        pending are ignored. Returns the number of removed transactions.
+
+        Arguments:
+            :transactions: The transactions which should be removed.
+        """
+        removed = []
+        changed_senders = set()
+        for tx in transactions:
+            pending_tx = self.__transactions.get(tx.signature)
+            if pending_tx is None or (
+                pending_tx.sender,
+                pending_tx.recipient,
+                pending_tx.amount,
+            ) != (tx.sender, tx.recipient, tx.amount):
+                continue
+            self.__discard(pending_tx)
+            changed_senders.add(tx.sender)
+            removed.append(pending_tx)
+        for sender in changed_senders:
+            self.__recompute_pending(sender)
+        if removed:
+            self.__snapshot = None
+            self.__notify_listeners([], removed)
+        return len(removed)
+
+    def replace(self, transactions):
+        """Removes all transactions and adds the given ones instead.
+
+        Arguments:
+            :transactions: The new open transactions.
+        """
+        self.clear()
+        for tx in transactions:
+            self.add(tx)
+
+    def clear(self):
+        """Removes all transactions."""
+        removed = list(self.__transactions.values())
+        self.__transactions = {}
+        self.__by_sender = {}
+        self.__pending = {}
+        self.__sender_heap = []
+        self.__snapshot = ()
+        if removed:
+            self.__notify_listeners([], removed)
+
+    def add_listener(self, listener):
+        """Registers a function which is called with the list of added and the list of removed (confirmed or evicted)
+        transactions after every change.
+
+        Arguments:
+            :listener: The function to call.
+        """
+        self.__listeners.append(listener)
+
+    def get(self, signature):
+        """Returns the open transaction with the given signature or None if there is no such transaction.
+
+        Arguments:
+            :signature: The signature of the transaction.
+        """
+        return self.__transactions.get(signature)
+
+    def pending_amount(self, sender):
+        """Returns the total amount of the sender's open transactions or None if the sender has none.
+
+        Arguments:
+            :sender: The address of the sender.
+        """
+        return self.__pending.get(sender)
+
+    def senders(self):
+        """Returns the addresses which have open transactions."""
+        return set(self.__pending)
+
+    def select(self, limit=None):
+        """Returns the oldest `limit` open transactions (all of them if limit is None), e.g. to put them into a block.
+
+        Every sender's transactions are taken in the order they were added, so the selected ones never spend more than
+        the sender's balance covers.
+
+        Arguments:
+            :limit: The maximum number of transactions.
+        """
+        transactions = self.snapshot()
+        if limit is None or limit >= len(transactions):
+            return transactions
+        return transactions[:limit]
+
+    def stats(self):
+        """Returns the number of open transactions and senders, the size limit and the number of evicted
+        transactions.
+        """
+        return {
+            "size": len(self.__transactions),
+            "senders": len(self.__by_sender),
+            "max_size": self.max_size,
+            "eviction": self.eviction,
+            "evicted": self.__evicted,
+        }
+
+    def snapshot(self):
+        """Returns the open transactions as a tuple. The tuple is built once after every change, so repeated reads
+        don't copy the transactions.
+        """
+        if self.__snapshot is None:
+            self.__snapshot = tuple(self.__transactions.values())
+        return self.__snapshot
+
+    def __discard(self, transaction):
+        """Removes a pending transaction from the indexes (without recomputing the sender's pending total)."""
+        del self.__transactions[transaction.signature]
+        del self.__by_sender[transaction.sender][transaction.signature]
+        self.__count_changed(transaction.sender)
+
+    def __count_changed(self, sender):
+        """Records the new number of open transactions of a sender in the heap of the "sender" policy."""
+        if self.eviction != "sender":
+            return
+        count = len(self.__by_sender[sender])
+        if count > 0:
+            heapq.heappush(self.__sender_heap, (-count, sender))
+        if len(self.__sender_heap) > 2 * len(self.__by_sender) + 16:
+            self.__sender_heap = [
+                (-len(transactions), address)
+                for address, transactions in self.__by_sender.items()
+                if transactions
+            ]
+            heapq.heapify(self.__sender_heap)
+
+    def __busiest_sender(self):
+        """Returns the sender with the most open transactions."""
+        while True:
+            count, sender = self.__sender_heap[0]
+            if len(self.__by_sender.get(sender, ())) == -count:
+                return sender
+            heapq.heappop(self.__sender_heap)
+
+    def __evict(self):
+        """Removes one transaction according to the eviction policy and returns it."""
+        if self.eviction == "sender":
+            sender = self.__busiest_sender()
+            transaction = next(iter(self.__by_sender[sender].values()))
+        else:
+            transaction = next(iter(self.__transactions.values()))
+        self.__discard(transaction)
+        self.__recompute_pending(transaction.sender)
+        self.__snapshot = None
+        self.__evicted += 1
+        return transaction
+
+    def __notify_listeners(self, added, removed):
+        for listener in self.__listeners:
+            listener(added, removed)
+
+    def __recompute_pending(self, sender):
+        """Adds up the amounts of the sender's remaining open transactions in insertion order."""
+        transactions = self.__by_sender[sender]
+        if not transactions:
+            del self.__by_sender[sender]
+            del self.__pending[sender]
+            return
+        total = 0
+        for tx in transactions.values():
+            total = total + tx.amount
+        self.__pending[sender] = total
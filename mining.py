@@ -0,0 +1,273 @@
+"""Provides the Miner class, which searches for proofs of work on several processes, and the MiningService, which
+mines blocks in the background.
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+
+from utility.verification import ProofContext
+
+# The number of proofs a worker tests before it checks whether another worker already found a valid one
+CHECK_INTERVAL = 256
+
+# The number of proofs tested in the calling process before a search moves to the worker processes. At the fixed
+# difficulty (1 in 256 proofs is valid) nearly every search ends among them, starting the workers would only add
+# overhead.
+INLINE_PROOFS = 4096
+
+# The seconds between checks whether a search on the worker processes was cancelled
+CANCEL_POLL_INTERVAL = 0.05
+
+# The seconds the mining service waits before it tries again after mining a block failed
+RETRY_DELAY = 1.0
+
+# Set in every worker process as soon as one of the workers found a valid proof
+_found = None
+
+
+def _init_worker(found):
+    """Stores the event shared by all workers of the pool."""
+    global _found
+    _found = found
+
+
+def _search(transactions, last_hash, start, step):
+    """Tests the proofs start, start + step, start + 2 * step, ... until one of them is valid or another worker found a
+    valid proof. Returns the proof (or None) and the number of proofs that were tested.
+    """
+    context = ProofContext(transactions, last_hash)
+    proof = start
+    attempts = 0
+    while True:
+        for _ in range(CHECK_INTERVAL):
+            attempts += 1
+            if context.is_valid(proof):
+                _found.set()
+                return proof, attempts
+            proof += step
+        if _found.is_set():
+            return None, attempts
+
+
+class Miner:
+    """Searches for a valid proof of work. The proof numbers are split across a pool of worker processes, worker i tests
+    i, i + workers, i + 2 * workers, ... Once a worker finds a valid proof, all other workers stop. The workers share
+    one stop event, so searches on the pool run one at a time.
+
+    The first INLINE_PROOFS proofs are always tested in the calling process, only longer searches move to the pool.
+
+    Attributes:
+        :workers: The number of worker processes (1 searches in the calling process).
+        :attempts: The total number of proofs tested by this miner.
+    """
+
+    def __init__(self, workers=1):
+        self.workers = workers if workers > 0 else os.cpu_count()
+        self.attempts = 0
+        self.__pool = None
+        self.__found = None
+        # Held by the search running on the pool
+        self.__search_lock = threading.Lock()
+
+    def find_proof(self, transactions, last_hash, cancelled=None):
+        """Returns a proof which is valid for the given transactions and the hash of the previous block. Returns None
+        if the search was cancelled before a proof was found.
+
+        Arguments:
+            :transactions: The transactions of the block for which the proof is created.
+            :last_hash: The previous block's hash.
+            :cancelled: A threading.Event which stops the search when it's set (e.g. because the previous block isn't
+                the last one any more).
+        """
+        context = ProofContext(transactions, last_hash)
+        limit = None if self.workers == 1 else INLINE_PROOFS
+        proof = self.__search_inline(context, limit, cancelled)
+        if proof is not None or limit is None:
+            return proof
+        if cancelled is not None and cancelled.is_set():
+            return None
+        # A search which waits for its turn can still be cancelled
+        while not self.__search_lock.acquire(timeout=CANCEL_POLL_INTERVAL):
+            if cancelled is not None and cancelled.is_set():
+                return None
+        try:
+            return self.__search_pool(transactions, last_hash, cancelled, limit)
+        finally:
+            self.__search_lock.release()
+
+    def close(self):
+        """Shuts down the worker processes."""
+        with self.__search_lock:
+            if self.__pool is not None:
+                self.__pool.terminate()
+                self.__pool.join()
+                self.__pool = None
+
+    def __search_inline(self, context, limit, cancelled):
+        """Tests the proofs 0, 1, 2, ... (up to `limit` if it isn't None) in the calling process. Returns None if none of
+        them is valid or the search was cancelled.
+        """
+        proof = 0
+        while limit is None or proof < limit:
+            if context.is_valid(proof):
+                self.attempts += proof + 1
+                return proof
+            proof += 1
+            if proof % CHECK_INTERVAL == 0 and cancelled and cancelled.is_set():
+                break
+        self.attempts += proof
+        return None
+
+    def __search_pool(self, transactions, last_hash, cancelled, first_proof):
+        """Searches for a proof starting at `first_proof` on the worker processes (see find_proof), the caller holds the
+        search lock.
+        """
+        pool = self.__get_pool()
+        self.__found.clear()
+        results = [
+            pool.apply_async(
+                _search, (transactions, last_hash, first_proof + i, self.workers)
+            )
+            for i in range(self.workers)
+        ]
+        # Wait for all workers, so none of them is still busy with this search when the next one starts
+        proofs = []
+        for result in results:
+            while cancelled is not None and not result.ready():
+                if cancelled.wait(CANCEL_POLL_INTERVAL):
+                    # Stops the workers as if one of them had found a proof
+                    self.__found.set()
+                    break
+            proof, attempts = result.get()
+            self.attempts += attempts
+            if proof is not None:
+                proofs.append(proof)
+        if cancelled is not None and cancelled.is_set():
+            return None
+        return min(proofs)
+
+    def __get_pool(self):
+        if self.__pool is None:
+            self.__found = multiprocessing.Event()
+            self.__pool = multiprocessing.Pool(
+                self.workers, initializer=_init_worker, initargs=(self.__found,)
+            )
+        return self.__pool
+
+
+class MiningService:
+    """Mines blocks on a background thread, one after the other, until it's stopped.
+
+    The search for a proof is cancelled as soon as the last block of the chain changes (because a peer's block was
+    added or the chain was replaced), the service then starts over on the new last block. The time spent on such
+    stale searches is reported by status.
+
+    Attributes:
+        :interval: The seconds to wait after a block was mined before mining the next one.
+    """
+
+    def __init__(self, blockchain, interval=0):
+        self.interval = interval
+        self.__blockchain = blockchain
+        self.__condition = threading.Condition()
+        self.__thread = None
+        self.__running = False
+        # Set to cancel the search in progress, None while no search is in progress
+        self.__cancelled = None
+        self.__search_started = None
+        self.__stats = {
+            "blocks": 0,
+            "stale": 0,
+            "failed": 0,
+            "mining_seconds": 0.0,
+            "stale_seconds": 0.0,
+        }
+        blockchain.add_tip_listener(self.__on_tip_change)
+
+    def start(self):
+        """Starts mining. Returns False if the service is already running."""
+        with self.__condition:
+            if self.__running:
+                return False
+            self.__running = True
+            if self.__thread is None:
+                self.__thread = threading.Thread(target=self.__run, daemon=True)
+                self.__thread.start()
+            return True
+
+    def stop(self, timeout=None):
+        """Stops mining and cancels the search in progress. Returns False if the service isn't running.
+
+        Arguments:
+            :timeout: The maximum number of seconds to wait until the background thread has stopped.
+        """
+        with self.__condition:
+            if not self.__running:
+                return False
+            self.__running = False
+            if self.__cancelled is not None:
+                self.__cancelled.set()
+            self.__condition.notify_all()
+            self.__condition.wait_for(lambda: self.__thread is None, timeout)
+            return True
+
+    def status(self):
+        """Returns whether the service is running and searching for a proof, the seconds spent on the search in
+        progress and the counters of mined blocks, stale and failed searches and the time spent on them.
+        """
+        with self.__condition:
+            searching = self.__cancelled is not None
+            return dict(
+                self.__stats,
+                running=self.__running,
+                searching=searching,
+                search_seconds=(
+                    time.monotonic() - self.__search_started if searching else 0.0
+                ),
+            )
+
+    def __on_tip_change(self):
+        """Cancels the search in progress, its proof wouldn't fit the new last block."""
+        with self.__condition:
+            if self.__cancelled is not None:
+                self.__cancelled.set()
+
+    def __run(self):
+        while True:
+            with self.__condition:
+                if not self.__running:
+                    self.__thread = None
+                    self.__condition.notify_all()
+                    return
+                cancelled = threading.Event()
+                self.__cancelled = cancelled
+                self.__search_started = time.monotonic()
+            # Blocks mined on a chain which conflicts with the peers' would be rejected, so wait until it's resolved
+            conflict = self.__blockchain.resolve_conflicts
+            try:
+                block = None if conflict else self.__blockchain.mine_block(cancelled)
+            except Exception as e:
+                # Counted as a failed search, the thread must keep running (or stop when asked to)
+                print(f"Mining a block failed: {e!r}")
+                block = None
+            with self.__condition:
+                elapsed = time.monotonic() - self.__search_started
+                self.__cancelled = None
+                self.__stats["mining_seconds"] += elapsed
+                delay = 0
+                if conflict:
+                    delay = RETRY_DELAY
+                elif block is not None:
+                    self.__stats["blocks"] += 1
+                    delay = self.interval
+                elif not cancelled.is_set():
+                    self.__stats["failed"] += 1
+                    delay = RETRY_DELAY
+                elif self.__running:
+                    # Cancelled because the last block changed rather than by stop
+                    self.__stats["stale"] += 1
+                    self.__stats["stale_seconds"] += elapsed
+                if delay > 0:
+                    self.__condition.wait_for(lambda: not self.__running, delay)
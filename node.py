@@ -2,13 +2,27 @@ import requests
 from flask import Flask, jsonify, request, send_from_directory
 from flask_cors import CORS
 
-from blockchain import Blockchain
+import handlers
+from blockchain import MAX_BLOCK_TRANSACTIONS, SNAPSHOT_INTERVAL, Blockchain
+from events import KEEPALIVE_INTERVAL, EventBus, encode_event, parse_event_id
+from gossip import GossipOutbox
+from mempool import EVICTION_POLICIES, MEMPOOL_SIZE, Mempool
+from mining import INLINE_PROOFS, Miner, MiningService
+from peer_client import PeerClient
+from utility.codec import CONTENT_TYPE, decode_block
+from utility.verification import SignatureVerifier
 from wallet import Wallet
 
 app = Flask(__name__)
 CORS(app)
 
 
+def respond(result):
+    """Returns the (response, status code) of a handler (see handlers.py) as a JSON response."""
+    response, status = result
+    return jsonify(response), status
+
+
 @app.route("/", methods=["GET"])
 def get_node_ui():
     """Returns the homepage."""
@@ -24,244 +38,205 @@ def get_network_ui():
 @app.route("/wallet", methods=["POST"])
 def create_keys():
     """Creates a new pair of private and public keys."""
-    wallet.create_keys()
-    if wallet.save_keys():
-        global blockchain
-        blockchain = Blockchain(wallet.public_key, port)
-        response = {
-            "message": "Keys created and saved.",
-            "public_key": wallet.public_key,
-            "private_key": wallet.private_key,
-            "funds": blockchain.get_balance(),
-        }
-        return jsonify(response), 201
-    else:
-        response = {"message": "Saving the keys failed."}
-        return jsonify(response), 500
+    return respond(handlers.create_keys(wallet, blockchain))
 
 
 @app.route("/wallet", methods=["GET"])
 def load_keys():
     """Loads the keys from the wallet.txt file into the wallet."""
-    if wallet.load_keys():
-        global blockchain
-        blockchain = Blockchain(wallet.public_key, port)
-        response = {
-            "message": "Keys loaded.",
-            "public_key": wallet.public_key,
-            "private_key": wallet.private_key,
-            "funds": blockchain.get_balance(),
-        }
-        return jsonify(response), 201
-    else:
-        response = {"message": "Loading the keys failed."}
-        return jsonify(response), 500
+    return respond(handlers.load_keys(wallet, blockchain))
 
 
 @app.route("/balance", methods=["GET"])
 def get_balance():
     """Gets and returns the balance of the sender's address."""
-    balance = blockchain.get_balance()
-    if balance is not None:
-        response = {
-            "message": "Fetched balance successfully.",
-            "funds": balance,
-        }
-        return jsonify(response), 200
-    else:
-        response = {
-            "message": "Loading balance failed.",
-            "wallet_set_up": wallet.public_key is not None,
-        }
-        return jsonify(response), 500
+    return respond(handlers.get_balance(wallet, blockchain))
 
 
 @app.route("/broadcast-transaction", methods=["POST"])
 def broadcast_transaction():
     """Broadcasts a transaction to all nodes."""
-    values = request.get_json()
-    if not values:
-        response = {"message": "No data found."}
-        return jsonify(response), 400
-    required_fields = ["sender", "recipient", "amount", "signature"]
-    if not all(key in values for key in required_fields):
-        response = {"message": "Some data is missing."}
-        return jsonify(response), 400
-    success = blockchain.add_transaction(
-        values["recipient"],
-        values["sender"],
-        values["signature"],
-        values["amount"],
-        is_receiving=True,
-    )
-    if success:
-        response = {
-            "message": "Successfully added transaction.",
-            "transaction": {
-                "sender": values["sender"],
-                "recipient": values["recipient"],
-                "amount": values["amount"],
-                "signature": values["signature"],
-            },
-        }
-        return jsonify(response), 201
-    else:
-        response = {"message": "Creating a transaction failed."}
-        return jsonify(response), 500
+    return respond(handlers.broadcast_transaction(blockchain, request.get_json()))
+
+
+@app.route("/transactions/batch", methods=["POST"])
+def add_transactions():
+    """Adds a batch of transactions which were signed by their senders."""
+    return respond(handlers.add_transactions(blockchain, request.get_json()))
+
+
+@app.route("/broadcast-transactions", methods=["POST"])
+def broadcast_transactions():
+    """Adds a batch of transactions which another node broadcast."""
+    return respond(handlers.broadcast_transactions(blockchain, request.get_json()))
 
 
 @app.route("/broadcast-block", methods=["POST"])
 def broadcast_block():
-    """Broadcasts a block to all nodes."""
-    values = request.get_json()
-    if not values:
-        response = {"message": "No data found."}
-        return jsonify(response), 400
-    if "block" not in values:
-        response = {"message": "Some data is missing."}
-        return jsonify(response), 400
-    block = values["block"]
-    if block["index"] == blockchain.chain[-1].index + 1:
-        if blockchain.add_block(block):
-            response = {"message": "Block added successfully."}
-            return jsonify(response), 201
-        else:
-            response = {"message": "Block seems invalid."}
-            return jsonify(response), 409
-    elif block["index"] > blockchain.chain[-1].index:
-        response = {"message": "Blockchain seems to differ from local blockchain."}
-        blockchain.resolve_conflicts = True
-        return jsonify(response), 200
+    """Broadcasts a block to all nodes. The block is sent as JSON ({"block": ...}) or in the binary block format (with
+    the matching Content-Type).
+    """
+    if request.mimetype == CONTENT_TYPE:
+        try:
+            block, _ = decode_block(request.get_data())
+        except ValueError:
+            response = {"message": "Block can't be decoded."}
+            return jsonify(response), 400
     else:
-        response = {"message": "Blockchain seems to be shorter, block not added."}
-        return jsonify(response), 409
+        values = request.get_json()
+        if not values:
+            response = {"message": "No data found."}
+            return jsonify(response), 400
+        if "block" not in values:
+            response = {"message": "Some data is missing."}
+            return jsonify(response), 400
+        block = values["block"]
+    return respond(handlers.broadcast_block(blockchain, block))
 
 
 @app.route("/transaction", methods=["POST"])
 def add_transaction():
     """Adds a transaction to the open transactions list."""
-    if wallet.public_key is None:
-        response = {"message": "No wallet set up."}
-        return jsonify(response), 400
-    values = request.get_json()
-    if not values:
-        response = {"message": "No data found."}
-        return jsonify(response), 400
-    required_fields = ["recipient", "amount"]
-    if not all(field in values for field in required_fields):
-        response = {"message": "Required data is missing."}
-        return jsonify(response), 400
-    recipient, amount = values["recipient"], values["amount"]
-    signature = wallet.sign_transaction(wallet.public_key, recipient, amount)
-    if blockchain.add_transaction(recipient, wallet.public_key, signature, amount):
-        response = {
-            "message": "Successfully added transaction.",
-            "transaction": {
-                "sender": wallet.public_key,
-                "recipient": recipient,
-                "amount": amount,
-                "signature": signature,
-            },
-            "funds": blockchain.get_balance(),
-        }
-        return jsonify(response), 201
-    else:
-        response = {"message": "Creating a transaction failed."}
-        return jsonify(response), 500
+    return respond(handlers.add_transaction(wallet, blockchain, request.get_json()))
 
 
 @app.route("/mine", methods=["POST"])
 def mine():
     """Function to be called by the miner thread."""
-    if blockchain.resolve_conflicts:
-        response = {"message": "Resolve conflicts first, block not added!"}
-        return jsonify(response), 409
-    block = blockchain.mine_block()
-    if block is not None:
-        dict_block = block.__dict__.copy()
-        dict_block["transactions"] = [tx.__dict__ for tx in dict_block["transactions"]]
-        response = {
-            "message": "Block added successfully.",
-            "block": dict_block,
-            "funds": blockchain.get_balance(),
-        }
-        return jsonify(response), 201
-    else:
-        response = {
-            "message": "Adding a block failed.",
-            "wallet_set_up": wallet.public_key is not None,
-        }
-        return jsonify(response), 500
+    return respond(handlers.mine(wallet, blockchain, mining_service))
+
+
+@app.route("/miner/start", methods=["POST"])
+def start_miner():
+    """Starts mining blocks in the background."""
+    return respond(handlers.start_miner(wallet, mining_service))
+
+
+@app.route("/miner/stop", methods=["POST"])
+def stop_miner():
+    """Stops mining blocks in the background."""
+    return respond(handlers.stop_miner(mining_service))
+
+
+@app.route("/miner/status", methods=["GET"])
+def get_miner_status():
+    """Returns the state of the background miner and the time it spent on blocks which were outdated."""
+    return jsonify(mining_service.status()), 200
 
 
 @app.route("/resolve-conflicts", methods=["POST"])
 def resolve_conflicts():
     """Resolves conflicts between blockchain nodes."""
-    replaced = blockchain.resolve()
-    if replaced:
-        response = {"message": "Chain was replaced!"}
-    else:
-        response = {"message": "Local chain kept!"}
-    return jsonify(response), 200
+    return respond(handlers.resolve_conflicts(blockchain))
 
 
 @app.route("/transactions", methods=["GET"])
 def get_open_transactions():
     """Gets and returns the open transactions."""
-    transactions = blockchain.open_transactions
-    dict_transactions = [tx.__dict__ for tx in transactions]
-    return jsonify(dict_transactions), 200
+    return respond(handlers.get_open_transactions(blockchain))
+
+
+@app.route("/tx/<signature>", methods=["GET"])
+def get_transaction(signature):
+    """Returns a transaction by its signature, with the block it's part of (or whether it's still open)."""
+    return respond(handlers.get_transaction(blockchain, signature))
+
+
+@app.route("/address/<address>/transactions", methods=["GET"])
+def get_address_transactions(address):
+    """Returns the confirmed transactions sent or received by an address, in chain order."""
+    return respond(handlers.get_address_transactions(blockchain, address))
 
 
 @app.route("/chain", methods=["GET"])
 def get_chain():
-    """Returns the full blockchain and its current length."""
-    chain_snapshot = blockchain.chain
-    dict_chain = [block.__dict__.copy() for block in chain_snapshot]
-    for dict_block in dict_chain:
-        dict_block["transactions"] = [tx.__dict__ for tx in dict_block["transactions"]]
-    return jsonify(dict_chain), 200
+    """Returns the blocks of the chain. The optional query parameters `from` (inclusive) and `to` (exclusive) select a
+    range of block indexes, the full chain is returned without them. The chain length is sent in the X-Chain-Length
+    header.
+
+    Clients which accept the binary block format get the encoded blocks back to back, everybody else gets JSON.
+    """
+    mimetype = request.accept_mimetypes.best_match(
+        ["application/json", CONTENT_TYPE], default="application/json"
+    )
+    chain = handlers.get_chain(blockchain, request.args, mimetype == CONTENT_TYPE)
+    if chain is None:
+        response = {"message": "Invalid block range."}
+        return jsonify(response), 400
+    body, mimetype, length = chain
+    response = app.response_class(body, status=200, mimetype=mimetype)
+    response.headers["X-Chain-Length"] = str(length)
+    return response
+
+
+@app.route("/chain/hashes", methods=["GET"])
+def get_chain_hashes():
+    """Returns the hashes of the blocks selected by the `from` and `to` query parameters (see /chain)."""
+    return respond(handlers.get_chain_hashes(blockchain, request.args))
+
+
+@app.route("/chain/length", methods=["GET"])
+def get_chain_length():
+    """Returns the length of the chain and the index + hash of its last block."""
+    return respond(handlers.get_chain_length(blockchain))
 
 
 @app.route("/node", methods=["POST"])
 def add_node():
     """Adds a new node to the set of nodes."""
-    values = request.get_json()
-    if not values:
-        response = {"message": "No data attached."}
-        return jsonify(response), 400
-    if "node" not in values:
-        response = {"message": "No node data found."}
-        return jsonify(response), 400
-    node = values["node"]
-    blockchain.add_peer_node(node)
-    response = {
-        "message": "Node added successfully.",
-        "all_nodes": blockchain.get_peer_nodes(),
-    }
-    return jsonify(response), 201
+    return respond(handlers.add_node(blockchain, request.get_json()))
 
 
 @app.route("/node/<node_url>", methods=["DELETE"])
 def remove_node(node_url):
     """Removes a node from the set of nodes."""
-    if node_url == "" or node_url is None:
-        response = {"message": "No node found."}
-        return jsonify(response), 400
-    blockchain.remove_peer_node(node_url)
-    response = {
-        "message": "Node removed successfully.",
-        "all_nodes": blockchain.get_peer_nodes(),
-    }
-    return jsonify(response), 200
+    return respond(handlers.remove_node(blockchain, node_url))
 
 
 @app.route("/nodes", methods=["GET"])
 def get_nodes():
     """Returns a list of all nodes."""
-    nodes = blockchain.get_peer_nodes()
-    response = {"all_nodes": nodes}
-    return jsonify(response), 200
+    return respond(handlers.get_nodes(blockchain))
+
+
+@app.route("/events", methods=["GET"])
+def stream_events():
+    """Streams the changes of the node as server-sent events, so clients don't have to reload the chain, the open
+    transactions or the peer nodes:
+
+    - block: a block was appended (the block).
+    - chain: the chain was replaced (its new length), the blocks have to be reloaded.
+    - mempool: open transactions were added or removed ({"added": [transaction, ...], "removed": [signature, ...]}).
+    - peers: a peer node was added or removed ({"added": node} or {"removed": node}).
+    - reset: events were missed, everything has to be reloaded.
+
+    A client which reconnects (sending the Last-Event-ID header) gets the events it missed.
+    """
+    subscription = events.subscribe(
+        parse_event_id(request.headers.get("Last-Event-ID"))
+    )
+
+    def stream():
+        try:
+            while True:
+                event = subscription.get(KEEPALIVE_INTERVAL)
+                yield ": keep-alive\n\n" if event is None else encode_event(event)
+        finally:
+            events.unsubscribe(subscription)
+
+    response = app.response_class(stream(), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    # Proxies must pass the events on right away
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    """Returns the statistics of the node's caches, the mempool, the background miner, the gossip outbox and the event
+    streams.
+    """
+    return respond(handlers.get_metrics(blockchain, mining_service, gossip, events))
 
 
 if __name__ == "__main__":
@@ -269,8 +244,104 @@ if __name__ == "__main__":
 
     parser = ArgumentParser()
     parser.add_argument("-p", "--port", type=int, default=5000)
+    parser.add_argument(
+        "-w",
+        "--mining-workers",
+        type=int,
+        default=1,
+        help="Number of processes searching for proofs of work (0 = one per CPU). Only searches which take longer "
+        f"than the first {INLINE_PROOFS} proofs use them, at the fixed difficulty nearly all searches end before.",
+    )
+    parser.add_argument(
+        "-v",
+        "--verify-workers",
+        type=int,
+        default=1,
+        help="Number of processes verifying transaction signatures (0 = one per CPU).",
+    )
+    parser.add_argument(
+        "--peer-timeout",
+        type=float,
+        default=5.0,
+        help="Seconds to wait for a peer to answer.",
+    )
+    parser.add_argument(
+        "--peer-workers",
+        type=int,
+        default=8,
+        help="Maximum number of requests sent to peers at the same time.",
+    )
+    parser.add_argument(
+        "--mempool-size",
+        type=int,
+        default=MEMPOOL_SIZE,
+        help="Maximum number of open transactions (0 = unlimited).",
+    )
+    parser.add_argument(
+        "--mempool-eviction",
+        choices=EVICTION_POLICIES,
+        default="oldest",
+        help="Which open transaction is dropped when the mempool is full.",
+    )
+    parser.add_argument(
+        "--block-size",
+        type=int,
+        default=MAX_BLOCK_TRANSACTIONS,
+        help="Maximum number of open transactions in a mined block (0 = unlimited).",
+    )
+    parser.add_argument(
+        "--snapshot-interval",
+        type=int,
+        default=SNAPSHOT_INTERVAL,
+        help="Number of blocks after which a new ledger snapshot is saved.",
+    )
+    parser.add_argument(
+        "--mining-interval",
+        type=float,
+        default=1.0,
+        help="Seconds the background miner waits after each mined block.",
+    )
+    parser.add_argument(
+        "--mine",
+        action="store_true",
+        help="Load the saved wallet and start the background miner right away.",
+    )
     args = parser.parse_args()
     port = args.port
+    miner = Miner(args.mining_workers)
+    verifier = SignatureVerifier(args.verify_workers)
+    peer_client = PeerClient(args.peer_timeout, args.peer_workers)
+    gossip = GossipOutbox(peer_client)
+    mempool = Mempool(
+        max_size=args.mempool_size or None, eviction=args.mempool_eviction
+    )
+    block_size = args.block_size or None
+    events = EventBus()
     wallet = Wallet(port)
-    blockchain = Blockchain(wallet.public_key, port)
-    app.run(host="0.0.0.0", port=port)
+    # The background miner mines for the saved wallet
+    if args.mine:
+        wallet.load_keys()
+    blockchain = Blockchain(
+        wallet.public_key,
+        port,
+        miner,
+        verifier,
+        peer_client,
+        gossip,
+        mempool,
+        block_size,
+        events,
+    )
+    blockchain.snapshot_interval = args.snapshot_interval
+    mining_service = MiningService(blockchain, args.mining_interval)
+    if args.mine:
+        if wallet.public_key is None:
+            print("Not starting the background miner, no wallet could be loaded.")
+        else:
+            mining_service.start()
+    try:
+        app.run(host="0.0.0.0", port=port, threaded=True)
+    finally:
+        # The blocks which weren't synced yet are written to disk before the node exits
+        mining_service.stop(timeout=5)
+        blockchain.close()
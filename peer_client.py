@@ -0,0 +1,101 @@
+"""Provides the PeerClient class, which handles the HTTP communication with peer nodes."""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# The errors which are expected when a peer is unreachable, too slow or answers with something unexpected (including
+# valid JSON with the wrong types or shape)
+PEER_ERRORS = (
+    requests.exceptions.RequestException,
+    ValueError,
+    KeyError,
+    TypeError,
+    IndexError,
+)
+
+
+class PeerClient:
+    """Sends requests to peer nodes. All requests share one requests.Session, so connections to a peer are reused, and
+    every request has a timeout. Requests to several peers are sent concurrently from a bounded thread pool, so a slow
+    peer only delays the answer of that peer.
+
+    Attributes:
+        :timeout: The seconds to wait for a peer to connect and answer.
+        :max_workers: The maximum number of requests which are sent at the same time.
+    """
+
+    def __init__(self, timeout=5.0, max_workers=8):
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.__session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.__session.mount("http://", adapter)
+        self.__executor = ThreadPoolExecutor(max_workers)
+
+    def get(self, node, path, params=None, headers=None):
+        """Sends a GET request to a peer and returns the response.
+
+        Arguments:
+            :node: The peer node (host:port).
+            :path: The path of the request.
+            :params: The query parameters.
+            :headers: Additional request headers (e.g. Accept).
+        """
+        return self.__session.get(
+            f"http://{node}{path}", params=params, headers=headers, timeout=self.timeout
+        )
+
+    def post(self, node, path, json=None, data=None, content_type=None):
+        """Sends a POST request with a JSON (or raw) body to a peer and returns the response.
+
+        Arguments:
+            :node: The peer node (host:port).
+            :path: The path of the request.
+            :json: The data which is sent as JSON.
+            :data: The raw bytes which are sent instead of JSON.
+            :content_type: The Content-Type of the raw bytes.
+        """
+        headers = {"Content-Type": content_type} if content_type else None
+        return self.__session.post(
+            f"http://{node}{path}",
+            json=json,
+            data=data,
+            headers=headers,
+            timeout=self.timeout,
+        )
+
+    def map(self, function, nodes):
+        """Calls a function for every peer concurrently and returns a dict with the result for every peer. The result is
+        None for peers which couldn't be reached or answered with invalid data.
+
+        Arguments:
+            :function: The function which gets called with the peer node.
+            :nodes: The peer nodes.
+        """
+        futures = {node: self.__executor.submit(function, node) for node in nodes}
+        results = {}
+        for node, future in futures.items():
+            try:
+                results[node] = future.result()
+            except PEER_ERRORS as e:
+                print(f"Request to peer {node} failed: {e}")
+                results[node] = None
+        return results
+
+    def post_all(self, nodes, path, json=None):
+        """Sends the same POST request to all given peers concurrently and returns a dict with the response of every
+        peer (None for peers which couldn't be reached).
+
+        Arguments:
+            :nodes: The peer nodes.
+            :path: The path of the request.
+            :json: The data which is sent as JSON.
+        """
+        return self.map(lambda node: self.post(node, path, json), nodes)
+
+    def close(self):
+        """Closes the pooled connections and stops the threads."""
+        self.__executor.shutdown(wait=False)
+        self.__session.close()
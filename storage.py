@@ -0,0 +1,656 @@
+"""Provides the Storage class, which persists the blockchain of a node on disk, and the StoredChain class, which reads
+the stored blocks on demand.
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+from collections.abc import Sequence
+
+from block import Block
+from transaction import Transaction
+from utility.cache import LRUCache
+from utility.codec import is_binary
+
+# Every block record in a segment starts with the payload length and the CRC32 of the payload
+FRAME_HEADER = struct.Struct(">II")
+# Every entry of the offset index holds the segment number, the offset and the payload length of a block record
+INDEX_ENTRY = struct.Struct(">IQI")
+# The file name suffix of segments and of the segments written by a chain replacement which isn't complete yet
+SEGMENT = ".log"
+NEW_SEGMENT = ".log.new"
+# A new segment file is started once the current one grows beyond this size (in bytes)
+SEGMENT_SIZE = 16 * 1024 * 1024
+# The number of decoded blocks a StoredChain keeps in memory
+BLOCK_CACHE_SIZE = 1024
+# The number of bytes of block JSON a StoredChain keeps in memory, so JSON /chain responses don't decode and encode
+# the blocks again
+JSON_CACHE_BYTES = 64 * 1024 * 1024
+
+
+class Storage:
+    """Stores the blocks of a node in an append-only log and the open transactions + peer nodes in a small state file.
+
+    The log is split into segment files (segment-000000.log, segment-000001.log, ...) inside the directory
+    blockchain-<node_id>. A block which was added to the chain is appended as a single framed record, so the write cost
+    doesn't depend on the chain length. Records which were only partially written (e.g. because the node crashed) are
+    detected via their length + checksum and cut off when the log is opened.
+
+    The location of every record is kept in an offset index file (index.bin) next to the segments. Opening the log
+    only checks the end of the index (and indexes records which were written after it), so it doesn't depend on the
+    chain length either. Segments and the index are memory mapped and blocks are only decoded when they're read.
+
+    Appends are flushed to the OS right away, but only fsync'ed once `fsync_batch` blocks were written or
+    `fsync_interval` seconds passed since the last fsync. A timer syncs the blocks which are still unsynced once the
+    interval is over, so they don't wait for the next append, and close syncs them right away. The state file is
+    written by the same timer, so it's rewritten at most once per interval rather than for every change. Reads may
+    happen from several threads, they're serialized with the writes because a write can replace the memory maps.
+
+    Replacing the chain writes the new blocks to new segment files first and then replaces the index atomically, so a
+    crash leaves either the old or the new chain behind, never a shortened one.
+
+    Blocks are stored in the binary format of utility.codec. Blocks which it can't represent (and the records written
+    by older versions) are stored as JSON, which is told apart by the first byte of the record.
+    """
+
+    def __init__(
+        self, node_id, segment_size=SEGMENT_SIZE, fsync_batch=16, fsync_interval=1.0
+    ):
+        # The state file is written later by the sync timer, which mustn't depend on the working directory by then
+        self.directory = os.path.abspath(f"blockchain-{node_id}")
+        self.state_file = os.path.join(self.directory, "state.json")
+        self.index_file = os.path.join(self.directory, "index.bin")
+        self.checkpoint_file = os.path.join(self.directory, "checkpoints.json")
+        self.snapshot_file = os.path.join(self.directory, "snapshot.json")
+        self.segment_size = segment_size
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+        # The number of stored blocks
+        self.__length = 0
+        self.__index = None
+        self.__index_map = None
+        # The number of index entries covered by the index map
+        self.__mapped_entries = 0
+        # Memory maps of the segments by segment number
+        self.__segment_maps = {}
+        self.__segment = None
+        self.__segment_number = None
+        self.__unsynced = 0
+        self.__last_sync = time.monotonic()
+        # Syncs the unsynced blocks once the fsync interval is over
+        self.__sync_timer = None
+        # The (open transactions, peer nodes) which were saved but not yet written to the state file
+        self.__pending_state = None
+        self.__lock = threading.RLock()
+        # Serializes the writes of the state file, so an older state never replaces a newer one
+        self.__state_lock = threading.Lock()
+
+    def __len__(self):
+        return self.__length
+
+    def has_log(self):
+        """Returns whether a block log has been written before."""
+        return len(self.__segment_numbers()) > 0
+
+    def load(self):
+        """Opens the block log and reads the state file.
+
+        Returns a tuple of a StoredChain with the stored blocks, the open transactions and the peer nodes.
+        """
+        with self.__lock:
+            self.__open_index()
+        open_transactions = []
+        peer_nodes = []
+        try:
+            with open(self.state_file, mode="r") as f:
+                state = json.load(f)
+                open_transactions = [
+                    Transaction.from_dict(tx) for tx in state["open_transactions"]
+                ]
+                peer_nodes = state["peer_nodes"]
+        except (IOError, ValueError, KeyError) as e:
+            print(f"Exception accessing file {self.state_file} encountered: {e}")
+        return StoredChain(self), open_transactions, peer_nodes
+
+    def read_block(self, position):
+        """Reads and decodes the block at the given position of the log.
+
+        Arguments:
+            :position: The position of the block (its index in the chain).
+        """
+        record = self.read_record(position)
+        if is_binary(record):
+            return Block.from_bytes(record)
+        return Block.from_dict(json.loads(record))
+
+    def read_record(self, position):
+        """Returns the stored payload of the block at the given position of the log.
+
+        Arguments:
+            :position: The position of the block (its index in the chain).
+        """
+        with self.__lock:
+            number, offset, length = self.__entry(position)
+            start = offset + FRAME_HEADER.size
+            segment_map = self.__segment_map(number, start + length)
+            return segment_map[start : start + length]
+
+    def append_block(self, block):
+        """Appends a single block to the end of the log.
+
+        Arguments:
+            :block: The block which was added to the chain.
+        """
+        payload = self.__encode(block)
+        with self.__lock:
+            f = self.__open_segment()
+            if f.tell() > 0 and f.tell() + len(payload) > self.segment_size:
+                self.__close_segment()
+                f = self.__open_segment(self.__next_segment_number())
+            offset = f.tell()
+            f.write(FRAME_HEADER.pack(len(payload), zlib.crc32(payload)))
+            f.write(payload)
+            f.flush()
+            # The record is written before its index entry, a crash in between is repaired when the log is opened
+            self.__append_entry(self.__segment_number, offset, len(payload))
+            self.__unsynced += 1
+            if (
+                self.__unsynced >= self.fsync_batch
+                or time.monotonic() - self.__last_sync >= self.fsync_interval
+            ):
+                self.sync()
+            else:
+                self.__start_sync_timer()
+
+    def truncate(self, length):
+        """Drops all blocks from the log except for the first `length` ones.
+
+        Arguments:
+            :length: The number of blocks which should be kept.
+        """
+        with self.__lock:
+            if length >= self.__length:
+                return
+            number, offset, _ = self.__entry(length)
+            self.__close_segment()
+            # Pages of a mapping which reach beyond the end of a truncated file must not be accessed anymore
+            self.__close_maps()
+            os.truncate(self.__segment_path(number), offset)
+            for later_number in self.__segment_numbers():
+                if later_number > number:
+                    os.remove(self.__segment_path(later_number))
+            os.truncate(self.index_file, length * INDEX_ENTRY.size)
+            self.__length = length
+
+    def replace_chain(self, blocks, keep=0):
+        """Replaces the stored blocks after the first `keep` ones with the given blocks.
+
+        The new blocks are written (and fsync'ed) to new segment files, which only become part of the log once the new
+        index replaced the old one. The records of the replaced blocks are removed after that.
+
+        Arguments:
+            :blocks: The blocks which follow the kept ones in the new chain.
+            :keep: The number of leading blocks which both chains share and which don't need to be rewritten.
+        """
+        if not blocks:
+            self.truncate(keep)
+            return
+        payloads = [self.__encode(block) for block in blocks]
+        with self.__lock:
+            keep = min(keep, self.__length)
+            self.__close_segment()
+            first_number = self.__next_segment_number()
+            entries = self.__write_new_segments(first_number, payloads)
+            replaced = self.__entry(keep) if keep < self.__length else None
+            temp_file = self.index_file + ".tmp"
+            with open(self.index_file, mode="rb") as old_index, open(
+                temp_file, mode="wb"
+            ) as f:
+                f.write(old_index.read(keep * INDEX_ENTRY.size))
+                for entry in entries:
+                    f.write(INDEX_ENTRY.pack(*entry))
+                f.flush()
+                os.fsync(f.fileno())
+            self.__index.close()
+            self.__close_maps()
+            os.replace(temp_file, self.index_file)
+            self.__index = open(self.index_file, mode="ab")
+            self.__length = keep + len(entries)
+            self.__finish_replace()
+            # Only the new chain is indexed from here on, a crash while removing the replaced records leaves records
+            # behind which are never read
+            if replaced is not None:
+                number, offset, _ = replaced
+                os.truncate(self.__segment_path(number), offset)
+                for old_number in self.__segment_numbers():
+                    if number < old_number < first_number:
+                        os.remove(self.__segment_path(old_number))
+
+    def save_state(self, open_transactions, peer_nodes):
+        """Saves the open transactions + peer nodes. The state file is written by the sync timer (or write_state or
+        close) and replaced atomically, so a crash never leaves a half written state behind.
+
+        Arguments:
+            :open_transactions: The transactions which are not yet part of a block.
+            :peer_nodes: The connected peer nodes.
+        """
+        with self.__lock:
+            self.__pending_state = (open_transactions, peer_nodes)
+            self.__start_sync_timer()
+
+    def write_state(self):
+        """Writes the state which was saved last to the state file right away (if it wasn't written yet)."""
+        with self.__state_lock:
+            with self.__lock:
+                state = self.__pending_state
+                self.__pending_state = None
+            if state is None:
+                return
+            open_transactions, peer_nodes = state
+            try:
+                self.__write_json(
+                    self.state_file,
+                    {
+                        "open_transactions": [tx.to_dict() for tx in open_transactions],
+                        "peer_nodes": list(peer_nodes),
+                    },
+                )
+            except IOError:
+                with self.__lock:
+                    # Written with the next attempt unless a newer state was saved meanwhile
+                    if self.__pending_state is None:
+                        self.__pending_state = state
+                raise
+
+    def load_checkpoints(self):
+        """Returns the hashes of the trusted blocks by block index."""
+        try:
+            with open(self.checkpoint_file, mode="r") as f:
+                return {
+                    int(height): block_hash
+                    for height, block_hash in json.load(f).items()
+                }
+        except FileNotFoundError:
+            return {}
+        except (IOError, ValueError, AttributeError) as e:
+            print(f"Exception accessing file {self.checkpoint_file} encountered: {e}")
+            return {}
+
+    def save_checkpoints(self, checkpoints):
+        """Saves the hashes of the trusted blocks.
+
+        Arguments:
+            :checkpoints: The hashes of the trusted blocks by block index.
+        """
+        self.__write_json(
+            self.checkpoint_file,
+            {str(height): checkpoints[height] for height in sorted(checkpoints)},
+        )
+
+    def load_snapshot(self):
+        """Returns the last saved snapshot or None if there is none."""
+        try:
+            with open(self.snapshot_file, mode="r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (IOError, ValueError) as e:
+            print(f"Exception accessing file {self.snapshot_file} encountered: {e}")
+            return None
+
+    def save_snapshot(self, snapshot):
+        """Saves a snapshot of the state derived from the chain (replacing the previous one).
+
+        Arguments:
+            :snapshot: The snapshot as a dict which can be converted to JSON.
+        """
+        self.__write_json(self.snapshot_file, snapshot)
+
+    def sync(self):
+        """Forces all appended blocks (and their index entries) to be written to disk."""
+        with self.__lock:
+            if self.__segment is not None and self.__unsynced > 0:
+                os.fsync(self.__segment.fileno())
+                os.fsync(self.__index.fileno())
+            self.__unsynced = 0
+            self.__last_sync = time.monotonic()
+
+    def close(self):
+        """Syncs and closes the open segment file, the index and all memory maps and writes the saved state."""
+        with self.__lock:
+            if self.__sync_timer is not None:
+                self.__sync_timer.cancel()
+                self.__sync_timer = None
+            self.__close_segment()
+            self.__close_maps()
+            if self.__index is not None:
+                self.__index.close()
+                self.__index = None
+        try:
+            self.write_state()
+        except IOError as e:
+            print(f"Saving file {self.state_file} failed: {e}")
+
+    def __start_sync_timer(self):
+        if self.__sync_timer is None:
+            self.__sync_timer = threading.Timer(self.fsync_interval, self.__sync_later)
+            self.__sync_timer.daemon = True
+            self.__sync_timer.start()
+
+    def __sync_later(self):
+        """Called by the sync timer, syncs the blocks which were appended since the last sync and writes the state."""
+        with self.__lock:
+            self.__sync_timer = None
+            try:
+                self.sync()
+            except OSError as e:
+                print(f"Syncing the block log failed: {e}")
+        # The state file is written without holding the lock, so appends don't wait for it
+        try:
+            self.write_state()
+        except IOError as e:
+            print(f"Saving file {self.state_file} failed: {e}")
+
+    @staticmethod
+    def __encode(block):
+        """Returns the payload of the record of a block."""
+        try:
+            return block.to_bytes()
+        except ValueError:
+            return json.dumps(block.to_dict()).encode()
+
+    def __write_json(self, path, data):
+        """Writes a JSON file atomically, so a crash never leaves a half written file behind."""
+        os.makedirs(self.directory, exist_ok=True)
+        temp_file = path + ".tmp"
+        with open(temp_file, mode="w") as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, path)
+
+    def __open_index(self):
+        """Opens the offset index and repairs it if the log was changed without it (by an older version without an
+        index or by a crash between writing a record and its entry).
+        """
+        self.close()
+        os.makedirs(self.directory, exist_ok=True)
+        self.__finish_replace()
+        self.__index = open(self.index_file, mode="ab")
+        size = os.path.getsize(self.index_file)
+        # Drop a partially written entry and the entries whose records didn't make it to disk
+        self.__length = size // INDEX_ENTRY.size
+        while self.__length > 0:
+            number, offset, length = self.__entry(self.__length - 1)
+            if self.__read_frame(number, offset) == length:
+                break
+            self.__length -= 1
+        if self.__length * INDEX_ENTRY.size < size:
+            self.__close_maps()
+            os.truncate(self.index_file, self.__length * INDEX_ENTRY.size)
+        # Index the records which follow the last indexed one
+        if self.__length > 0:
+            number, offset, length = self.__entry(self.__length - 1)
+            offset += FRAME_HEADER.size + length
+        else:
+            numbers = self.__segment_numbers()
+            number, offset = (numbers[0] if numbers else 0), 0
+        self.__index_records(number, offset)
+
+    def __index_records(self, number, offset):
+        """Adds index entries for the records from the given segment + offset on and cuts off incomplete records."""
+        segment_numbers = [n for n in self.__segment_numbers() if n >= number]
+        for position, segment_number in enumerate(segment_numbers):
+            path = self.__segment_path(segment_number)
+            size = os.path.getsize(path)
+            if segment_number != number:
+                offset = 0
+            while offset < size:
+                length = self.__read_frame(segment_number, offset)
+                if length is None:
+                    break
+                self.__append_entry(segment_number, offset, length)
+                offset += FRAME_HEADER.size + length
+            if offset < size:
+                print(f"Discarding incomplete records at the end of {path}")
+                self.__close_maps()
+                os.truncate(path, offset)
+                for later_number in segment_numbers[position + 1 :]:
+                    os.remove(self.__segment_path(later_number))
+                break
+
+    def __write_new_segments(self, number, payloads):
+        """Writes the records to new segment files (starting with the given segment number), which aren't part of the
+        log before they're renamed by __finish_replace. Returns the index entries of the records.
+        """
+        entries = []
+        f = None
+        try:
+            for payload in payloads:
+                if f is None or (
+                    f.tell() > 0 and f.tell() + len(payload) > self.segment_size
+                ):
+                    if f is not None:
+                        f.flush()
+                        os.fsync(f.fileno())
+                        f.close()
+                        number += 1
+                    f = open(self.__segment_path(number, NEW_SEGMENT), mode="wb")
+                offset = f.tell()
+                f.write(FRAME_HEADER.pack(len(payload), zlib.crc32(payload)))
+                f.write(payload)
+                entries.append((number, offset, len(payload)))
+            f.flush()
+            os.fsync(f.fileno())
+        except OSError:
+            # The old chain is still complete, the new segments are dropped
+            if f is not None:
+                f.close()
+            for new_number in self.__segment_numbers(NEW_SEGMENT):
+                os.remove(self.__segment_path(new_number, NEW_SEGMENT))
+            raise
+        f.close()
+        return entries
+
+    def __finish_replace(self):
+        """Makes the segments written by replace_chain part of the log if the index refers to them, otherwise the
+        replacement didn't complete and they're removed.
+        """
+        numbers = self.__segment_numbers(NEW_SEGMENT)
+        if not numbers:
+            return
+        complete = False
+        if os.path.exists(self.index_file):
+            size = os.path.getsize(self.index_file)
+            if size >= INDEX_ENTRY.size:
+                with open(self.index_file, mode="rb") as f:
+                    f.seek((size // INDEX_ENTRY.size - 1) * INDEX_ENTRY.size)
+                    last_number, _, _ = INDEX_ENTRY.unpack(f.read(INDEX_ENTRY.size))
+                # The new segments are numbered after all segments of the old chain
+                complete = last_number >= numbers[0]
+        for number in numbers:
+            if complete:
+                os.replace(
+                    self.__segment_path(number, NEW_SEGMENT),
+                    self.__segment_path(number),
+                )
+            else:
+                os.remove(self.__segment_path(number, NEW_SEGMENT))
+
+    def __read_frame(self, number, offset):
+        """Returns the payload length of the record at the given location or None if it's incomplete or corrupted."""
+        try:
+            size = os.path.getsize(self.__segment_path(number))
+        except FileNotFoundError:
+            return None
+        if offset + FRAME_HEADER.size > size:
+            return None
+        segment_map = self.__segment_map(number, size)
+        length, checksum = FRAME_HEADER.unpack_from(segment_map, offset)
+        start = offset + FRAME_HEADER.size
+        if (
+            start + length > size
+            or zlib.crc32(segment_map[start : start + length]) != checksum
+        ):
+            return None
+        return length
+
+    def __append_entry(self, number, offset, length):
+        self.__index.write(INDEX_ENTRY.pack(number, offset, length))
+        self.__index.flush()
+        self.__length += 1
+
+    def __entry(self, position):
+        """Returns the segment number, offset and payload length of the record at the given position."""
+        if position >= self.__mapped_entries:
+            # The index grew since it was mapped
+            if self.__index_map is not None:
+                self.__index_map.close()
+            with open(self.index_file, mode="rb") as f:
+                self.__index_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.__mapped_entries = len(self.__index_map) // INDEX_ENTRY.size
+        return INDEX_ENTRY.unpack_from(self.__index_map, position * INDEX_ENTRY.size)
+
+    def __segment_map(self, number, end):
+        """Returns a memory map of the segment which covers at least the bytes up to `end`."""
+        segment_map = self.__segment_maps.get(number)
+        if segment_map is None or len(segment_map) < end:
+            if segment_map is not None:
+                segment_map.close()
+            with open(self.__segment_path(number), mode="rb") as f:
+                segment_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.__segment_maps[number] = segment_map
+        return segment_map
+
+    def __close_maps(self):
+        for segment_map in self.__segment_maps.values():
+            segment_map.close()
+        self.__segment_maps = {}
+        if self.__index_map is not None:
+            self.__index_map.close()
+            self.__index_map = None
+        self.__mapped_entries = 0
+
+    def __open_segment(self, number=None):
+        if self.__segment is None:
+            os.makedirs(self.directory, exist_ok=True)
+            if number is None:
+                numbers = self.__segment_numbers()
+                number = numbers[-1] if numbers else 0
+            self.__segment_number = number
+            self.__segment = open(self.__segment_path(number), mode="ab")
+        return self.__segment
+
+    def __close_segment(self):
+        if self.__segment is not None:
+            self.sync()
+            self.__segment.close()
+            self.__segment = None
+
+    def __next_segment_number(self):
+        numbers = self.__segment_numbers()
+        return numbers[-1] + 1 if numbers else 0
+
+    def __segment_numbers(self, suffix=SEGMENT):
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(
+            int(name[8 : -len(suffix)])
+            for name in names
+            if name.startswith("segment-") and name.endswith(suffix)
+        )
+
+    def __segment_path(self, number, suffix=SEGMENT):
+        return os.path.join(self.directory, f"segment-{number:06d}{suffix}")
+
+
+class StoredChain(Sequence):
+    """The chain of blocks held by a Storage. Blocks are decoded from the log when they're accessed and the recently
+    used ones are kept in a cache, so the memory used doesn't grow with the chain length.
+
+    The JSON form of the blocks is cached separately (bounded by its size rather than by the number of blocks), since
+    it's far smaller than the decoded blocks and serving the chain as JSON needs it for every block.
+
+    Like a list which is only appended to, a StoredChain can be read through a SequenceView snapshot. Replacing blocks
+    rewrites the log in place though, so a view taken before a replacement is only a snapshot of the kept blocks:
+    reads which may overlap a replacement have to be serialized with it (the Blockchain reads under its lock).
+    """
+
+    def __init__(
+        self, storage, cache_size=BLOCK_CACHE_SIZE, json_cache_bytes=JSON_CACHE_BYTES
+    ):
+        self.__storage = storage
+        self.__blocks = LRUCache(cache_size)
+        self.__json = LRUCache(sys.maxsize, json_cache_bytes)
+
+    def __len__(self):
+        return len(self.__storage)
+
+    def __getitem__(self, index):
+        length = len(self.__storage)
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(length))]
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError("StoredChain index out of range")
+        block = self.__blocks.get(index)
+        if block is None:
+            block = self.__storage.read_block(index)
+            self.__blocks.put(index, block)
+        return block
+
+    def append(self, block):
+        """Appends a block to the log.
+
+        Arguments:
+            :block: The block which was added to the chain.
+        """
+        self.__storage.append_block(block)
+        self.__blocks.put(len(self.__storage) - 1, block)
+
+    def replace(self, blocks, keep=0):
+        """Replaces the blocks after the first `keep` ones with the given blocks.
+
+        Arguments:
+            :blocks: The blocks which follow the kept ones in the new chain.
+            :keep: The number of leading blocks which are kept.
+        """
+        self.__blocks.clear()
+        self.__json.clear()
+        self.__storage.replace_chain(blocks, keep)
+
+    def get_json(self, index):
+        """Returns the JSON form of a block (see Block.to_json), from the cache if possible.
+
+        Arguments:
+            :index: The index of the block.
+        """
+        data = self.__json.get(index)
+        if data is None:
+            data = self[index].to_json()
+            self.__json.put(index, data)
+        return data
+
+    def read_record(self, index):
+        """Returns the stored payload of a block (binary or JSON, see utility.codec.is_binary) without decoding it.
+
+        Arguments:
+            :index: The index of the block.
+        """
+        return self.__storage.read_record(index)
+
+    def cache_stats(self):
+        """Returns the statistics of the decoded block cache."""
+        return self.__blocks.stats()
+
+    def json_cache_stats(self):
+        """Returns the statistics of the block JSON cache."""
+        return self.__json.stats()
@@ -0,0 +1,47 @@
+"""Fixtures shared by the tests. Every test runs in its own temporary directory, since the nodes store their block log
+and state files in the working directory.
+"""
+
+import threading
+
+import pytest
+
+from blockchain import Blockchain
+from wallet import Wallet
+
+
+@pytest.fixture(autouse=True)
+def node_directory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def wallet():
+    wallet = Wallet(5000)
+    wallet.private_key, wallet.public_key = Wallet.generate_keys()
+    return wallet
+
+
+@pytest.fixture
+def blockchain(wallet):
+    return Blockchain(wallet.public_key, 5000)
+
+
+class BlockingMiner:
+    """A Miner whose searches never find a proof, they only end when they're cancelled. Every search which starts
+    releases the `searches` semaphore.
+    """
+
+    def __init__(self):
+        self.searches = threading.Semaphore(0)
+
+    def find_proof(self, transactions, last_hash, cancelled=None):
+        self.searches.release()
+        cancelled.wait(10)
+        return None
+
+
+@pytest.fixture
+def blocking_miner():
+    return BlockingMiner()
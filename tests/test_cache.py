@@ -0,0 +1,18 @@
+"""Tests the LRUCache."""
+
+from utility.cache import LRUCache
+
+
+def test_evicts_least_recently_used_entries_beyond_maxbytes():
+    cache = LRUCache(100, maxbytes=10)
+    cache.put("a", b"1234")
+    cache.put("b", b"1234")
+    cache.get("a")
+    cache.put("c", b"1234")
+
+    assert "b" not in cache and "a" in cache and "c" in cache
+    assert cache.stats()["bytes"] == 8
+
+    cache.put("a", b"12")
+    cache.discard("c")
+    assert cache.stats()["bytes"] == 2
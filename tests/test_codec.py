@@ -0,0 +1,63 @@
+"""Tests the binary block format."""
+
+import pytest
+
+import node
+from block import Block
+from storage import Storage
+from transaction import Transaction
+from utility.codec import CONTENT_TYPE, decode_block, encode_block, is_binary
+
+
+def sample_block(wallet, amount=2.5):
+    transactions = [
+        Transaction(wallet.public_key, "bob", "ab" * 64, amount),
+        Transaction(wallet.public_key, wallet.public_key, "0f" * 64, -3),
+        Transaction("MINING", "Bob Ünicode", "", 10),
+    ]
+    return Block(7, "00" * 32, transactions, 12345, 1700000000.25)
+
+
+def test_block_round_trip_keeps_values_and_hash(wallet):
+    block = sample_block(wallet)
+    data = block.to_bytes()
+    assert is_binary(data)
+
+    decoded = Block.from_bytes(data)
+    assert decoded.to_dict() == block.to_dict()
+    assert decoded.hash == block.hash
+    for tx, decoded_tx in zip(block.transactions, decoded.transactions):
+        assert decoded_tx.to_dict() == tx.to_dict()
+        assert type(decoded_tx.amount) is type(tx.amount)
+    # Blocks are decoded one after another from a /chain response
+    assert decode_block(data + data, len(data)) == (block.to_dict(), 2 * len(data))
+
+
+@pytest.mark.parametrize("amount", ["2.5", True, None])
+def test_values_the_codec_cant_encode_are_stored_as_json(wallet, amount):
+    block = sample_block(wallet, amount)
+    with pytest.raises(ValueError):
+        encode_block(block.to_dict())
+
+    storage = Storage(5000)
+    storage.load()
+    storage.append_block(block)
+    assert not is_binary(storage.read_record(0))
+    assert storage.read_block(0).to_dict() == block.to_dict()
+    assert storage.read_block(0).hash == block.hash
+    storage.close()
+
+
+def test_corrupt_blocks_are_rejected(wallet, blockchain, monkeypatch):
+    monkeypatch.setattr(node, "blockchain", blockchain, raising=False)
+    client = node.app.test_client()
+    data = sample_block(wallet).to_bytes()
+
+    for payload in [data[: len(data) // 2], b"\x02" + data[1:], b"\x01\xff\xff\xff"]:
+        with pytest.raises(ValueError):
+            decode_block(payload)
+        response = client.post(
+            "/broadcast-block", data=payload, content_type=CONTENT_TYPE
+        )
+        assert response.status_code == 400
+    assert blockchain.get_chain_length() == 1
@@ -0,0 +1,87 @@
+"""Tests the Blockchain under concurrent requests (see benchmarks/concurrency.py for larger runs)."""
+
+import threading
+import time
+
+from blockchain import MINING_REWARD
+from transaction import Transaction
+
+
+def received_block(blockchain, index):
+    """Returns a block (as a dict) which follows the tip of the chain and claims the given index."""
+    last_hash = blockchain.get_tip_hash()
+    reward = Transaction("MINING", "miner", "", MINING_REWARD)
+    return {
+        "index": index,
+        "previous_hash": last_hash,
+        "transactions": [reward.to_dict()],
+        "proof": blockchain.proof_of_work([], last_hash),
+        "timestamp": time.time(),
+    }
+
+
+def test_block_index_must_match_its_position(blockchain):
+    assert not blockchain.add_block(received_block(blockchain, 5))
+    assert blockchain.add_block(received_block(blockchain, 1))
+    assert blockchain.get_block(blockchain.get_tip_hash()).index == 1
+
+
+def test_concurrent_clients_lose_no_updates(wallet, blockchain):
+    writers, transactions = 4, 10
+    for _ in range(writers * transactions // MINING_REWARD + 1):
+        assert blockchain.mine_block() is not None
+    accepted = {}
+    errors = []
+    done = threading.Event()
+
+    def writer(name):
+        # Signatures are deterministic, so every transaction gets its own recipient to make it unique
+        for i in range(transactions):
+            recipient = f"{name}-{i}"
+            signature = wallet.sign_transaction(wallet.public_key, recipient, 1.0)
+            if blockchain.add_transaction(recipient, wallet.public_key, signature):
+                accepted[recipient] = signature
+
+    def miner():
+        while not done.is_set():
+            if blockchain.open_transactions:
+                blockchain.mine_block()
+            else:
+                time.sleep(0.001)
+
+    def reader():
+        while not done.is_set():
+            blockchain.get_balance()
+            blockchain.get_block_json(0, blockchain.get_chain_length())
+            blockchain.open_transactions
+
+    def run(target, *args):
+        try:
+            target(*args)
+        except Exception as e:
+            errors.append(e)
+
+    others = [threading.Thread(target=run, args=(f,)) for f in [miner, miner, reader]]
+    threads = [
+        threading.Thread(target=run, args=(writer, f"writer-{n}"))
+        for n in range(writers)
+    ]
+    for thread in others + threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    done.set()
+    for thread in others:
+        thread.join()
+    while blockchain.open_transactions:
+        assert blockchain.mine_block() is not None
+
+    assert errors == []
+    assert len(accepted) == writers * transactions
+    for recipient, signature in accepted.items():
+        assert blockchain.get_transaction_location(signature) is not None
+        assert blockchain.get_balance(recipient) == 1.0
+    rewards = (blockchain.get_chain_length() - 1) * MINING_REWARD
+    assert blockchain.get_balance() == rewards - len(accepted)
+    # The incremental ledger matches a replay of the chain
+    assert blockchain.verify_chain() and blockchain.verify_ledger()
@@ -0,0 +1,70 @@
+"""Tests the EventBus and the /events stream."""
+
+import node
+from events import EventBus, encode_event, parse_event_id
+
+
+def drain(subscription):
+    events = []
+    event = subscription.get(0)
+    while event is not None:
+        events.append(event)
+        event = subscription.get(0)
+    return events
+
+
+def test_events_are_delivered_to_every_subscriber():
+    bus = EventBus()
+    first = bus.subscribe()
+    second = bus.subscribe()
+    bus.publish("block", {"index": 1})
+    bus.publish("peers", {"added": "localhost:5001"})
+
+    expected = [(1, "block", {"index": 1}), (2, "peers", {"added": "localhost:5001"})]
+    assert drain(first) == expected and drain(second) == expected
+    bus.unsubscribe(first)
+    bus.publish("chain", {"length": 3})
+    assert drain(first) == [] and drain(second) == [(3, "chain", {"length": 3})]
+    assert bus.stats() == {"subscribers": 1, "last_id": 3}
+
+
+def test_reconnecting_subscriber_gets_the_missed_events():
+    bus = EventBus(history=3)
+    for index in range(1, 6):
+        bus.publish("block", {"index": index})
+
+    assert [event[0] for event in drain(bus.subscribe(3))] == [4, 5]
+    assert drain(bus.subscribe(5)) == []
+    # Event 2 is no longer kept, and ids beyond the last one come from before a restart
+    assert drain(bus.subscribe(1)) == [(5, "reset", {})]
+    assert drain(bus.subscribe(9)) == [(5, "reset", {})]
+
+
+def test_subscriber_which_falls_behind_gets_a_reset():
+    bus = EventBus(queue_size=2)
+    subscription = bus.subscribe()
+    for index in range(1, 4):
+        bus.publish("block", {"index": index})
+    assert drain(subscription) == [(3, "reset", {})]
+
+
+def test_event_stream_replays_and_unsubscribes_when_closed(monkeypatch):
+    bus = EventBus()
+    monkeypatch.setattr(node, "events", bus, raising=False)
+    bus.publish("block", {"index": 1})
+    bus.publish("mempool", {"added": [], "removed": ["signature"]})
+    client = node.app.test_client()
+
+    response = client.get("/events", headers={"Last-Event-ID": "1"}, buffered=False)
+    assert response.mimetype == "text/event-stream"
+    stream = iter(response.response)
+    event = next(stream)
+    event = event.decode() if isinstance(event, bytes) else event
+    assert event == encode_event(
+        (2, "mempool", {"added": [], "removed": ["signature"]})
+    )
+    assert bus.stats()["subscribers"] == 1
+
+    response.close()
+    assert bus.stats()["subscribers"] == 0
+    assert parse_event_id("x") is None and parse_event_id("2") == 2
@@ -0,0 +1,71 @@
+"""Tests the GossipOutbox."""
+
+from gossip import GossipOutbox
+from transaction import Transaction
+
+
+class BrokenPeers:
+    """A PeerClient whose first requests fail with an unexpected error."""
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.posts = []
+
+    def post(self, node, path, json=None, data=None, content_type=None):
+        if self.failures > 0:
+            self.failures -= 1
+            raise AttributeError("unexpected")
+        self.posts.append((node, path, json))
+        return type("Response", (), {"status_code": 200})()
+
+    def map(self, function, nodes):
+        return {node: function(node) for node in nodes}
+
+
+def test_outbox_keeps_running_after_unexpected_errors():
+    peers = BrokenPeers(1)
+    gossip = GossipOutbox(peers, backoff=0.01)
+    gossip.send_transaction(["peer"], Transaction("a", "b", "signature-1", 1.0))
+    assert gossip.flush(timeout=5)
+    gossip.send_transaction(["peer"], Transaction("a", "b", "signature-2", 1.0))
+    assert gossip.flush(timeout=5)
+
+    sent = [
+        tx["signature"] for _, _, body in peers.posts for tx in body["transactions"]
+    ]
+    assert sent == ["signature-1", "signature-2"]
+    assert gossip.stats()["retries"] == 1
+
+
+class OldPeers:
+    """A PeerClient for a peer which only has /broadcast-transaction (and declines transactions it already has)."""
+
+    def __init__(self):
+        self.posts = []
+        self.received = set()
+
+    def post(self, node, path, json=None, data=None, content_type=None):
+        self.posts.append(path)
+        if path != "/broadcast-transaction":
+            return type("Response", (), {"status_code": 404})()
+        added = json["signature"] not in self.received
+        self.received.add(json["signature"])
+        return type("Response", (), {"status_code": 201 if added else 500})()
+
+    def map(self, function, nodes):
+        return {node: function(node) for node in nodes}
+
+
+def test_transactions_are_sent_one_at_a_time_to_older_peers():
+    peers = OldPeers()
+    gossip = GossipOutbox(peers, backoff=0.01)
+    for signature in ["signature-1", "signature-2"]:
+        gossip.send_transaction(["peer"], Transaction("a", "b", signature, 1.0))
+    assert gossip.flush(timeout=5)
+    gossip.send_transaction(["peer"], Transaction("a", "b", "signature-3", 1.0))
+    assert gossip.flush(timeout=5)
+
+    assert peers.received == {"signature-1", "signature-2", "signature-3"}
+    # The batch endpoint is only tried once
+    assert peers.posts.count("/broadcast-transactions") == 1
+    assert gossip.stats()["sent"] == 3 and gossip.stats()["retries"] == 0
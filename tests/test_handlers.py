@@ -0,0 +1,61 @@
+"""Tests the request handling shared by the node servers."""
+
+import handlers
+
+
+def test_block_range():
+    assert handlers.get_block_range({}, 5) == (0, 5)
+    assert handlers.get_block_range({"from": "2", "to": "4"}, 5) == (2, 4)
+    assert handlers.get_block_range({"from": "x"}, 5) is None
+    assert handlers.get_block_range({"from": "3", "to": "2"}, 5) is None
+
+
+def test_batch_keeps_results_in_order(wallet, blockchain):
+    blockchain.mine_block()
+    signature = wallet.sign_transaction(wallet.public_key, "bob", 1.0)
+    transaction = {
+        "sender": wallet.public_key,
+        "recipient": "bob",
+        "amount": 1.0,
+        "signature": signature,
+    }
+    values = {"transactions": [{"sender": wallet.public_key}, transaction]}
+
+    response, status = handlers.add_transactions(blockchain, values)
+    assert status == 200 and response["added"] == 1
+    assert response["results"] == [
+        {"success": False, "message": "Some data is missing."},
+        {"signature": signature, "success": True},
+    ]
+    assert handlers.add_transactions(blockchain, {"transactions": "x"})[1] == 400
+
+
+def test_chain_body(blockchain):
+    blockchain.mine_block()
+    body, content_type, length = handlers.get_chain(blockchain, {"from": "1"}, False)
+    assert content_type == "application/json" and length == 2
+    assert body == b"[" + b",".join(blockchain.get_block_json(1, 2)) + b"]"
+    assert handlers.get_chain(blockchain, {"to": "-1"}, False) is None
+
+
+def test_batch_reports_malformed_items(wallet, blockchain):
+    blockchain.mine_block()
+    signature = wallet.sign_transaction(wallet.public_key, "bob", 1.0)
+    transaction = {
+        "sender": wallet.public_key,
+        "recipient": "bob",
+        "amount": 1.0,
+        "signature": signature,
+    }
+    items = [7, ["sender"], dict(transaction, amount="1.0"), transaction]
+
+    for handler in [handlers.add_transactions, handlers.broadcast_transactions]:
+        response, status = handler(blockchain, {"transactions": items})
+        assert status == 200
+        assert [result["success"] for result in response["results"]][:3] == [False] * 3
+        assert response["results"][2]["message"] == "Some data is invalid."
+        assert handler(blockchain, {"transactions": {"a": 1}})[1] == 400
+    assert blockchain.get_open_transaction(signature) is not None
+
+    bad_amount = dict(transaction, amount=[1])
+    assert handlers.broadcast_transaction(blockchain, bad_amount)[1] == 400
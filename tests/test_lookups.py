@@ -0,0 +1,54 @@
+"""Tests looking up transactions by signature and by address (/tx/<signature>, /address/<address>/transactions)."""
+
+import node
+
+
+def send(wallet, blockchain, recipient, amount=1.0):
+    signature = wallet.sign_transaction(wallet.public_key, recipient, amount)
+    assert blockchain.add_transaction(recipient, wallet.public_key, signature, amount)
+    return signature
+
+
+def test_transaction_and_address_lookups(wallet, blockchain, monkeypatch):
+    monkeypatch.setattr(node, "blockchain", blockchain, raising=False)
+    client = node.app.test_client()
+    blockchain.mine_block()
+    confirmed = send(wallet, blockchain, "bob")
+    block = blockchain.mine_block()
+    pending = send(wallet, blockchain, "bob", 2.0)
+
+    response = client.get(f"/tx/{confirmed}")
+    assert response.status_code == 200
+    assert response.get_json() == {
+        "transaction": block.transactions[0].to_dict(),
+        "pending": False,
+        "block_index": 2,
+        "block_hash": block.hash,
+        "position": 0,
+    }
+    response = client.get(f"/tx/{pending}")
+    assert response.status_code == 200
+    assert response.get_json()["pending"] and "block_index" not in response.get_json()
+    assert response.get_json()["transaction"]["amount"] == 2.0
+    assert client.get("/tx/unknown").status_code == 404
+
+    # Only confirmed transactions, in chain order
+    response = client.get("/address/bob/transactions").get_json()
+    assert response == {
+        "address": "bob",
+        "transactions": [
+            {
+                "transaction": block.transactions[0].to_dict(),
+                "block_index": 2,
+                "position": 0,
+            }
+        ],
+    }
+    sent = client.get(f"/address/{wallet.public_key}/transactions").get_json()
+    # Two mining rewards and the transaction to bob
+    assert [(t["block_index"], t["position"]) for t in sent["transactions"]] == [
+        (1, 0),
+        (2, 0),
+        (2, 1),
+    ]
+    assert client.get("/address/nobody/transactions").get_json()["transactions"] == []
@@ -0,0 +1,81 @@
+"""Tests the Mempool and the limits on open transactions."""
+
+import random
+
+from mempool import Mempool
+from transaction import Transaction
+
+
+def tx(sender, number, amount=1.0):
+    return Transaction(sender, "bob", f"{sender}-{number}", amount)
+
+
+def test_oldest_transaction_is_evicted_at_max_size():
+    mempool = Mempool(max_size=3)
+    for number in range(5):
+        assert mempool.add(tx("alice", number))
+
+    assert len(mempool) == 3
+    assert [t.signature for t in mempool] == ["alice-2", "alice-3", "alice-4"]
+    assert mempool.pending_amount("alice") == 3.0
+    assert mempool.stats()["evicted"] == 2
+
+
+def test_busiest_sender_loses_its_oldest_transaction():
+    mempool = Mempool(max_size=4, eviction="sender")
+    mempool.add(tx("bob", 0))
+    for number in range(3):
+        mempool.add(tx("alice", number))
+    mempool.add(tx("carol", 0))
+
+    # bob's transaction is the oldest, but alice has the most
+    assert "bob-0" in mempool and "alice-0" not in mempool
+    assert mempool.pending_amount("alice") == 2.0
+    assert mempool.stats()["evicted"] == 1
+
+
+def test_sender_eviction_matches_a_full_scan():
+    random.seed(7)
+    mempool = Mempool(max_size=20, eviction="sender")
+    expected = {}
+    for number in range(500):
+        sender = random.choice("abcdef")
+        if random.random() < 0.2 and len(mempool) > 0:
+            confirmed = random.choice(mempool.select())
+            mempool.remove([confirmed])
+            del expected[confirmed.signature]
+            continue
+        if len(expected) >= 20:
+            # The sender with the most transactions (the first address on ties) loses its oldest one
+            counts = {}
+            for t in expected.values():
+                counts[t.sender] = counts.get(t.sender, 0) + 1
+            busiest = min(counts, key=lambda address: (-counts[address], address))
+            oldest = next(t for t in expected.values() if t.sender == busiest)
+            del expected[oldest.signature]
+        transaction = tx(sender, number)
+        mempool.add(transaction)
+        expected[transaction.signature] = transaction
+        assert [t.signature for t in mempool] == list(expected)
+
+
+def test_select_takes_the_oldest_transactions():
+    mempool = Mempool([tx("alice", number) for number in range(5)])
+    assert [t.signature for t in mempool.select(2)] == ["alice-0", "alice-1"]
+    assert len(mempool.select(10)) == 5 and len(mempool.select()) == 5
+
+
+def test_mined_blocks_hold_at_most_max_block_transactions(wallet, blockchain):
+    blockchain.mine_block()
+    blockchain.max_block_transactions = 2
+    signatures = []
+    for number in range(3):
+        recipient = f"bob-{number}"
+        signature = wallet.sign_transaction(wallet.public_key, recipient, 1.0)
+        assert blockchain.add_transaction(recipient, wallet.public_key, signature)
+        signatures.append(signature)
+
+    block = blockchain.mine_block()
+    # The reward comes on top of the selected transactions
+    assert [t.signature for t in block.transactions[:-1]] == signatures[:2]
+    assert [t.signature for t in blockchain.open_transactions] == signatures[2:]
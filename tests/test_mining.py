@@ -0,0 +1,121 @@
+"""Tests the Miner and the MiningService."""
+
+import multiprocessing
+import threading
+import time
+
+import mining
+from blockchain import MINING_REWARD, Blockchain
+from mining import Miner, MiningService
+from transaction import Transaction
+from utility.verification import Verification
+
+
+def test_short_searches_stay_in_the_calling_process():
+    pool_miner = Miner(2)
+    miner = Miner(1)
+    for i in range(20):
+        assert pool_miner.find_proof([], f"hash-{i}") == miner.find_proof(
+            [], f"hash-{i}"
+        )
+    assert pool_miner.attempts == miner.attempts
+    # The worker processes were never started
+    assert multiprocessing.active_children() == []
+    pool_miner.close()
+
+
+def test_concurrent_searches_on_the_pool(monkeypatch):
+    # Every search moves to the worker processes right away
+    monkeypatch.setattr(mining, "INLINE_PROOFS", 0)
+    miner = Miner(2)
+    proofs = {}
+    errors = []
+
+    def search(name):
+        try:
+            for i in range(10):
+                last_hash = f"{name}-{i}"
+                proofs[last_hash] = miner.find_proof([], last_hash)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=search, args=(n,)) for n in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    miner.close()
+
+    assert errors == []
+    assert len(proofs) == 30
+    for last_hash, proof in proofs.items():
+        assert Verification.valid_proof([], last_hash, proof)
+
+
+class FailingBlockchain:
+    """Raises from mine_block the first times it's called, like a broken search would."""
+
+    def __init__(self, failures):
+        self.resolve_conflicts = False
+        self.failures = failures
+        self.blocks = 0
+
+    def add_tip_listener(self, listener):
+        pass
+
+    def mine_block(self, cancelled=None):
+        if self.failures > 0:
+            self.failures -= 1
+            raise ValueError("min() arg is an empty sequence")
+        self.blocks += 1
+        return object()
+
+
+def test_mining_service_survives_errors(monkeypatch):
+    monkeypatch.setattr(mining, "RETRY_DELAY", 0.01)
+    blockchain = FailingBlockchain(2)
+    service = MiningService(blockchain)
+    assert service.start()
+    deadline = time.monotonic() + 5
+    while blockchain.blocks == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert service.stop(timeout=5)
+
+    status = service.status()
+    assert status["failed"] == 2 and status["blocks"] > 0
+    assert not status["running"]
+    # The thread stopped, so it can be started again
+    assert service.start()
+    assert service.stop(timeout=5)
+
+
+def next_block(blockchain):
+    """Returns a block (as a dict) mined by someone else which follows the tip of the chain."""
+    last_hash = blockchain.get_tip_hash()
+    proof = 0
+    while not Verification.valid_proof([], last_hash, proof):
+        proof += 1
+    reward = Transaction("MINING", "someone", "", MINING_REWARD)
+    return {
+        "index": blockchain.get_chain_length(),
+        "previous_hash": last_hash,
+        "transactions": [reward.to_dict()],
+        "proof": proof,
+        "timestamp": time.time(),
+    }
+
+
+def test_added_block_cancels_the_search(wallet, blocking_miner):
+    blockchain = Blockchain(wallet.public_key, 5000, blocking_miner)
+    service = MiningService(blockchain)
+    assert service.start()
+    assert blocking_miner.searches.acquire(timeout=5)
+
+    assert blockchain.add_block(next_block(blockchain))
+    # The service starts over on the new last block after counting the stale search
+    assert blocking_miner.searches.acquire(timeout=5)
+    status = service.status()
+    assert status["stale"] == 1 and status["stale_seconds"] > 0
+    assert status["failed"] == 0 and status["searching"]
+    assert service.stop(timeout=5)
+    assert service.status()["stale"] == 1
@@ -0,0 +1,266 @@
+"""Tests resolving conflicts between nodes. Every peer is a copy of the node server (node.py) which is loaded in this
+process and answered through its Flask test client, so the Blockchain talks to real handlers without any sockets.
+"""
+
+import importlib.util
+import json
+import os
+import threading
+
+import pytest
+from flask import Flask
+
+from block import Block
+from blockchain import Blockchain
+from mining import MiningService
+from peer_client import PEER_ERRORS
+from storage import StoredChain
+from wallet import Wallet
+
+NODE_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "node.py")
+
+
+class InProcessResponse:
+    """A Flask test response with the attributes of a requests.Response the Blockchain uses."""
+
+    def __init__(self, response):
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.content = response.data
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class InProcessPeers:
+    """A PeerClient which sends the requests to the test clients of in-process nodes and records them."""
+
+    def __init__(self, clients):
+        self.clients = clients
+        self.requests = []
+
+    def get(self, node, path, params=None, headers=None):
+        self.requests.append((node, path, params))
+        response = self.clients[node].get(path, query_string=params, headers=headers)
+        return InProcessResponse(response)
+
+    def post(self, node, path, json=None, data=None, content_type=None):
+        self.requests.append((node, path, None))
+        response = self.clients[node].post(
+            path, json=json, data=data, content_type=content_type
+        )
+        return InProcessResponse(response)
+
+    def map(self, function, nodes):
+        results = {}
+        for node in nodes:
+            try:
+                results[node] = function(node)
+            except PEER_ERRORS:
+                results[node] = None
+        return results
+
+    def post_all(self, nodes, path, json=None):
+        return self.map(lambda node: self.post(node, path, json), nodes)
+
+    def chain_requests(self):
+        """Returns the query parameters of the /chain requests sent so far."""
+        return [params for _, path, params in self.requests if path == "/chain"]
+
+
+@pytest.fixture
+def network():
+    """Returns a function which starts a node (with its own genesis block and wallet) and the shared peer client."""
+    clients = {}
+    peers = InProcessPeers(clients)
+
+    def start_node(port, miner=None):
+        """Starts a node and returns its Blockchain (its test client is peers.clients["localhost:<port>"])."""
+        wallet = Wallet(port)
+        wallet.private_key, wallet.public_key = Wallet.generate_keys()
+        blockchain = Blockchain(wallet.public_key, port, miner, peer_client=peers)
+        # Every node gets its own copy of the server module, so their globals don't mix
+        spec = importlib.util.spec_from_file_location(f"node_{port}", NODE_FILE)
+        server = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(server)
+        server.wallet = wallet
+        server.blockchain = blockchain
+        clients[f"localhost:{port}"] = server.app.test_client()
+        return blockchain
+
+    return start_node, peers
+
+
+def mine(blockchain, count):
+    for _ in range(count):
+        assert blockchain.mine_block() is not None
+
+
+def hashes(blockchain):
+    return [block.hash for block in blockchain.chain]
+
+
+def sync(blockchain, node):
+    """Resolves against a single peer, which is removed afterwards so mined blocks aren't gossiped to it."""
+    blockchain.add_peer_node(node)
+    replaced = blockchain.resolve()
+    blockchain.remove_peer_node(node)
+    return replaced
+
+
+def test_different_genesis_downloads_the_whole_chain(network):
+    start_node, peers = network
+    a = start_node(5001)
+    b = start_node(5002)
+    mine(a, 3)
+    mine(b, 1)
+
+    assert sync(b, "localhost:5001")
+    assert hashes(b) == hashes(a)
+    assert peers.chain_requests() == [{"from": 0, "to": 4}]
+    assert b.verify_chain() and b.verify_ledger()
+
+
+def test_longer_chain_downloads_only_the_extension(network):
+    start_node, peers = network
+    a = start_node(5001)
+    b = start_node(5002)
+    mine(a, 3)
+    assert sync(b, "localhost:5001")
+    mine(b, 2)
+    peers.requests.clear()
+
+    assert sync(a, "localhost:5002")
+    assert hashes(a) == hashes(b)
+    assert peers.chain_requests() == [{"from": 4, "to": 6}]
+    assert a.verify_chain() and a.verify_ledger()
+
+
+def test_fork_replaces_only_the_divergent_blocks(network):
+    start_node, peers = network
+    a = start_node(5001)
+    b = start_node(5002)
+    mine(a, 3)
+    assert sync(b, "localhost:5001")
+    mine(a, 1)
+    mine(b, 2)
+    peers.requests.clear()
+
+    assert sync(a, "localhost:5002")
+    assert hashes(a) == hashes(b)
+    assert peers.chain_requests() == [{"from": 4, "to": 6}]
+    assert a.verify_chain() and a.verify_ledger()
+    # The reward of the replaced block is gone, the rewards of the shared blocks stay
+    assert a.get_balance() == 30
+
+
+def test_indexes_follow_a_replaced_chain(network):
+    start_node, peers = network
+    a = start_node(5001)
+    b = start_node(5002)
+    mine(a, 3)
+    assert sync(b, "localhost:5001")
+    mine(a, 1)
+    mine(b, 2)
+    replaced_hash = a.get_tip_hash()
+    # The indexes are built before the chain is replaced
+    assert len(a.get_address_transactions(a.public_key)) == 4
+    assert a.get_address_transactions(b.public_key) == []
+
+    assert sync(a, "localhost:5002")
+    rewards = [
+        (block.index, position)
+        for block, position in a.get_address_transactions(a.public_key)
+    ]
+    assert rewards == [(1, 0), (2, 0), (3, 0)]
+    rewards = [
+        (block.hash, position)
+        for block, position in a.get_address_transactions(b.public_key)
+    ]
+    assert rewards == [(block_hash, 0) for block_hash in hashes(b)[4:]]
+    assert a.get_block(replaced_hash) is None
+    assert a.get_block(b.get_tip_hash()).index == 5
+
+
+def test_shorter_or_equal_chain_is_kept(network):
+    start_node, peers = network
+    a = start_node(5001)
+    b = start_node(5002)
+    mine(a, 2)
+    mine(b, 2)
+
+    assert not sync(a, "localhost:5002")
+    assert peers.chain_requests() == []
+
+
+def test_chain_response_is_not_mixed_with_a_replacement(network, monkeypatch):
+    start_node, peers = network
+    a = start_node(5001)
+    b = start_node(5002)
+    mine(a, 3)
+    assert sync(b, "localhost:5001")
+    mine(a, 2)
+    mine(b, 3)
+    served = hashes(a)
+    a.add_peer_node("localhost:5002")
+    resolver = threading.Thread(target=a.resolve)
+    get_block = StoredChain.__getitem__
+
+    def replace_while_reading(chain, index):
+        # The chain is replaced while the response reads it (or as soon as the lock lets it)
+        if index == 1 and threading.current_thread() is threading.main_thread():
+            if resolver.ident is None:
+                resolver.start()
+                resolver.join(1)
+        return get_block(chain, index)
+
+    monkeypatch.setattr(StoredChain, "__getitem__", replace_while_reading)
+    response = peers.clients["localhost:5001"].get("/chain")
+    resolver.join()
+
+    blocks = [Block.from_dict(block) for block in response.get_json()]
+    assert [block.hash for block in blocks] == served
+    assert hashes(a) == hashes(b)
+
+
+@pytest.mark.parametrize(
+    "path, answer",
+    [
+        ("/chain/length", {"length": "x"}),
+        ("/chain/length", ["length"]),
+        ("/chain/hashes", {"hashes": 7}),
+    ],
+)
+def test_malformed_peer_answers_are_skipped(network, path, answer):
+    start_node, peers = network
+    a = start_node(5001)
+    b = start_node(5002)
+    mine(b, 2)
+    # A peer which claims a longer chain but answers one request with JSON of the wrong shape
+    liar = Flask("liar")
+    liar.add_url_rule(path, "answer", lambda: answer)
+    liar.add_url_rule("/chain/length", "length", lambda: {"length": 100})
+    peers.clients["localhost:5003"] = liar.test_client()
+    a.add_peer_node("localhost:5003")
+    a.add_peer_node("localhost:5002")
+    a.resolve_conflicts = True
+
+    assert a.resolve()
+    assert hashes(a) == hashes(b)
+    assert not a.resolve_conflicts
+
+
+def test_replaced_chain_cancels_the_background_search(network, blocking_miner):
+    start_node, peers = network
+    a = start_node(5001, blocking_miner)
+    b = start_node(5002)
+    mine(b, 2)
+    service = MiningService(a)
+    assert service.start()
+    assert blocking_miner.searches.acquire(timeout=5)
+
+    assert sync(a, "localhost:5002")
+    assert blocking_miner.searches.acquire(timeout=5)
+    status = service.status()
+    assert status["stale"] == 1 and status["failed"] == 0
+    assert service.stop(timeout=5)
@@ -0,0 +1,179 @@
+"""Tests the block log and the state file."""
+
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from block import Block
+from blockchain import Blockchain
+from storage import Storage
+
+
+def test_unsynced_blocks_are_synced_after_the_interval():
+    storage = Storage(5000, fsync_batch=100, fsync_interval=0.05)
+    storage.load()
+    synced = []
+    sync = storage.sync
+
+    def record_sync():
+        synced.append(threading.current_thread() is threading.main_thread())
+        sync()
+
+    storage.sync = record_sync
+    storage.append_block(Block(0, "", [], 100, 0))
+    storage.append_block(Block(1, "", [], 100, 0))
+    assert synced == []
+
+    # The timer syncs the blocks without another append
+    deadline = time.monotonic() + 5
+    while not synced and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert synced == [False]
+
+    # Closing syncs right away
+    storage.fsync_interval = 60
+    storage.append_block(Block(2, "", [], 100, 0))
+    storage.close()
+    assert synced == [False, True]
+
+
+def stored_proofs(storage):
+    return [storage.read_block(position).proof for position in range(len(storage))]
+
+
+@pytest.mark.parametrize(
+    "crash_point, expected",
+    [("index.bin", [0, 1, 2, 3, 4]), (".log.new", [0, 1, 12, 13, 14, 15])],
+)
+def test_chain_replacement_survives_a_crash(monkeypatch, crash_point, expected):
+    storage = Storage(5000, segment_size=64)
+    storage.load()
+    for proof in range(5):
+        storage.append_block(Block(proof, "", [], proof, 0))
+    storage.sync()
+
+    replace = os.replace
+
+    def crashing_replace(source, destination):
+        if source.endswith(crash_point) or destination.endswith(crash_point):
+            raise OSError("crashed")
+        replace(source, destination)
+
+    monkeypatch.setattr(os, "replace", crashing_replace)
+    with pytest.raises(OSError):
+        storage.replace_chain([Block(i, "", [], 10 + i, 0) for i in range(2, 6)], 2)
+    monkeypatch.setattr(os, "replace", replace)
+
+    # The node is restarted: the chain is the old one before the new index is in place and the new one after it
+    reopened = Storage(5000)
+    reopened.load()
+    assert stored_proofs(reopened) == expected
+    assert not [
+        name for name in os.listdir(reopened.directory) if name.endswith(".new")
+    ]
+    reopened.append_block(Block(len(expected), "", [], 99, 0))
+    reopened.close()
+    reopened.load()
+    assert stored_proofs(reopened) == expected + [99]
+
+
+def test_replaced_chain_is_stored():
+    storage = Storage(5000, segment_size=64)
+    storage.load()
+    for proof in range(5):
+        storage.append_block(Block(proof, "", [], proof, 0))
+    storage.replace_chain([Block(i, "", [], 10 + i, 0) for i in range(1, 7)], 1)
+    assert stored_proofs(storage) == [0, 11, 12, 13, 14, 15, 16]
+    storage.close()
+
+    storage.load()
+    assert stored_proofs(storage) == [0, 11, 12, 13, 14, 15, 16]
+    # The records of the replaced blocks were removed, the new ones were written to new segments
+    segments = sorted(
+        name for name in os.listdir(storage.directory) if name.startswith("segment-")
+    )
+    assert segments == [
+        "segment-000000.log",
+        "segment-000002.log",
+        "segment-000003.log",
+    ]
+    assert (
+        os.path.getsize(os.path.join(storage.directory, segments[0]))
+        == os.path.getsize(os.path.join(storage.directory, segments[1])) // 3
+    )
+
+
+def test_state_is_written_with_the_block_sync():
+    storage = Storage(5000, fsync_interval=0.05)
+    storage.load()
+    storage.save_state([], ["localhost:5001"])
+    storage.save_state([], ["localhost:5001", "localhost:5002"])
+    assert not os.path.exists(storage.state_file)
+
+    # The timer writes the state which was saved last
+    deadline = time.monotonic() + 5
+    while not os.path.exists(storage.state_file) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert Storage(5000).load()[2] == ["localhost:5001", "localhost:5002"]
+
+    # Closing writes it right away
+    storage.fsync_interval = 60
+    storage.save_state([], [])
+    storage.close()
+    assert Storage(5000).load()[2] == []
+
+
+def test_state_is_written_without_holding_the_lock(blockchain, monkeypatch):
+    writing = threading.Event()
+    release = threading.Event()
+    save_state = Storage.save_state
+
+    def slow_save_state(storage, open_transactions, peer_nodes):
+        writing.set()
+        release.wait(5)
+        save_state(storage, open_transactions, peer_nodes)
+
+    monkeypatch.setattr(Storage, "save_state", slow_save_state)
+    adding = threading.Thread(target=blockchain.add_peer_node, args=("localhost:5001",))
+    adding.start()
+    assert writing.wait(5)
+    mining = threading.Thread(target=blockchain.mine_block)
+    try:
+        # Blocks are added while the state file is written (the miner saves the state after it)
+        mining.start()
+        deadline = time.monotonic() + 5
+        while blockchain.get_chain_length() < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert blockchain.get_chain_length() == 2
+        assert writing.is_set() and not release.is_set()
+    finally:
+        release.set()
+        adding.join()
+        mining.join()
+
+    blockchain.close()
+    assert Storage(5000).load()[2] == ["localhost:5001"]
+
+
+def test_snapshot_file_of_older_versions_is_migrated(wallet, blockchain):
+    blockchain.mine_block()
+    blockchain.mine_block()
+    blocks = [block.to_dict() for block in blockchain.chain]
+    with open("blockchain-5001.txt", mode="w") as f:
+        f.write(json.dumps(blocks) + "\n")
+        f.write(json.dumps([]) + "\n")
+        f.write(json.dumps(["localhost:5002"]))
+
+    migrated = Blockchain(wallet.public_key, 5001)
+    assert [block.hash for block in migrated.chain] == [
+        block.hash for block in blockchain.chain
+    ]
+    # The blocks are in the block log, like the ones of any other chain
+    assert migrated.get_block_json(0, 3) == blockchain.get_block_json(0, 3)
+    assert migrated.get_peer_nodes() == ["localhost:5002"]
+    assert migrated.verify_chain() and migrated.verify_ledger()
+    assert os.path.exists("blockchain-5001.txt.migrated")
+    assert not hasattr(migrated, "load_data_json")
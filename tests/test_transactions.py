@@ -0,0 +1,27 @@
+"""Tests adding open transactions to the Blockchain."""
+
+from transaction import Transaction
+
+
+def sign(wallet, recipient, amount):
+    signature = wallet.sign_transaction(wallet.public_key, recipient, amount)
+    return Transaction(wallet.public_key, recipient, signature, amount)
+
+
+def test_batch_rejects_forged_transaction_reusing_a_signature(blockchain, wallet):
+    blockchain.mine_block()
+    original = sign(wallet, "alice", 1.0)
+    forged = Transaction(wallet.public_key, "mallory", original.signature, 5.0)
+
+    assert blockchain.add_transactions([forged, original]) == [False, True]
+    assert blockchain.open_transactions == (original,)
+    # The forged transaction didn't get stuck in the mempool, so mining goes on
+    assert blockchain.mine_block() is not None
+
+
+def test_batch_adds_identical_copies_once(blockchain, wallet):
+    blockchain.mine_block()
+    transaction = sign(wallet, "alice", 1.0)
+
+    assert blockchain.add_transactions([transaction, transaction]) == [True, False]
+    assert len(blockchain.open_transactions) == 1
@@ -0,0 +1,40 @@
+"""Tests verifying chains against checkpoints."""
+
+from block import Block
+from transaction import Transaction
+from utility.hash_util import hash_string_256
+from utility.verification import ProofContext, Verification
+
+
+def test_chain_must_lead_up_to_the_checkpoint(blockchain):
+    for _ in range(3):
+        blockchain.mine_block()
+    assert blockchain.create_checkpoint(2)
+    checkpoints = blockchain.get_checkpoints()
+    chain = list(blockchain.chain)
+    assert Verification.verify_chain(chain, None, checkpoints)
+
+    reward = Transaction("MINING", "attacker", "", 10**6)
+    made_up = Block(1, "garbage", [reward], 0)
+    forged = [chain[0], made_up] + chain[2:]
+    assert not Verification.verify_chain(forged, None, checkpoints)
+
+
+def test_proof_context_matches_the_hex_prefix_check():
+    transactions = [
+        Transaction("alice", "bob", "ab" * 64, 2.5),
+        Transaction("MINING", "alice", "", 10),
+    ]
+    for txs, last_hash in [([], ""), (transactions, "00" * 32), (transactions, None)]:
+        context = ProofContext(txs, last_hash)
+        valid = 0
+        for proof in range(-100, 5000):
+            # The check the node used before the hash state was shared between proofs
+            guess = (
+                str([tx.to_ordered_dict() for tx in txs]) + str(last_hash) + str(proof)
+            ).encode()
+            expected = hash_string_256(guess)[0:2] == "00"
+            assert context.is_valid(proof) == expected
+            assert Verification.valid_proof(txs, last_hash, proof) == expected
+            valid += expected
+        assert valid > 0
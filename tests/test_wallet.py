@@ -0,0 +1,24 @@
+"""Tests the Wallet and its key cache."""
+
+import wallet as wallet_module
+from transaction import Transaction
+from wallet import Wallet
+
+
+def test_private_keys_stay_out_of_the_key_cache(wallet):
+    signature = wallet.sign_transaction(wallet.public_key, "bob", 1.0)
+    transaction = Transaction(wallet.public_key, "bob", signature, 1.0)
+    assert Wallet.verify_transaction(transaction)
+    assert wallet.public_key in wallet_module._keys
+    assert wallet.private_key not in wallet_module._keys
+    Wallet.import_key(wallet.private_key)
+    assert wallet.private_key not in wallet_module._keys
+
+    # Replaced keys are used for the next signature
+    old_private_key = wallet.private_key
+    wallet.create_keys()
+    signature = wallet.sign_transaction(wallet.public_key, "bob", 1.0)
+    assert Wallet.verify_transaction(
+        Transaction(wallet.public_key, "bob", signature, 1.0)
+    )
+    assert old_private_key not in wallet_module._keys
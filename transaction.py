@@ -6,7 +6,8 @@ from utility.printable import Printable
 
 
 class Transaction(Printable):
-    """A transaction which can be added to a block in the blockchain.
+    """A transaction which can be added to a block in the blockchain. Transactions are immutable once they're created
+    and store their attributes in slots, so the many transactions held in memory don't need a __dict__ each.
 
     Attributes:
         :sender: The sender of the coins.
@@ -15,11 +16,37 @@ class Transaction(Printable):
         :amount: The amount of coins sent.
     """
 
+    __slots__ = ("sender", "recipient", "amount", "signature")
+
     def __init__(self, sender, recipient, signature, amount):
-        self.sender = sender
-        self.recipient = recipient
-        self.amount = amount
-        self.signature = signature
+        object.__setattr__(self, "sender", sender)
+        object.__setattr__(self, "recipient", recipient)
+        object.__setattr__(self, "amount", amount)
+        object.__setattr__(self, "signature", signature)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"Transaction is immutable, can't set {name}")
+
+    def __reduce__(self):
+        return Transaction, (self.sender, self.recipient, self.signature, self.amount)
+
+    @classmethod
+    def from_dict(cls, tx):
+        """Creates a transaction from a dict as returned by to_dict.
+
+        Arguments:
+            :tx: The dict with the transaction's data.
+        """
+        return cls(tx["sender"], tx["recipient"], tx["signature"], tx["amount"])
+
+    def to_dict(self):
+        """Returns the transaction as a dict which can be converted to JSON."""
+        return {
+            "sender": self.sender,
+            "recipient": self.recipient,
+            "amount": self.amount,
+            "signature": self.signature,
+        }
 
     def to_ordered_dict(self):
         return OrderedDict(
@@ -0,0 +1,56 @@
+"""Provides the TransactionIndex class, which locates the confirmed transactions of an address or signature."""
+
+
+class TransactionIndex:
+    """Maps every address to the locations of the confirmed transactions it sent or received and every signature to
+    the location of its transaction. A location is a tuple of the block index and the position of the transaction in
+    the block. Like the Ledger, it's updated as blocks are appended, so lookups don't need to scan the chain.
+
+    Mining rewards aren't signed, so they're only indexed by address.
+    """
+
+    def __init__(self):
+        self.__by_address = {}
+        self.__by_signature = {}
+
+    def rebuild(self, chain):
+        """Discards the index and rebuilds it from a chain.
+
+        Arguments:
+            :chain: The blocks whose transactions are indexed.
+        """
+        self.__by_address = {}
+        self.__by_signature = {}
+        for block in chain:
+            self.add_block(block)
+
+    def add_block(self, block):
+        """Adds the transactions of a newly appended block.
+
+        Arguments:
+            :block: The block which was appended to the chain.
+        """
+        for position, tx in enumerate(block.transactions):
+            location = (block.index, position)
+            self.__by_address.setdefault(tx.sender, []).append(location)
+            if tx.recipient != tx.sender:
+                self.__by_address.setdefault(tx.recipient, []).append(location)
+            if tx.signature:
+                # A replayed signature keeps pointing at its first occurrence
+                self.__by_signature.setdefault(tx.signature, location)
+
+    def find(self, signature):
+        """Returns the location of the transaction with the given signature or None if it isn't confirmed.
+
+        Arguments:
+            :signature: The signature of the transaction.
+        """
+        return self.__by_signature.get(signature)
+
+    def locations(self, address):
+        """Returns the locations of all confirmed transactions sent or received by an address, in chain order.
+
+        Arguments:
+            :address: The address of the participant.
+        """
+        return list(self.__by_address.get(address, ()))
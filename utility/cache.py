@@ -0,0 +1,99 @@
+"""Provides the LRUCache class."""
+
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """A bounded mapping which evicts the least recently used entry once it's full and counts its hits + misses.
+
+    Attributes:
+        :maxsize: The maximum number of entries.
+        :maxbytes: The maximum total length of the values, which must be bytes then (None = not limited).
+        :hits: The number of lookups which found an entry.
+        :misses: The number of lookups which didn't find an entry.
+        :evictions: The number of entries which were dropped to make room for new ones.
+    """
+
+    def __init__(self, maxsize, maxbytes=None):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.__entries = OrderedDict()
+        # The total length of the values, only counted if maxbytes is set
+        self.__bytes = 0
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def __contains__(self, key):
+        return key in self.__entries
+
+    def get(self, key, default=None):
+        """Returns the entry for a key (and marks it as recently used) or the default if there is none.
+
+        Arguments:
+            :key: The key to look up.
+            :default: The value returned when there is no entry.
+        """
+        with self.__lock:
+            try:
+                value = self.__entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self.__entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Stores an entry, evicting the least recently used one if the cache is full.
+
+        Arguments:
+            :key: The key of the entry.
+            :value: The value of the entry.
+        """
+        with self.__lock:
+            if self.maxbytes is not None:
+                self.__bytes += len(value) - len(self.__entries.get(key, b""))
+            self.__entries[key] = value
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.maxsize or (
+                self.maxbytes is not None and self.__bytes > self.maxbytes
+            ):
+                _, evicted = self.__entries.popitem(last=False)
+                if self.maxbytes is not None:
+                    self.__bytes -= len(evicted)
+                self.evictions += 1
+
+    def discard(self, key):
+        """Removes the entry for a key if there is one."""
+        with self.__lock:
+            value = self.__entries.pop(key, None)
+            if self.maxbytes is not None and value is not None:
+                self.__bytes -= len(value)
+
+    def clear(self):
+        """Removes all entries (the counters are kept)."""
+        with self.__lock:
+            self.__entries.clear()
+            self.__bytes = 0
+
+    def stats(self):
+        """Returns the size and the counters of the cache."""
+        lookups = self.hits + self.misses
+        stats = {
+            "size": len(self.__entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups > 0 else 0.0,
+        }
+        if self.maxbytes is not None:
+            stats["bytes"] = self.__bytes
+            stats["maxbytes"] = self.maxbytes
+        return stats
@@ -0,0 +1,199 @@
+"""Provides a compact binary encoding of blocks.
+
+A block is encoded as:
+
+    version byte | index | previous_hash | proof | timestamp | address table | transactions
+
+The address table lists every sender and recipient of the block once, transactions refer to it by position. Strings
+which are lowercase hex (keys, signatures and hashes) are stored as raw bytes, all other strings as UTF-8. Numbers are
+tagged as int (zigzag varint) or float (8 byte IEEE 754), so a decoded block has exactly the values (and therefore the
+hash) of the encoded one.
+
+The functions work on the dicts returned by Block.to_dict, values which can't be encoded exactly raise a ValueError.
+"""
+
+import struct
+
+# The first byte of every encoded block (JSON encoded blocks start with "{" instead)
+FORMAT_VERSION = 1
+# The Content-Type of encoded blocks in HTTP requests and responses
+CONTENT_TYPE = "application/x-blockchain-binary"
+
+FLOAT = struct.Struct(">d")
+TAG_INT = 0
+TAG_FLOAT = 1
+
+
+def is_binary(payload):
+    """Returns whether a payload holds an encoded block (rather than a JSON one).
+
+    Arguments:
+        :payload: The bytes of the block.
+    """
+    return payload[:1] == bytes([FORMAT_VERSION])
+
+
+def encode_block(block):
+    """Encodes a block and returns the bytes.
+
+    Arguments:
+        :block: The block as a dict (see Block.to_dict).
+    """
+    out = bytearray([FORMAT_VERSION])
+    _write_uint(out, block["index"])
+    _write_str(out, block["previous_hash"])
+    _write_number(out, block["proof"])
+    _write_number(out, block["timestamp"])
+    addresses = {}
+    for tx in block["transactions"]:
+        addresses.setdefault(tx["sender"], len(addresses))
+        addresses.setdefault(tx["recipient"], len(addresses))
+    _write_uint(out, len(addresses))
+    for address in addresses:
+        _write_str(out, address)
+    _write_uint(out, len(block["transactions"]))
+    for tx in block["transactions"]:
+        _write_uint(out, addresses[tx["sender"]])
+        _write_uint(out, addresses[tx["recipient"]])
+        _write_number(out, tx["amount"])
+        _write_str(out, tx["signature"])
+    return bytes(out)
+
+
+def decode_block(data, offset=0):
+    """Decodes the block which starts at the given offset. Returns the block as a dict and the offset after it.
+
+    Arguments:
+        :data: The bytes holding the block.
+        :offset: The position of the block in the bytes.
+    """
+    try:
+        if data[offset] != FORMAT_VERSION:
+            raise ValueError(f"Unknown block format {data[offset]}")
+        offset += 1
+        index, offset = _read_uint(data, offset)
+        previous_hash, offset = _read_str(data, offset)
+        proof, offset = _read_number(data, offset)
+        timestamp, offset = _read_number(data, offset)
+        address_count, offset = _read_uint(data, offset)
+        addresses = []
+        for _ in range(address_count):
+            address, offset = _read_str(data, offset)
+            addresses.append(address)
+        transaction_count, offset = _read_uint(data, offset)
+        transactions = []
+        for _ in range(transaction_count):
+            sender, offset = _read_uint(data, offset)
+            recipient, offset = _read_uint(data, offset)
+            amount, offset = _read_number(data, offset)
+            signature, offset = _read_str(data, offset)
+            transactions.append(
+                {
+                    "sender": addresses[sender],
+                    "recipient": addresses[recipient],
+                    "amount": amount,
+                    "signature": signature,
+                }
+            )
+    except (IndexError, struct.error, UnicodeDecodeError) as e:
+        raise ValueError(f"Truncated or corrupted block: {e}")
+    block = {
+        "index": index,
+        "previous_hash": previous_hash,
+        "transactions": transactions,
+        "proof": proof,
+        "timestamp": timestamp,
+    }
+    return block, offset
+
+
+def decode_blocks(data):
+    """Decodes a sequence of encoded blocks (e.g. a /chain response) and returns them as a list of dicts.
+
+    Arguments:
+        :data: The concatenated bytes of the blocks.
+    """
+    blocks = []
+    offset = 0
+    while offset < len(data):
+        block, offset = decode_block(data, offset)
+        blocks.append(block)
+    return blocks
+
+
+def _write_uint(out, value):
+    if type(value) is not int or value < 0:
+        raise ValueError(f"Can't encode {value!r} as an unsigned integer")
+    while value > 0x7F:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_uint(data, offset):
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def _write_number(out, value):
+    # bool is a subclass of int but would be decoded (and hashed) as a number
+    if type(value) is int:
+        out.append(TAG_INT)
+        _write_uint(out, value * 2 if value >= 0 else -value * 2 - 1)
+    elif type(value) is float:
+        out.append(TAG_FLOAT)
+        out += FLOAT.pack(value)
+    else:
+        raise ValueError(f"Can't encode {value!r} as a number")
+
+
+def _read_number(data, offset):
+    tag = data[offset]
+    offset += 1
+    if tag == TAG_INT:
+        value, offset = _read_uint(data, offset)
+        return (value >> 1 if value % 2 == 0 else -(value + 1) // 2), offset
+    if tag == TAG_FLOAT:
+        return FLOAT.unpack_from(data, offset)[0], offset + FLOAT.size
+    raise ValueError(f"Unknown number tag {tag}")
+
+
+def _write_str(out, value):
+    if type(value) is not str:
+        raise ValueError(f"Can't encode {value!r} as a string")
+    raw = _hex_to_bytes(value)
+    if raw is None:
+        raw = value.encode()
+        _write_uint(out, len(raw) << 1)
+    else:
+        _write_uint(out, len(raw) << 1 | 1)
+    out += raw
+
+
+def _read_str(data, offset):
+    header, offset = _read_uint(data, offset)
+    length = header >> 1
+    raw = bytes(data[offset : offset + length])
+    if len(raw) < length:
+        raise IndexError("string exceeds the data")
+    offset += length
+    if header & 1:
+        return raw.hex(), offset
+    return raw.decode(), offset
+
+
+def _hex_to_bytes(value):
+    """Returns the bytes of a lowercase hex string or None if the string isn't one (so it wouldn't round trip)."""
+    try:
+        raw = bytes.fromhex(value)
+    except ValueError:
+        return None
+    # fromhex skips whitespace and accepts uppercase digits, neither of which would come back from hex()
+    return raw if raw.hex() == value else None
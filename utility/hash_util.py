@@ -28,8 +28,5 @@ def hash_block(block):
     Arguments:
         :block: The block that should be hashed.
     """
-    hashable_block = block.__dict__.copy()
-    hashable_block["transactions"] = [
-        tx.to_ordered_dict() for tx in hashable_block["transactions"]
-    ]
+    hashable_block = block.to_dict()
     return hash_string_512(json.dumps(hashable_block, sort_keys=True).encode())
@@ -2,7 +2,17 @@
 
 
 class Printable:
-    """A base class which implements printing functionality."""
+    """A base class which implements printing functionality for classes which store their attributes in __slots__.
+    Slots starting with an underscore (e.g. cached values) are not printed.
+    """
+
+    __slots__ = ()
 
     def __repr__(self):
-        return str(self.__dict__)
+        return str(
+            {
+                name: getattr(self, name)
+                for name in type(self).__slots__
+                if not name.startswith("_")
+            }
+        )
@@ -0,0 +1,89 @@
+"""Provides the RWLock class."""
+
+import threading
+from contextlib import contextmanager
+
+
+class RWLock:
+    """A reader-writer lock: any number of threads can hold it for reading at the same time, a thread holding it for
+    writing excludes all others. Waiting writers are preferred over new readers, so a steady stream of reads can't
+    starve them.
+
+    The lock is reentrant: a thread may acquire it again for reading or writing while it holds it for writing, and for
+    reading while it holds it for reading. A read lock can't be upgraded to a write lock though (two readers doing so
+    would wait for each other forever), that raises a RuntimeError.
+    """
+
+    def __init__(self):
+        self.__condition = threading.Condition()
+        # Read lock depth per thread
+        self.__readers = {}
+        self.__writer = None
+        self.__write_depth = 0
+        self.__waiting_writers = 0
+
+    @contextmanager
+    def read(self):
+        """Holds the lock for reading while the with block runs."""
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self):
+        """Holds the lock for writing while the with block runs."""
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+    def acquire_read(self):
+        """Waits until no thread holds (or waits for) the lock for writing and acquires it for reading."""
+        thread = threading.get_ident()
+        with self.__condition:
+            if self.__writer != thread and thread not in self.__readers:
+                self.__condition.wait_for(
+                    lambda: self.__writer is None and self.__waiting_writers == 0
+                )
+            self.__readers[thread] = self.__readers.get(thread, 0) + 1
+
+    def release_read(self):
+        """Releases the lock acquired for reading."""
+        thread = threading.get_ident()
+        with self.__condition:
+            depth = self.__readers[thread] - 1
+            if depth > 0:
+                self.__readers[thread] = depth
+            else:
+                del self.__readers[thread]
+                self.__condition.notify_all()
+
+    def acquire_write(self):
+        """Waits until no other thread holds the lock and acquires it for writing."""
+        thread = threading.get_ident()
+        with self.__condition:
+            if self.__writer == thread:
+                self.__write_depth += 1
+                return
+            if thread in self.__readers:
+                raise RuntimeError("A read lock can't be upgraded to a write lock")
+            self.__waiting_writers += 1
+            try:
+                self.__condition.wait_for(
+                    lambda: self.__writer is None and not self.__readers
+                )
+            finally:
+                self.__waiting_writers -= 1
+            self.__writer = thread
+            self.__write_depth = 1
+
+    def release_write(self):
+        """Releases the lock acquired for writing."""
+        with self.__condition:
+            self.__write_depth -= 1
+            if self.__write_depth == 0:
+                self.__writer = None
+                self.__condition.notify_all()
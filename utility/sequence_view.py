@@ -0,0 +1,36 @@
+"""Provides the SequenceView class."""
+
+from collections.abc import Sequence
+from itertools import islice
+
+
+class SequenceView(Sequence):
+    """A read-only view of the first items of a list, which is created without copying the list.
+
+    The view only covers the items the list had when the view was created. As long as the owner of the list only
+    appends to it (and assigns a new list for any other change), the view therefore stays a consistent snapshot.
+    """
+
+    __slots__ = ("__items", "__length")
+
+    def __init__(self, items):
+        self.__items = items
+        self.__length = len(items)
+
+    def __len__(self):
+        return self.__length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.__items[slice(*index.indices(self.__length))]
+        if index < 0:
+            index += self.__length
+        if not 0 <= index < self.__length:
+            raise IndexError("SequenceView index out of range")
+        return self.__items[index]
+
+    def __iter__(self):
+        return islice(self.__items, self.__length)
+
+    def __repr__(self):
+        return f"SequenceView({list(self)!r})"
@@ -1,8 +1,158 @@
 """Provides verification helper methods."""
 
-from utility.hash_util import hash_block, hash_string_256
+import hashlib
+import itertools
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from ledger import Ledger
 from wallet import Wallet
 
+# The number of transactions a verification worker checks per task
+VERIFY_CHUNK_SIZE = 64
+
+
+def _has_valid_signature(transaction):
+    """Verifies the signature of a transaction, treating malformed keys or signatures as invalid."""
+    try:
+        return Wallet.verify_transaction(transaction)
+    except (ValueError, TypeError):
+        return False
+
+
+def _find_invalid_signature(transactions):
+    """Returns the position of the first transaction with an invalid signature or None if all of them are valid."""
+    for position, tx in enumerate(transactions):
+        if not _has_valid_signature(tx):
+            return position
+    return None
+
+
+def _check_signatures(transactions):
+    """Returns whether the signature is valid for every transaction."""
+    return [_has_valid_signature(tx) for tx in transactions]
+
+
+class ProofContext:
+    """The hash inputs of a proof of work which don't depend on the proof number.
+
+    The transactions and the previous block's hash are serialized and fed into a SHA256 object once. Testing a proof
+    only copies that hash state and adds the proof number, which gives exactly the same hash as hashing the whole string
+    at once.
+    """
+
+    def __init__(self, transactions, last_hash):
+        """Serializes the hash inputs shared by all proofs.
+
+        Arguments:
+            :transactions: The transactions of the block for which the proof is created.
+            :last_hash: The previous block's hash which will be stored in the current block.
+        """
+        self.__prefix_hash = hashlib.sha256(
+            (
+                str([tx.to_ordered_dict() for tx in transactions]) + str(last_hash)
+            ).encode()
+        )
+
+    def is_valid(self, proof):
+        """Validates the proof: Does hash(transactions, last_hash, proof) contain 2 leading zeros?
+
+        Arguments:
+            :proof: The proof number we're testing.
+        """
+        guess_hash = self.__prefix_hash.copy()
+        guess_hash.update(str(proof).encode())
+        # Two leading 0s in the hex digest are the same as a leading zero byte
+        return guess_hash.digest()[0] == 0
+
+
+class SignatureVerifier:
+    """Verifies the signatures of many transactions at once. With more than one worker, the transactions are split
+    into chunks which are checked on a pool of worker processes.
+
+    Attributes:
+        :workers: The number of worker processes (1 verifies in the calling process).
+    """
+
+    def __init__(self, workers=1):
+        self.workers = workers if workers > 0 else os.cpu_count()
+        self.__executor = None
+
+    def find_invalid(self, transactions):
+        """Verifies the signatures of the given transactions and returns the ones which are invalid. Verification stops
+        at the first invalid signature, so the result doesn't necessarily contain all invalid transactions.
+
+        Arguments:
+            :transactions: The transactions which should be verified (without mining rewards).
+        """
+        if self.workers == 1 or len(transactions) <= VERIFY_CHUNK_SIZE:
+            position = _find_invalid_signature(transactions)
+            return [] if position is None else [transactions[position]]
+        # Signatures verified before don't need to be sent to the workers
+        transactions = [tx for tx in transactions if not Wallet.is_verified(tx)]
+        executor = self.__get_executor()
+        pending = {
+            executor.submit(
+                _find_invalid_signature, transactions[start : start + VERIFY_CHUNK_SIZE]
+            ): start
+            for start in range(0, len(transactions), VERIFY_CHUNK_SIZE)
+        }
+        invalid = []
+        while pending and not invalid:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                start = pending.pop(future)
+                chunk = transactions[start : start + VERIFY_CHUNK_SIZE]
+                position = future.result()
+                if position is not None:
+                    invalid.append(chunk[position])
+                    chunk = chunk[:position]
+                # The workers' caches live in other processes, so record their results here
+                for tx in chunk:
+                    Wallet.mark_verified(tx)
+        for future in pending:
+            future.cancel()
+        return invalid
+
+    def check(self, transactions):
+        """Verifies the signatures of all given transactions and returns a list which says for every transaction
+        whether its signature is valid.
+
+        Arguments:
+            :transactions: The transactions which should be verified.
+        """
+        if self.workers == 1 or len(transactions) <= VERIFY_CHUNK_SIZE:
+            return _check_signatures(transactions)
+        results = [True] * len(transactions)
+        # Signatures verified before don't need to be sent to the workers
+        positions = [
+            position
+            for position, tx in enumerate(transactions)
+            if not Wallet.is_verified(tx)
+        ]
+        unverified = [transactions[position] for position in positions]
+        chunks = [
+            unverified[start : start + VERIFY_CHUNK_SIZE]
+            for start in range(0, len(unverified), VERIFY_CHUNK_SIZE)
+        ]
+        chunk_results = self.__get_executor().map(_check_signatures, chunks)
+        for position, valid in zip(positions, itertools.chain(*chunk_results)):
+            results[position] = valid
+            if valid:
+                Wallet.mark_verified(transactions[position])
+        return results
+
+    def close(self):
+        """Shuts down the worker processes."""
+        if self.__executor is not None:
+            self.__executor.shutdown(cancel_futures=True)
+            self.__executor = None
+
+    def __get_executor(self):
+        if self.__executor is None:
+            self.__executor = ProcessPoolExecutor(self.workers)
+        return self.__executor
+
 
 class Verification:
     """A helper class which offer various static and class-based verification and validation methods."""
@@ -16,33 +166,100 @@ class Verification:
             :last_hash: The previous block's hash which will be stored in the current block.
             :proof: The proof number we're testing.
         """
-        # Create a string with all the hash inputs
-        guess = (
-            str([tx.to_ordered_dict() for tx in transactions])
-            + str(last_hash)
-            + str(proof)
-        ).encode()
         # IMPORTANT: This is NOT the same hash as will be stored in the previous_hash. It's a not a block's hash - it's
         # only used for the proof-of-work algorithm!
-        guess_hash = hash_string_256(guess)
         # Only a hash (which is based on the above inputs) which starts with two 0s is treated as valid
         # This condition is of course defined by you. You could also require 10 leading 0s - this would take significantly
         # longer (and this allows you to control the speed at which new blocks can be added)
-        return guess_hash[0:2] == "00"
+        # Use a ProofContext instead when testing many proofs for the same transactions.
+        return ProofContext(transactions, last_hash).is_valid(proof)
 
     @classmethod
-    def verify_chain(cls, blockchain):
-        """Verify the current blockchain and return True if it's valid, False otherwise"""
-        for index, block in enumerate(blockchain):
-            if index == 0:
-                continue
-            if block.previous_hash != hash_block(blockchain[index - 1]):
+    def verify_chain(cls, blockchain, verifier=None, checkpoints=None):
+        """Verify the current blockchain and return True if it's valid, False otherwise
+
+        With checkpoints, the chain must contain the checkpointed blocks and only the blocks after the last checkpoint
+        it reaches are verified. The proofs and signatures of the blocks up to it are trusted, but these blocks must
+        still link up to it: every block's hash covers the previous hash, so this pins them to the trusted ones.
+
+        Arguments:
+            :blockchain: The blocks which should be verified.
+            :verifier: The SignatureVerifier used to check the transaction signatures.
+            :checkpoints: The hashes of trusted blocks by block index.
+        """
+        start = 0
+        if checkpoints:
+            if not cls.matches_checkpoints(blockchain, 0, checkpoints):
+                return False
+            start = max(
+                (height for height in checkpoints if height < len(blockchain)),
+                default=0,
+            )
+            if not cls.verify_links(blockchain[0], blockchain[1 : start + 1]):
+                print("Blocks before the checkpoint don't lead up to it!")
+                return False
+        return cls.verify_blocks(blockchain[start], blockchain[start + 1 :], verifier)
+
+    @staticmethod
+    def matches_checkpoints(blocks, start, checkpoints):
+        """Checks that blocks which follow each other don't contradict any checkpoint.
+
+        Arguments:
+            :blocks: The blocks which should be checked.
+            :start: The index of the first block.
+            :checkpoints: The hashes of trusted blocks by block index.
+        """
+        for height, block_hash in checkpoints.items():
+            if (
+                start <= height < start + len(blocks)
+                and blocks[height - start].hash != block_hash
+            ):
+                print(f"Block {height} differs from the checkpoint!")
                 return False
+        return True
+
+    @classmethod
+    def verify_blocks(cls, previous_block, blocks, verifier=None):
+        """Verify blocks which should be appended to a (trusted) block and return True if they're valid, False
+        otherwise
+
+        Arguments:
+            :previous_block: The block the first of the blocks should follow.
+            :blocks: The blocks which should be verified.
+            :verifier: The SignatureVerifier used to check the transaction signatures.
+        """
+        if not cls.verify_links(previous_block, blocks):
+            return False
+        signed_transactions = []
+        for block in blocks:
             if not cls.valid_proof(
                 block.transactions[:-1], block.previous_hash, block.proof
             ):
                 print("Proof of work is invalid!")
                 return False
+            # The last transaction of every block is the mining reward, which isn't signed
+            signed_transactions.extend(block.transactions[:-1])
+        if len((verifier or SignatureVerifier()).find_invalid(signed_transactions)) > 0:
+            print("Signature of a transaction is invalid!")
+            return False
+        return True
+
+    @staticmethod
+    def verify_links(previous_block, blocks):
+        """Checks that every block follows the one before it (by index and hash), without checking the proofs of work
+        or the signatures.
+
+        Arguments:
+            :previous_block: The block the first of the blocks should follow.
+            :blocks: The blocks which should be checked.
+        """
+        for block in blocks:
+            if (
+                block.index != previous_block.index + 1
+                or block.previous_hash != previous_block.hash
+            ):
+                return False
+            previous_block = block
         return True
 
     @staticmethod
@@ -60,9 +277,35 @@ class Verification:
         else:
             return Wallet.verify_transaction(transaction)
 
-    @classmethod
-    def verify_open_transactions(cls, open_transactions, get_balance):
+    @staticmethod
+    def verify_open_transactions(open_transactions, get_balance, verifier=None):
         """Verifies all open transactions."""
-        return all(
-            [cls.verify_transaction(tx, get_balance, False) for tx in open_transactions]
+        return (
+            len((verifier or SignatureVerifier()).find_invalid(open_transactions)) == 0
         )
+
+    @staticmethod
+    def verify_ledger(ledger, mempool, chain):
+        """Verifies that the balances held by a ledger and the pending totals of a mempool match the ones computed by
+        scanning the whole chain and all open transactions.
+
+        Arguments:
+            :ledger: The incrementally maintained ledger.
+            :mempool: The Mempool holding the open transactions.
+            :chain: The blocks whose transactions are confirmed.
+        """
+        open_transactions = mempool.snapshot()
+        addresses = ledger.addresses() | mempool.senders()
+        for block in chain:
+            for tx in block.transactions:
+                addresses.add(tx.sender)
+                addresses.add(tx.recipient)
+        for tx in open_transactions:
+            addresses.add(tx.sender)
+        for address in addresses:
+            expected = Ledger.rescan_balance(chain, open_transactions, address)
+            balance = ledger.get_balance(address, mempool.pending_amount(address))
+            if balance != expected:
+                print(f"Ledger balance of {address} differs from the chain!")
+                return False
+        return True
@@ -5,12 +5,26 @@ from Crypto.Hash import SHA3_512
 from Crypto.PublicKey import RSA
 from Crypto.Signature import PKCS1_v1_5
 
+from utility.cache import LRUCache
+
+# Parsed public RSA keys by their hex encoded DER form, so the keys of frequent senders are only parsed once. Private
+# keys are never cached here, they're kept by their Wallet only.
+KEY_CACHE_SIZE = 1024
+_keys = LRUCache(KEY_CACHE_SIZE)
+# Transactions whose signature was verified successfully. A signature which was valid once stays valid since the key
+# covers everything that was signed (the amount as the string that was signed), failed verifications are not cached.
+VERIFIED_CACHE_SIZE = 100000
+_verified = LRUCache(VERIFIED_CACHE_SIZE)
+
 
 class Wallet:
     def __init__(self, node_id):
         self.private_key = None
         self.public_key = None
         self.wallet_file = f"wallet-{node_id}.txt"
+        # The parsed private key and the hex encoded key it was parsed from (it's parsed again once that changes)
+        self.__signing_key = None
+        self.__signing_key_source = None
 
     def create_keys(self):
         self.private_key, self.public_key = self.generate_keys()
@@ -52,15 +66,72 @@ class Wallet:
             binascii.hexlify(public_key.exportKey(format="DER")).decode("ascii"),
         )
 
+    @staticmethod
+    def import_key(key):
+        """Returns the RSA key for a hex encoded DER public key, taken from the key cache if it was parsed before.
+
+        Arguments:
+            :key: The hex encoded key.
+        """
+        rsa_key = _keys.get(key)
+        if rsa_key is None:
+            rsa_key = RSA.importKey(binascii.unhexlify(key))
+            # A private key passed in by mistake mustn't outlive its caller in the cache
+            if not rsa_key.has_private():
+                _keys.put(key, rsa_key)
+        return rsa_key
+
+    @staticmethod
+    def key_cache_stats():
+        """Returns the size and hit/miss counters of the key cache."""
+        return _keys.stats()
+
     def sign_transaction(self, sender, recipient, amount):
-        signer = PKCS1_v1_5.new(RSA.importKey(binascii.unhexlify(self.private_key)))
+        if self.__signing_key_source != self.private_key:
+            self.__signing_key = RSA.importKey(binascii.unhexlify(self.private_key))
+            self.__signing_key_source = self.private_key
+        signer = PKCS1_v1_5.new(self.__signing_key)
         h = SHA3_512.new((str(sender) + str(recipient) + str(amount)).encode("utf8"))
         signature = signer.sign(h)
         return binascii.hexlify(signature).decode("ascii")
 
+    @staticmethod
+    def signature_cache_stats():
+        """Returns the size and hit/miss counters of the cache of verified signatures."""
+        return _verified.stats()
+
+    @staticmethod
+    def __verified_key(transaction):
+        return (
+            transaction.sender,
+            transaction.recipient,
+            str(transaction.amount),
+            transaction.signature,
+        )
+
+    @staticmethod
+    def is_verified(transaction):
+        """Returns whether the signature of a transaction was already verified successfully.
+
+        Arguments:
+            :transaction: The transaction to look up.
+        """
+        return _verified.get(Wallet.__verified_key(transaction), False)
+
+    @staticmethod
+    def mark_verified(transaction):
+        """Records that the signature of a transaction is valid (e.g. after it was verified in a worker process).
+
+        Arguments:
+            :transaction: The transaction whose signature was verified.
+        """
+        _verified.put(Wallet.__verified_key(transaction), True)
+
     @staticmethod
     def verify_transaction(transaction):
-        public_key = RSA.importKey(binascii.unhexlify(transaction.sender))
+        if Wallet.is_verified(transaction):
+            return True
+        public_key = Wallet.import_key(transaction.sender)
         verifier = PKCS1_v1_5.new(public_key)
         h = SHA3_512.new(
             (
@@ -69,4 +140,7 @@ class Wallet:
                 + str(transaction.amount)
             ).encode("utf8")
         )
-        return verifier.verify(h, binascii.unhexlify(transaction.signature))
+        if not verifier.verify(h, binascii.unhexlify(transaction.signature)):
+            return False
+        Wallet.mark_verified(transaction)
+        return True